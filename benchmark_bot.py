@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+# Offline configuration, must be set before the bot modules are imported
+os.environ.setdefault("MENU_PHOTOS_ENABLED", "0")
+os.environ.setdefault("MENU_ARCHIVE_PATH", ":memory:")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import mensa_utils
+import telegram_mensa_bot as bot
+from bot_fakes import FakeOpenMensa, FakeLLM, FakeUpdate, FakeContext, FakeBot
+from day_menu import invalidate_day_menus
+from menu_cache import invalidate_rendered_menus
+from replay import ReplayStore, RecordReplayOpenMensa, RecordReplayLLM
+from rate_limit import LLMAdmission
+import metrics
+
+# Synthetic messages per update kind
+MESSAGES = {
+    "menu": ["/menu", "/menu morgen", "/menu übermorgen", "/menu freitag"],
+    "natural": [
+        "Was gibt es heute zu essen?",
+        "Zeig mir das Menü für morgen",
+        "Was gibt's übermorgen in der Mensa?",
+        "Ich möchte zur Mensa Griebnitzsee wechseln",
+    ],
+    "chat": [
+        "Wie ist das Wetter heute?",
+        "Erzähl mir einen Witz",
+        "Was ist die Hauptstadt von Frankreich?",
+    ],
+}
+
+DEFAULT_MIX = {"menu": 0.5, "natural": 0.3, "chat": 0.2}
+
+
+def build_stream(count, mix=DEFAULT_MIX, users=50, seed=42):
+    """
+    Build a reproducible list of (kind, user_id, text) updates.
+
+    Args:
+        count (int): Number of updates
+        mix (dict): Share of each kind in MESSAGES
+        users (int): Number of distinct users
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    stream = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        stream.append((kind, rng.randint(1, users), rng.choice(MESSAGES[kind])))
+    return stream
+
+
+# Wrapped like in main(), so metrics and tracing overhead are part of the measurement
+COMMAND_HANDLERS = {
+    command: bot.instrument_handler(command, handler)
+    for command, handler in [
+        ("menu", bot.menu_command),
+        ("mensa", bot.set_mensa_command),
+        ("hilfe", bot.hilfe_command),
+        ("einstellungen", bot.settings_command),
+    ]
+}
+MESSAGE_HANDLER = bot.instrument_handler("message", bot.handle_message)
+
+
+async def dispatch(user_id, text, api_latency, fake_bot):
+    """Route one message like the Telegram application would."""
+    update = FakeUpdate(user_id, text, api_latency)
+    if text.startswith("/"):
+        parts = text[1:].split()
+        context = FakeContext(parts[1:], fake_bot)
+        await COMMAND_HANDLERS[parts[0]](update, context)
+    else:
+        await MESSAGE_HANDLER(update, FakeContext(None, fake_bot))
+    return update
+
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[int(fraction * 100) - 1]
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+async def run_benchmark(stream, concurrency=1, api_latency=0.0):
+    """
+    Drive the handlers with a stream of updates.
+
+    Args:
+        stream (list): Output of build_stream
+        concurrency (int): Updates processed at the same time (the bot itself runs with 1)
+        api_latency (float): Simulated Telegram API latency per reply (seconds)
+
+    Returns:
+        dict: Overall and per-kind latency statistics and throughput
+    """
+    fake_bot = FakeBot(api_latency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {kind: [] for kind in MESSAGES}
+
+    async def one(kind, user_id, text):
+        async with semaphore:
+            start = time.perf_counter()
+            await dispatch(user_id, text, api_latency, fake_bot)
+            latencies[kind].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(kind, user_id, text) for kind, user_id, text in stream))
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    result = {
+        "updates": len(stream),
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(stream) / elapsed, 2),
+        "overall": summarize(all_latencies),
+        "by_kind": {kind: summarize(values) for kind, values in latencies.items() if values},
+    }
+    return result
+
+
+def reset_caches():
+    invalidate_rendered_menus()
+    invalidate_day_menus()
+
+
+def print_result(result, baseline=None):
+    print(f"Updates: {result['updates']} in {result['seconds']}s -> {result['updates_per_second']} updates/s")
+    rows = [("overall", result["overall"])] + sorted(result["by_kind"].items())
+    print(f"{'kind':<10}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    for kind, stats in rows:
+        print(f"{kind:<10}{stats['count']:>7}{stats['p50_ms']:>11}{stats['p95_ms']:>11}"
+              f"{stats['p99_ms']:>11}{stats['max_ms']:>11}")
+    print(f"LLM calls: {result['llm_calls']}, OpenMensa calls: {result['openmensa_calls']}")
+    print(f"LLM admission: {result['llm_queued']} queued, {result['llm_rejected']} rejected")
+
+    if baseline:
+        def change(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print("\nCompared to baseline:")
+        print(f"  updates/s: {change(result['updates_per_second'], baseline['updates_per_second'])}")
+        for key in ["p50_ms", "p95_ms", "p99_ms"]:
+            print(f"  {key}: {change(result['overall'][key], baseline['overall'][key])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the Mensa bot handlers")
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--openmensa-latency", type=float, default=0.02, help="seconds per fake OpenMensa call")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds per fake Telegram reply")
+    parser.add_argument("--mix", default="menu=0.5,natural=0.3,chat=0.2")
+    parser.add_argument("--cold", action="store_true", help="clear menu caches before the run")
+    parser.add_argument("--seed", type=int, default=42)
+    # LLM admission limits (defaults of rate_limit.py), set here so LLM_* variables do not change the result
+    parser.add_argument("--llm-user-rate", type=float, default=6, help="LLM requests per user and minute")
+    parser.add_argument("--llm-user-burst", type=int, default=5)
+    parser.add_argument("--llm-global-rate", type=float, default=120, help="LLM requests per minute in total")
+    parser.add_argument("--llm-global-burst", type=int, default=20)
+    parser.add_argument("--llm-max-concurrent", type=int, default=4)
+    parser.add_argument("--save", help="write the result as JSON (e.g. to use as baseline)")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare against")
+    parser.add_argument("--replay", help="serve OpenMensa and LLM from a recorded replay store instead of the fakes")
+    args = parser.parse_args()
+
+    mix = {kind: float(share) for kind, share in (item.split("=") for item in args.mix.split(","))}
+    if args.replay:
+        store = ReplayStore(args.replay)
+        fake_openmensa = RecordReplayOpenMensa(None, store, "replay")
+        fake_llm = RecordReplayLLM(None, store, "replay")
+    else:
+        fake_openmensa = FakeOpenMensa(latency=args.openmensa_latency)
+        fake_llm = FakeLLM(latency=args.llm_latency)
+    mensa_utils.OpenMensa = fake_openmensa
+    bot.llm = fake_llm
+    if args.cold:
+        reset_caches()
+    # Requests only wait in the admission queue when updates are handled concurrently, like in the bot
+    bot.llm_admission = LLMAdmission(
+        args.llm_user_rate / 60, args.llm_user_burst, args.llm_global_rate / 60, args.llm_global_burst,
+        max_concurrent=args.llm_max_concurrent, queueing=args.concurrency > 1,
+    )
+
+    stream = build_stream(args.updates, mix, args.users, args.seed)
+    result = asyncio.run(run_benchmark(stream, args.concurrency, args.api_latency))
+    result["llm_calls"] = getattr(fake_llm, "calls", "n/a")
+    result["openmensa_calls"] = getattr(fake_openmensa, "calls", "n/a")
+    result["llm_queued"] = metrics.counter_total("llm_requests_queued_total")
+    result["llm_rejected"] = metrics.counter_total("llm_requests_rejected_total")
+    result["config"] = vars(args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_result(result, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
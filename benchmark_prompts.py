@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("MENU_ARCHIVE_PATH", ":memory:")
+
+from bot_fakes import FakeLLM
+from ollama_mensa_bot_utils import classify_meal
+from message_classifier import classify_message_with_llm
+from time_utils import parse_date_with_llm
+
+# Input tokens per call (system + human message) each structured call site may use
+PROMPT_TOKEN_BUDGETS = {
+    "classify_meal": 120,
+    "classify_message_with_llm": 140,
+    "parse_date_with_llm": 130,
+}
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per chat message
+
+SAMPLES = {
+    "classify_meal": (classify_meal, [
+        "Käsespätzle mit Röstzwiebeln", "Currywurst mit Pommes frites", "Linsensuppe mit Brötchen",
+        "Falafel mit Hummus und Salat", "Hähnchenbrust in Champignonrahmsoße mit Reis",
+    ]),
+    "classify_message_with_llm": (classify_message_with_llm, [
+        "Was gibt es morgen in der Mensa?", "Ich will lieber zum Griebnitzsee", "Wie geht es dir?",
+        "Kannst du mir die Befehle erklären?", "Fang bitte nochmal von vorne an",
+    ]),
+    "parse_date_with_llm": (parse_date_with_llm, [
+        "nächsten Dienstag", "in drei Tagen", "am Wochenende", "nächste Woche Mittwoch", "Ende des Monats",
+    ]),
+}
+
+
+def count_tokens(text):
+    """Tokens of text for gpt-4o-mini if tiktoken is installed, otherwise estimated with 4 characters per token."""
+    try:
+        import tiktoken
+    except ImportError:
+        return max(1, round(len(text) / 4))
+    return len(tiktoken.get_encoding("o200k_base").encode(text))
+
+
+class RecordingLLM(FakeLLM):
+    """FakeLLM that keeps the messages of every call."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def invoke(self, messages, **kwargs):
+        self.sent.append([(role, text) for role, text in messages])
+        return super().invoke(messages, **kwargs)
+
+
+def measure_call_site(function, inputs):
+    """
+    Send every sample input through the call site and count the prompt tokens.
+
+    Returns:
+        dict: Average tokens per call, split into the system prefix and the variable part,
+            and whether the prefix was identical for all inputs
+    """
+    llm = RecordingLLM()
+    for text in inputs:
+        function(text, llm)
+
+    prefixes = {messages[0][1] for messages in llm.sent}
+    totals, prefix_tokens = [], []
+    for messages in llm.sent:
+        tokens = [count_tokens(text) + MESSAGE_OVERHEAD_TOKENS for _, text in messages]
+        totals.append(sum(tokens))
+        prefix_tokens.append(tokens[0])
+    return {
+        "calls": len(llm.sent),
+        "prefix_tokens": round(sum(prefix_tokens) / len(prefix_tokens)),
+        "input_tokens": round(sum(totals) / len(totals)),
+        "stable_prefix": len(prefixes) == 1,
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"{'call site':<28}{'prefix':>8}{'input':>8}{'budget':>8}{'stable':>8}{'vs baseline':>13}")
+    over_budget = []
+    for call_site, stats in result.items():
+        budget = PROMPT_TOKEN_BUDGETS.get(call_site)
+        change = ""
+        if baseline and call_site in baseline:
+            old = baseline[call_site]["input_tokens"]
+            change = f"{(stats['input_tokens'] - old) / old * 100:+.1f}%"
+        print(f"{call_site:<28}{stats['prefix_tokens']:>8}{stats['input_tokens']:>8}{budget or '-':>8}"
+              f"{'yes' if stats['stable_prefix'] else 'no':>8}{change:>13}")
+        if budget and stats["input_tokens"] > budget:
+            over_budget.append(call_site)
+    return over_budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Input tokens per LLM call site compared to the prompt token budgets")
+    parser.add_argument("--save", help="write the result as JSON (e.g. to use as baseline)")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare against")
+    args = parser.parse_args()
+
+    result = {call_site: measure_call_site(function, inputs) for call_site, (function, inputs) in SAMPLES.items()}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    over_budget = print_report(result, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
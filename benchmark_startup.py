@@ -0,0 +1,80 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Packages whose import at startup is worth knowing about
+WATCHED_PACKAGES = [
+    "telegram", "openmensa", "langchain", "langchain_core", "langchain_openai", "langchain_ollama",
+    "langchain_groq", "openai", "PIL", "bs4", "requests", "selenium",
+]
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module, env=None):
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple: (wall seconds, {module: (self us, cumulative us, depth)}) or raises RuntimeError
+    """
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return float(result.stdout.strip().splitlines()[-1]), imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long importing the bot takes and what it loads")
+    parser.add_argument("--module", default="telegram_mensa_bot")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="number of slowest top-level imports to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Keep the measured import free of side effects
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env.setdefault("MENU_ARCHIVE_PATH", ":memory:")
+
+    timings = []
+    imports = {}
+    for _ in range(args.repeat):
+        try:
+            seconds, imports = measure_import(args.module, env)
+        except RuntimeError as e:
+            print(f"Import of {args.module} failed: {e}")
+            sys.exit(1)
+        timings.append(seconds)
+
+    print(f"import {args.module}: median {statistics.median(timings) * 1000:.1f} ms, "
+          f"min {min(timings) * 1000:.1f} ms over {args.repeat} runs")
+
+    # Direct imports of the measured module (depth 1) with their cumulative cost
+    top_level = sorted(
+        ((cumulative, name) for name, (_, cumulative, depth) in imports.items() if depth == 1),
+        reverse=True,
+    )
+    print("\nSlowest imports (cumulative ms):")
+    for cumulative, name in top_level[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+
+    loaded = [package for package in WATCHED_PACKAGES if package in imports]
+    print(f"\nHeavy packages loaded at startup: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
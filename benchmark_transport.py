@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import parse_qsl
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+from webhook_server import WebhookServer, read_http_request, write_http_response, SECRET_HEADER
+
+TOKEN = "123456:BENCHMARK"
+SECRET = "benchmark-secret"
+
+
+class FakeTelegramAPI:
+    """
+    Minimal local Bot API: serves getUpdates, pushes updates to a webhook and
+    records when the reply to each update arrives via sendMessage.
+    """
+
+    def __init__(self, push_connections=10):
+        self.port = None
+        self.pending = []
+        self.new_updates = asyncio.Event()
+        self.created = {}  # {update_id: perf_counter at creation}
+        self.latencies = {}  # {update_id: seconds until the reply arrived}
+        self.all_replied = asyncio.Event()
+        self.expected = 0
+        self.rejected = 0
+        self.webhook = None  # (host, port, path) while a webhook is set
+        self.push_queue = asyncio.Queue()
+        self.push_connections = push_connections
+        self._server = None
+        self._pushers = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for pusher in self._pushers:
+            pusher.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def set_webhook(self, host, port, path):
+        self.webhook = (host, port, path)
+        self._pushers = [asyncio.create_task(self._push()) for _ in range(self.push_connections)]
+
+    async def emit(self, count, rate, users):
+        """Create count text updates, rate per second (0 = all at once), from users distinct users."""
+        self.expected = count
+        for i in range(count):
+            update_id = i + 1
+            user = {"id": i % users + 1, "is_bot": False, "first_name": "Bench"}
+            update = {"update_id": update_id, "message": {
+                "message_id": update_id, "date": int(time.time()), "text": "ping",
+                "chat": {"id": user["id"], "type": "private"}, "from": user,
+            }}
+            self.created[update_id] = time.perf_counter()
+            if self.webhook:
+                self.push_queue.put_nowait(update)
+            else:
+                self.pending.append(update)
+                self.new_updates.set()
+            if rate:
+                await asyncio.sleep(1 / rate)
+
+    async def _push(self):
+        # One persistent connection per pusher, like Telegram's max_connections
+        host, port, path = self.webhook
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while True:
+                update = await self.push_queue.get()
+                body = json.dumps(update).encode("utf-8")
+                while True:
+                    writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                                  f"{SECRET_HEADER}: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+                    await writer.drain()
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    status = int(head.split(b" ", 2)[1])
+                    length = int(next((line.split(b":")[1] for line in head.split(b"\r\n")
+                                       if line.lower().startswith(b"content-length")), 0))
+                    await reader.readexactly(length)
+                    if status != 503:
+                        break
+                    # Backpressure: Telegram retries rejected updates later
+                    self.rejected += 1
+                    await asyncio.sleep(0.05)
+        finally:
+            writer.close()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_http_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                api_method = path.rsplit("/", 1)[-1]
+                result = await self._call(api_method, self._parameters(headers, body))
+                write_http_response(writer, 200, json.dumps({"ok": True, "result": result}).encode("utf-8"),
+                                    content_type="application/json")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _parameters(self, headers, body):
+        content_type = headers.get("content-type", "")
+        if "json" in content_type:
+            return json.loads(body or b"{}")
+        if "urlencoded" in content_type:
+            return dict(parse_qsl(body.decode("utf-8")))
+        return {}
+
+    async def _call(self, api_method, parameters):
+        if api_method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        if api_method == "getUpdates":
+            offset = int(parameters.get("offset") or 0)
+            self.pending = [update for update in self.pending if update["update_id"] >= offset]
+            if not self.pending:
+                self.new_updates.clear()
+                try:
+                    await asyncio.wait_for(self.new_updates.wait(), float(parameters.get("timeout") or 0))
+                except asyncio.TimeoutError:
+                    pass
+            return list(self.pending)
+        if api_method == "sendMessage":
+            update_id = int(parameters["text"])
+            self.latencies[update_id] = time.perf_counter() - self.created[update_id]
+            if len(self.latencies) >= self.expected:
+                self.all_replied.set()
+            return {"message_id": update_id, "date": int(time.time()), "text": parameters["text"],
+                    "chat": {"id": int(parameters["chat_id"]), "type": "private"}}
+        return True
+
+
+def summarize(latencies, elapsed):
+    values = sorted(latencies)
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+    return {
+        "updates": len(values),
+        "updates_per_second": round(len(values) / elapsed, 2),
+        "p50_ms": round(cuts[49] * 1000, 1),
+        "p95_ms": round(cuts[94] * 1000, 1),
+        "p99_ms": round(cuts[98] * 1000, 1),
+    }
+
+
+async def run_mode(mode, args):
+    """Run one transport against a fresh fake Telegram API and return its statistics."""
+    api = FakeTelegramAPI()
+    await api.start()
+
+    async def echo(update, context):
+        if args.handler_latency:
+            await asyncio.sleep(args.handler_latency)
+        await update.message.reply_text(str(update.update_id))
+
+    app = (ApplicationBuilder()
+           .token(TOKEN)
+           .base_url(api.base_url)
+           .concurrent_updates(args.workers if mode == "webhook" else False)
+           .build())
+    app.add_handler(MessageHandler(filters.TEXT, echo))
+
+    server = None
+    async with app:
+        await app.start()
+        if mode == "webhook":
+            server = WebhookServer(app, "/telegram", SECRET, args.workers, args.queue_size, port=0)
+            await server.start()
+            api.set_webhook("127.0.0.1", server.port, "/telegram")
+        else:
+            # Same settings as main()
+            await app.updater.start_polling(poll_interval=args.poll_interval, timeout=10)
+
+        start = time.perf_counter()
+        await api.emit(args.updates, args.rate, args.users)
+        await asyncio.wait_for(api.all_replied.wait(), args.timeout)
+        elapsed = time.perf_counter() - start
+
+        if server is not None:
+            await server.stop()
+        else:
+            await app.updater.stop()
+        await app.stop()
+    await api.stop()
+
+    result = summarize(api.latencies.values(), elapsed)
+    result["rejected"] = api.rejected
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare long polling and webhook delivery against a local fake Telegram API")
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=50, help="updates per second, 0 sends all at once")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=4, help="webhook workers")
+    parser.add_argument("--queue-size", type=int, default=100, help="pending updates per webhook worker")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--handler-latency", type=float, default=0.01, help="simulated seconds per handler")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--modes", default="polling,webhook")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'updates':>9}{'upd/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'503s':>7}")
+    for mode in args.modes.split(","):
+        result = asyncio.run(run_mode(mode, args))
+        print(f"{mode:<10}{result['updates']:>9}{result['updates_per_second']:>9}{result['p50_ms']:>10}"
+              f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['rejected']:>7}")
+
+
+if __name__ == "__main__":
+    main()
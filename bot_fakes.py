@@ -0,0 +1,163 @@
+# In-process stand-ins for OpenMensa, the LLM and Telegram,
+# used by benchmark_bot.py to drive the bot's handlers offline.
+import asyncio
+import itertools
+import json
+import os
+import time
+from datetime import date, timedelta
+
+OPENMENSA_FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "openmensa_fixture.json")
+
+
+class FakeOpenMensa:
+    """
+    Serves recorded canteens, days and meals with the OpenMensa wrapper's interface.
+
+    Days in the fixture are stored as offsets from "today", so the menus are
+    always current. latency (seconds) is added to every call.
+    """
+
+    def __init__(self, path=OPENMENSA_FIXTURE_PATH, latency=0.0, today=None):
+        with open(path, encoding="utf-8") as f:
+            self.fixture = json.load(f)
+        self.latency = latency
+        self.today = today or date.today()
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _offset(self, date_str):
+        return (date.fromisoformat(date_str) - self.today).days
+
+    def get_canteen(self, canteen_id):
+        self._wait()
+        return self.fixture["canteens"][str(canteen_id)]
+
+    def get_canteen_days(self, canteen_id):
+        self._wait()
+        return [
+            {"date": (self.today + timedelta(days=day["offset"])).strftime("%Y-%m-%d"), "closed": day["closed"]}
+            for day in self.fixture["days"][str(canteen_id)]
+        ]
+
+    def get_meals_by_day(self, canteen_id, date_str):
+        self._wait()
+        return self.fixture["meals"].get(f"{canteen_id}:{self._offset(date_str)}", [])
+
+
+class FakeResponse:
+    """Mimics a LangChain AIMessage."""
+
+    def __init__(self, content, input_tokens=0, output_tokens=0):
+        self.content = content
+        self.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+
+class FakeLLM:
+    """
+    Deterministic chat model with configurable latency.
+
+    Answers are derived from the system prompt, so meal classification,
+    intent classification, date parsing and chat all get plausible output.
+    """
+
+    VEGETARIAN_HINTS = ["käse", "gemüse", "linsen", "falafel", "spiegelei", "sin carne", "pudding", "salat"]
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _text(self, message):
+        if isinstance(message, tuple):
+            return message[1]
+        return getattr(message, "content", str(message))
+
+    def _answer(self, system_prompt, human):
+        lowered_system = system_prompt.lower()
+        lowered_human = human.lower()
+        if "vegetarian" in lowered_system and "emojis" in lowered_system:
+            vegetarian = any(hint in lowered_human for hint in self.VEGETARIAN_HINTS)
+            meal_type = "vegetarian" if vegetarian else "non-vegetarian"
+            return json.dumps({"type": meal_type, "emojis": ["🍽️"]})
+        if "intent" in lowered_system:
+            command = "menu" if any(word in lowered_human for word in ["essen", "menü", "mensa"]) else "chat"
+            return json.dumps({"command": command, "date": None, "mensa_location": None})
+        if "date" in lowered_system:
+            return (date.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+        return "Das ist eine Antwort des Benchmark-Modells."
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        system_prompt = " ".join(self._text(m) for m in messages[:-1])
+        human = self._text(messages[-1])
+        content = self._answer(system_prompt, human)
+        # Roughly 4 characters per token
+        return FakeResponse(content, (len(system_prompt) + len(human)) // 4, len(content) // 4)
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeMessage:
+    """Records replies instead of calling the Telegram API."""
+
+    def __init__(self, text, api_latency=0.0):
+        self.text = text
+        self.api_latency = api_latency
+        self.replies = []
+
+    async def _send(self, kind, payload):
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        self.replies.append((kind, payload))
+        return self
+
+    async def reply_text(self, text, **kwargs):
+        return await self._send("text", text)
+
+    async def reply_photo(self, photo, **kwargs):
+        self.photo = []
+        return await self._send("photo", kwargs.get("caption"))
+
+    async def reply_media_group(self, media, **kwargs):
+        await self._send("media_group", len(media))
+        return []
+
+
+class FakeBot:
+    def __init__(self, api_latency=0.0):
+        self.api_latency = api_latency
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        self.sent.append((chat_id, text))
+
+
+class FakeUpdate:
+    _ids = itertools.count(1)
+
+    def __init__(self, user_id, text, api_latency=0.0):
+        self.update_id = next(FakeUpdate._ids)
+        self.effective_user = FakeUser(user_id)
+        self.message = FakeMessage(text, api_latency)
+
+
+class FakeContext:
+    def __init__(self, args=None, bot=None):
+        self.args = args
+        self.bot = bot or FakeBot()
+        self.job_queue = None
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from llm_calls import invoke_llm
+
+# Tokens of recent turns sent with every chat request; older turns are summarized
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "600"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "150"))
+CHAT_SESSION_IDLE_SECONDS = int(os.getenv("CHAT_SESSION_IDLE_SECONDS", "3600"))
+CHAT_EVICT_INTERVAL = 10 * 60  # seconds between removals of idle sessions
+# Messages that slid out of the window before a summary is written (two question/answer pairs)
+SUMMARIZE_PENDING_TURNS = 4
+# Unsummarized turns kept at most, e.g. while summarizing fails; the oldest are dropped
+MAX_PENDING_TURNS = 20
+
+SUMMARY_PROMPT = """Fasse das bisherige Gespräch zwischen einem Nutzer und dem Mensa-Bot in höchstens drei Sätzen zusammen.
+Behalte Fakten, die für spätere Fragen wichtig sind (Vorlieben, Allergien, genannte Gerichte, Tage, Mensen).
+Antworte nur mit der Zusammenfassung auf Deutsch."""
+
+
+def estimate_tokens(text):
+    """Rough token count, about 4 characters per token."""
+    return len(text) // 4 + 1
+
+
+class ChatMemory:
+    """
+    Per-user chat history with a constant prompt size.
+
+    Every request gets the stable system prompt, a short summary of older turns
+    and as many recent turns as fit into history_tokens. Turns that slide out of
+    the window are kept as pending until summarize() folds them into the
+    summary; that is meant to run in the background after the reply was sent.
+    Sessions idle for longer than idle_seconds are removed by evict_idle().
+
+    Args:
+        sessions: Mapping user_id -> session dict, e.g. a shared_state.SharedDict
+            in multi-worker mode (sessions are always written back as a whole)
+    """
+
+    def __init__(self, sessions=None, history_tokens=CHAT_HISTORY_TOKENS, summary_tokens=CHAT_SUMMARY_TOKENS,
+                 idle_seconds=CHAT_SESSION_IDLE_SECONDS):
+        self.sessions = {} if sessions is None else sessions
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.idle_seconds = idle_seconds
+        self._summarizing = set()
+        self._lock = threading.Lock()
+
+    def _load(self, user_id):
+        session = self.sessions.get(user_id) or {"summary": "", "turns": [], "pending": [], "last_active": 0}
+        # Number of turns that ever left the pending list (summarized or dropped), identifies pending[0]
+        session.setdefault("pending_offset", 0)
+        return session
+
+    def build_messages(self, user_id, system_prompt, message_text):
+        """Messages for a chat request: system prompt, summary, recent turns and the new message."""
+        session = self._load(user_id)
+        messages = [("system", system_prompt)]
+        if session["summary"]:
+            messages.append(("system", f"Bisheriges Gespräch: {session['summary']}"))
+        messages.extend(session["turns"])
+        messages.append(("human", message_text))
+        return messages
+
+    def add_turn(self, user_id, message_text, response):
+        """
+        Store a question and its answer.
+
+        Returns:
+            bool: Whether enough older turns are waiting to be summarized
+        """
+        with self._lock:
+            session = self._load(user_id)
+            turns = session["turns"] + [("human", message_text), ("ai", response)]
+            pending = session["pending"]
+            # Slide the window by whole question/answer pairs
+            while len(turns) > 2 and sum(estimate_tokens(text) for _, text in turns) > self.history_tokens:
+                pending = pending + turns[:2]
+                turns = turns[2:]
+            dropped = max(0, len(pending) - MAX_PENDING_TURNS)
+            session.update(turns=turns, pending=pending[dropped:], pending_offset=session["pending_offset"] + dropped,
+                           last_active=time.time())
+            self.sessions[user_id] = session
+            return len(session["pending"]) >= SUMMARIZE_PENDING_TURNS
+
+    def summarize(self, user_id, llm):
+        """Fold the pending turns into the summary (blocking LLM call, run it in a thread)."""
+        with self._lock:
+            if user_id in self._summarizing:
+                return
+            session = self._load(user_id)
+            pending = session["pending"]
+            if not pending:
+                return
+            summarized_until = session["pending_offset"] + len(pending)
+            self._summarizing.add(user_id)
+
+        transcript = "\n".join(f"{'Nutzer' if role == 'human' else 'Bot'}: {text}" for role, text in pending)
+        if session["summary"]:
+            transcript = f"Bisherige Zusammenfassung: {session['summary']}\n\n{transcript}"
+        try:
+            summary = invoke_llm(llm, [("system", SUMMARY_PROMPT), ("human", transcript)], "summarize_chat",
+                                 max_output_tokens=self.summary_tokens).content.strip()
+        except Exception as e:
+            print(f"Fehler beim Zusammenfassen des Chats von {user_id}: {e}")
+            summary = None
+
+        with self._lock:
+            self._summarizing.discard(user_id)
+            if user_id not in self.sessions:  # cleared in the meantime
+                return
+            if summary is None:
+                return  # pending turns are retried with the next summary
+            session = self._load(user_id)
+            session["summary"] = summary
+            # Turns that became pending while the summary was written stay for the next round
+            done = min(len(session["pending"]), max(0, summarized_until - session["pending_offset"]))
+            session["pending"] = session["pending"][done:]
+            session["pending_offset"] += done
+            self.sessions[user_id] = session
+
+    def clear(self, user_id):
+        with self._lock:
+            self.sessions.pop(user_id, None)
+
+    def evict_idle(self, now=None):
+        """Remove sessions without activity for idle_seconds. Returns the number removed."""
+        cutoff = (time.time() if now is None else now) - self.idle_seconds
+        with self._lock:
+            idle = [user_id for user_id, session in list(self.sessions.items()) if session["last_active"] < cutoff]
+            for user_id in idle:
+                self.sessions.pop(user_id, None)
+        return len(idle)
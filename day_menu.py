@@ -0,0 +1,333 @@
+import hashlib
+import json
+import threading
+import time
+import mensa_utils
+from ollama_mensa_bot_utils import classify_meal
+from menu_archive import archive_day_menu, get_archived_classifications
+from metrics import record_cache
+from shared_state import shared_dict
+
+# A fetched and classified day menu is shared by all users of a mensa for this many seconds
+DAY_MENU_TTL = 15 * 60
+
+# Filter applied when a user has not configured anything (same result as before per-user filters)
+DEFAULT_MEAL_FILTER = {
+    "vegetarian_only": False,
+    "max_price": None,
+    "excluded_categories": list(mensa_utils.DEFAULT_EXCLUDED_CATEGORIES),
+}
+
+# Hidden by the default filter, so their meals are only classified once a user's filter shows them
+LAZY_CATEGORIES = list(mensa_utils.DEFAULT_EXCLUDED_CATEGORIES)
+
+# Shared between worker processes in multi-worker mode (time.monotonic is system-wide on one host)
+_day_menus = shared_dict("day_menus")  # {(mensa_name, date_str): (fetched_at, DayMenu)}
+# One fetch per mensa and date at a time, concurrent callers wait for its result
+_fetch_locks = {}  # {(mensa_name, date_str): threading.Lock}
+_fetch_locks_guard = threading.Lock()
+
+
+def meal_content_key(meal):
+    """Return the classification-independent content of a raw or classified meal dict."""
+    return (
+        meal["category"],
+        meal["name"],
+        sorted((meal.get("prices") or {}).items()),
+        list(meal.get("notes") or []),
+    )
+
+
+def content_hash(meals):
+    """Hash the content of raw OpenMensa meals (or DayMenu.meals) without classifying them."""
+    payload = json.dumps([meal_content_key(meal) for meal in meals], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DayMenu:
+    """All meals of one mensa on one day, including their classification."""
+
+    def __init__(self, mensa_name, date_str, meals=None, closed=False, error=None):
+        self.mensa_name = mensa_name
+        self.date_str = date_str
+        # Each meal is a dict with category, name, price, prices, notes, classification, emojis
+        self.meals = meals or []
+        self.closed = closed
+        self.error = error
+
+    def __str__(self):
+        return f"DayMenu: {self.mensa_name} {self.date_str}, {len(self.meals)} meals, closed={self.closed}"
+
+    def fingerprint(self):
+        """Return a stable hash over the meals and their classifications."""
+        payload = json.dumps(
+            [self.closed, self.error, self.meals], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def content_hash(self):
+        """Return the hash of the meal content only, comparable to content_hash(raw_meals)."""
+        return content_hash(self.meals)
+
+    def to_meals_data(self):
+        """Convert to the dict layout used by format_meals_output."""
+        if self.error:
+            return {"error": self.error}
+        if self.closed:
+            return {"error": f"Die Mensa {self.mensa_name} ist am {self.date_str} geschlossen."}
+
+        vegetarian_meals = {}
+        non_vegetarian_meals = {}
+        for meal in self.meals:
+            if meal["price"] is None:
+                meal_info = f"{meal['emojis']} {meal['name']}"
+            else:
+                meal_info = f"{meal['emojis']} {meal['name']} ({meal['price']:.2f}€)"
+            if meal["classification"] == "vegetarian":
+                vegetarian_meals.setdefault(meal["category"], []).append(meal_info)
+            else:
+                non_vegetarian_meals.setdefault(meal["category"], []).append(meal_info)
+
+        return {
+            "vegetarian": vegetarian_meals,
+            "non_vegetarian": non_vegetarian_meals
+        }
+
+
+def fetch_day_menu(mensa_name, date_str, llm=None):
+    """
+    Fetch and classify all meals of a mensa on a date, without any filtering.
+
+    Args:
+        mensa_name (str): Name of the mensa
+        date_str (str): Date string in YYYY-MM-DD format
+        llm: LLM instance used for classification
+
+    Returns:
+        DayMenu: The classified day menu (with error set if fetching failed)
+    """
+    try:
+        mensa_id = mensa_utils.get_mensa_id(mensa_name)
+    except KeyError:
+        return DayMenu(mensa_name, date_str, error=f"Unbekannte Mensa: {mensa_name}")
+
+    try:
+        if mensa_utils.is_canteen_closed(mensa_id, date_str):
+            return DayMenu(mensa_name, date_str, closed=True)
+        raw_meals = mensa_utils.get_raw_meals(mensa_id, date_str)
+    except Exception as e:
+        return DayMenu(mensa_name, date_str, error=f"Gerichte für {date_str} konnten nicht abgerufen werden: {e}")
+
+    return build_day_menu(mensa_name, date_str, raw_meals, llm)
+
+
+def build_day_menu(mensa_name, date_str, raw_meals, llm=None, known_classifications=None, classify_lazy=False):
+    """
+    Classify raw OpenMensa meals into a DayMenu.
+
+    Meals in LAZY_CATEGORIES that are not known from the archive stay
+    unclassified (classification None) unless classify_lazy is set, see
+    classify_hidden_meals.
+
+    Args:
+        mensa_name (str): Name of the mensa
+        date_str (str): Date string in YYYY-MM-DD format
+        raw_meals (list): Meal dicts as returned by mensa_utils.get_raw_meals
+        llm: LLM instance used for classification
+        known_classifications (dict): {meal_name: (classification, emojis)} to reuse
+            instead of asking the LLM again
+        classify_lazy (bool): Also classify unknown meals in LAZY_CATEGORIES
+
+    Returns:
+        DayMenu: The classified day menu
+    """
+    # Meals served before are classified from the archive, every other distinct name exactly once
+    names = {meal["name"] for meal in raw_meals}
+    unknown_names = names - set(known_classifications or {})
+    classifications = get_archived_classifications(unknown_names)
+    for name in unknown_names:
+        record_cache("classification_archive", name in classifications)
+    classifications.update(known_classifications or {})
+    meals = []
+    for meal in raw_meals:
+        name = meal["name"]
+        if name not in classifications and (classify_lazy or not is_lazy_category(meal["category"])):
+            classifications[name] = classify_meal(name, llm)
+        classification, emojis = classifications.get(name, (None, None))
+        prices = meal.get("prices") or {}
+        meals.append({
+            "category": meal["category"],
+            "name": name,
+            "price": prices.get("students"),
+            "prices": prices,
+            "notes": meal.get("notes") or [],
+            "classification": classification,
+            "emojis": emojis,
+        })
+
+    return DayMenu(mensa_name, date_str, meals)
+
+
+def is_lazy_category(category):
+    return any(lazy in category for lazy in LAZY_CATEGORIES)
+
+
+def unclassified_meal(meal):
+    """Convert a raw OpenMensa meal into the DayMenu meal layout, without classifying it."""
+    prices = meal.get("prices") or {}
+    return {
+        "category": meal["category"],
+        "name": meal["name"],
+        "price": prices.get("students"),
+        "prices": prices,
+        "notes": meal.get("notes") or [],
+        "classification": None,
+        "emojis": None,
+    }
+
+
+def group_raw_meals(mensa_name, dated_meals):
+    """
+    Group raw (date_str, meal) tuples into unclassified day menus, e.g. for archiving prefetched weeks.
+
+    Returns:
+        list: DayMenu objects whose meals have no classification
+    """
+    meals_by_date = {}
+    for date_str, meal in dated_meals:
+        meals_by_date.setdefault(date_str, []).append(unclassified_meal(meal))
+    return [DayMenu(mensa_name, date_str, meals) for date_str, meals in sorted(meals_by_date.items())]
+
+
+def _get_fresh_day_menu(key):
+    entry = _day_menus.get(key)
+    if entry is not None and time.monotonic() - entry[0] <= DAY_MENU_TTL:
+        return entry[1]
+    return None
+
+
+def get_day_menu(mensa_name, date_str, llm=None):
+    """
+    Return the shared day menu, fetching and classifying it only if the cached one is stale.
+
+    Callers run in I/O threads; concurrent requests for the same mensa and date
+    wait for a single fetch instead of each asking OpenMensa and the LLM.
+    """
+    key = (mensa_name, date_str)
+    day_menu = _get_fresh_day_menu(key)
+    if day_menu is not None:
+        record_cache("day_menu", True)
+        return day_menu
+    record_cache("day_menu", False)
+
+    with _fetch_locks_guard:
+        lock = _fetch_locks.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            # Fetched by another caller while this one waited
+            day_menu = _get_fresh_day_menu(key)
+            if day_menu is not None:
+                return day_menu
+            day_menu = fetch_day_menu(mensa_name, date_str, llm)
+            # Failed fetches are not shared so the next request retries
+            if day_menu.error is None:
+                _day_menus[key] = (time.monotonic(), day_menu)
+                archive_day_menu(day_menu)
+            return day_menu
+    finally:
+        with _fetch_locks_guard:
+            if _fetch_locks.get(key) is lock:
+                del _fetch_locks[key]
+
+
+def get_cached_day_menu(mensa_name, date_str):
+    """Return the last shared day menu regardless of its age, or None."""
+    entry = _day_menus.get((mensa_name, date_str))
+    return entry[1] if entry is not None else None
+
+
+def store_day_menu(day_menu):
+    """Share an already built day menu (e.g. after a refetch by the menu watcher)."""
+    _day_menus[(day_menu.mensa_name, day_menu.date_str)] = (time.monotonic(), day_menu)
+    archive_day_menu(day_menu)
+
+
+def invalidate_day_menus(mensa_name=None, date_str=None):
+    """Drop cached day menus (all mensas/dates if None)."""
+    for key in list(_day_menus):
+        if (mensa_name is None or key[0] == mensa_name) and (date_str is None or key[1] == date_str):
+            _day_menus.pop(key, None)
+
+
+def shows_unclassified_meals(day_menu, meal_filter=None):
+    """Whether a filter lets meals through that build_day_menu left unclassified."""
+    if meal_filter is None:
+        meal_filter = DEFAULT_MEAL_FILTER
+    excluded_categories = meal_filter.get("excluded_categories") or []
+    return any(
+        meal["classification"] is None and not any(excluded in meal["category"] for excluded in excluded_categories)
+        for meal in day_menu.meals
+    )
+
+
+def classify_hidden_meals(day_menu, llm=None):
+    """
+    Classify the meals build_day_menu left unclassified and share the completed day menu.
+
+    Called when a filter shows LAZY_CATEGORIES, so their meals are only
+    classified for users who actually see them.
+    """
+    known_classifications = {
+        meal["name"]: (meal["classification"], meal["emojis"])
+        for meal in day_menu.meals if meal["classification"] is not None
+    }
+    completed = build_day_menu(day_menu.mensa_name, day_menu.date_str, day_menu.meals, llm,
+                               known_classifications, classify_lazy=True)
+    key = (day_menu.mensa_name, day_menu.date_str)
+    entry = _day_menus.get(key)
+    # Keeps the fetch time, so the menu is still refetched after DAY_MENU_TTL
+    _day_menus[key] = (entry[0] if entry is not None else time.monotonic(), completed)
+    archive_day_menu(completed)
+    return completed
+
+
+def filter_key(meal_filter=None):
+    """Return a short, hashable description of a meal filter (used in cache keys)."""
+    if meal_filter is None:
+        meal_filter = DEFAULT_MEAL_FILTER
+    return (
+        bool(meal_filter.get("vegetarian_only")),
+        meal_filter.get("max_price"),
+        tuple(sorted(meal_filter.get("excluded_categories") or [])),
+    )
+
+
+def filter_day_menu(day_menu, meal_filter=None):
+    """
+    Apply user filter preferences to a shared day menu without refetching.
+
+    Args:
+        day_menu (DayMenu): The shared, classified day menu
+        meal_filter (dict): Keys vegetarian_only, max_price, excluded_categories
+
+    Returns:
+        DayMenu: A new day menu containing only the matching meals
+    """
+    if meal_filter is None:
+        meal_filter = DEFAULT_MEAL_FILTER
+
+    vegetarian_only = meal_filter.get("vegetarian_only")
+    max_price = meal_filter.get("max_price")
+    excluded_categories = meal_filter.get("excluded_categories") or []
+
+    meals = []
+    for meal in day_menu.meals:
+        if any(excluded in meal["category"] for excluded in excluded_categories):
+            continue
+        if vegetarian_only and meal["classification"] != "vegetarian":
+            continue
+        if max_price is not None and (meal["price"] is None or meal["price"] > max_price):
+            continue
+        meals.append(meal)
+
+    return DayMenu(day_menu.mensa_name, day_menu.date_str, meals, day_menu.closed, day_menu.error)
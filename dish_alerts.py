@@ -0,0 +1,192 @@
+import re
+import unicodedata
+from datetime import date, timedelta
+import mensa_utils
+
+# How many days ahead upcoming menus are checked for favourite dishes
+ALERT_LOOKAHEAD_DAYS = 7
+
+
+def normalize_text(text):
+    """Lowercase and normalize a dish name or keyword (keeps German umlauts)."""
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def tokenize(text):
+    """Split a dish name or keyword into normalized word tokens."""
+    return re.findall(r"\w+", normalize_text(text))
+
+
+class DishAlertIndex:
+    """
+    Inverted index from keyword tokens to subscriptions.
+
+    Each subscription is stored under the first token of its keyword only, so
+    matching a menu costs one dictionary lookup per meal token, independent
+    of the number of subscribers. Multi-word keywords are then verified
+    against the remaining tokens of the meal.
+
+    Args:
+        subscriptions: Optional {user_id: [keyword, ...]} mapping the index is
+            persisted to, e.g. a shared_state.SharedDict in multi-worker mode
+    """
+
+    def __init__(self, subscriptions=None):
+        self._index = {}  # {anchor_token: {(user_id, keyword)}}
+        self._keyword_tokens = {}  # {keyword: tuple of tokens}
+        self._user_keywords = {}  # {user_id: {keyword}}
+        self._subscriptions = subscriptions
+        if subscriptions is not None:
+            self.reload()
+
+    def reload(self):
+        """Rebuild the index from the subscriptions mapping (picks up changes of other workers)."""
+        if self._subscriptions is None:
+            return
+        self._index.clear()
+        self._keyword_tokens.clear()
+        self._user_keywords.clear()
+        for user_id, keywords in self._subscriptions.items():
+            for keyword in keywords:
+                self._add(user_id, keyword)
+
+    def _add(self, user_id, keyword):
+        tokens = tuple(tokenize(keyword))
+        if not tokens:
+            return False
+        keyword = " ".join(tokens)
+        self._keyword_tokens[keyword] = tokens
+        self._index.setdefault(tokens[0], set()).add((user_id, keyword))
+        self._user_keywords.setdefault(user_id, set()).add(keyword)
+        return True
+
+    def _discard(self, user_id, keywords):
+        for keyword in keywords:
+            subscribers = self._index.get(self._keyword_tokens[keyword][0])
+            if subscribers is not None:
+                subscribers.discard((user_id, keyword))
+                if not subscribers:
+                    del self._index[self._keyword_tokens[keyword][0]]
+
+    def _reload_user(self, user_id):
+        """Replace one user's postings with their persisted entry (it may have been changed by another worker)."""
+        if self._subscriptions is None:
+            return
+        self._discard(user_id, self._user_keywords.pop(user_id, set()))
+        for keyword in self._subscriptions.get(user_id, []):
+            self._add(user_id, keyword)
+
+    def _persist(self, user_id):
+        if self._subscriptions is None:
+            return
+        keywords = self._user_keywords.get(user_id)
+        if keywords:
+            self._subscriptions[user_id] = sorted(keywords)
+        else:
+            self._subscriptions.pop(user_id, None)
+
+    def subscribe(self, user_id, keyword):
+        """Register a keyword for a user. Returns False if the keyword has no tokens."""
+        self._reload_user(user_id)
+        if not self._add(user_id, keyword):
+            return False
+        self._persist(user_id)
+        return True
+
+    def unsubscribe(self, user_id, keyword=None):
+        """Remove one keyword of a user, or all of them if keyword is None."""
+        self._reload_user(user_id)
+        if keyword is None:
+            keywords = self._user_keywords.pop(user_id, set())
+        else:
+            keyword = " ".join(tokenize(keyword))
+            keywords = {keyword} & self._user_keywords.get(user_id, set())
+            self._user_keywords.get(user_id, set()).discard(keyword)
+
+        self._discard(user_id, keywords)
+        self._persist(user_id)
+        return bool(keywords)
+
+    def keywords_for(self, user_id):
+        """Return the sorted keywords a user is subscribed to."""
+        if self._subscriptions is not None:
+            return list(self._subscriptions.get(user_id, []))
+        return sorted(self._user_keywords.get(user_id, set()))
+
+    def match_meal(self, meal_name):
+        """
+        Return all (user_id, keyword) subscriptions matching a meal name.
+
+        Args:
+            meal_name (str): Name of the meal
+
+        Returns:
+            set: Matching (user_id, keyword) tuples
+        """
+        meal_tokens = tokenize(meal_name)
+        meal_token_set = set(meal_tokens)
+        matches = set()
+        for token in meal_token_set:
+            for user_id, keyword in self._index.get(token, ()):
+                if meal_token_set.issuperset(self._keyword_tokens[keyword]):
+                    matches.add((user_id, keyword))
+        return matches
+
+
+def get_upcoming_meals(mensa_name, start_date=None, days=ALERT_LOOKAHEAD_DAYS):
+    """
+    Fetch the raw meals of the upcoming open days of a mensa.
+
+    Returns:
+        list: (date_str, meal dict) tuples
+    """
+    if start_date is None:
+        start_date = date.today()
+    end_str = (start_date + timedelta(days=days)).strftime("%Y-%m-%d")
+    start_str = start_date.strftime("%Y-%m-%d")
+
+    mensa_id = mensa_utils.get_mensa_id(mensa_name)
+    upcoming = []
+    for date_str in mensa_utils.get_open_days(mensa_id):
+        if not start_str <= date_str < end_str:
+            continue
+        try:
+            for meal in mensa_utils.get_raw_meals(mensa_id, date_str):
+                upcoming.append((date_str, meal))
+        except Exception as e:
+            print(f"Fehler beim Abrufen der Gerichte von {mensa_name} am {date_str}: {e}")
+    return upcoming
+
+
+def find_dish_alerts(index, mensa_name, upcoming_meals, user_mensas, sent_alerts):
+    """
+    Match upcoming meals of one mensa against all subscriptions.
+
+    Args:
+        index (DishAlertIndex): The subscription index
+        mensa_name (str): Mensa the meals belong to
+        upcoming_meals (list): (date_str, meal dict) tuples
+        user_mensas (callable): Returns the mensa name of a user id
+        sent_alerts (set): Already sent alert keys, updated in place
+
+    Returns:
+        dict: {user_id: [(keyword, date_str, meal_name)]} of new alerts
+    """
+    alerts = {}
+    for date_str, meal in upcoming_meals:
+        for user_id, keyword in index.match_meal(meal["name"]):
+            if user_mensas(user_id) != mensa_name:
+                continue
+            alert_key = (user_id, keyword, mensa_name, date_str, meal["name"])
+            if alert_key in sent_alerts:
+                continue
+            sent_alerts.add(alert_key)
+            alerts.setdefault(user_id, []).append((keyword, date_str, meal["name"]))
+    return alerts
+
+
+def prune_sent_alerts(sent_alerts, today_str):
+    """Forget sent alerts for days before today_str (YYYY-MM-DD), they cannot be sent again anyway."""
+    for alert_key in list(sent_alerts):
+        if alert_key[3] < today_str:
+            sent_alerts.discard(alert_key)
@@ -0,0 +1,226 @@
+import bisect
+import difflib
+import statistics
+import threading
+import time
+from datetime import date, datetime
+from dish_alerts import normalize_text, tokenize
+from menu_archive import add_archive_listener, iter_served_dates
+
+# Minimum similarity (0..1) for a fuzzy dish name match
+MIN_MATCH_SCORE = 0.6
+
+# Scoring fewer names is cheaper than the round trip to a worker process
+OFFLOAD_MIN_CANDIDATES = 300
+
+# Other workers archive menus too, so the index is rebuilt from the archive after this many seconds
+DISH_INDEX_REFRESH_SECONDS = 15 * 60
+
+
+def score_dish_names(query_norm, candidates, limit=3):
+    """
+    Fuzzy-score dish names against a normalized query.
+
+    Returns:
+        list: (score, name_norm) tuples above MIN_MATCH_SCORE, best first
+    """
+    query_tokens = tokenize(query_norm)
+    scored = []
+    for name_norm in candidates:
+        score = difflib.SequenceMatcher(None, query_norm, name_norm).ratio()
+        # Misspelled single words ("kässpätzle") match the corresponding word of the dish name
+        name_tokens = tokenize(name_norm)
+        if query_tokens and name_tokens:
+            token_score = statistics.mean(
+                max(difflib.SequenceMatcher(None, query_token, name_token).ratio() for name_token in name_tokens)
+                for query_token in query_tokens
+            )
+            score = max(score, 0.95 * token_score)
+        # A query contained in the dish name ("currywurst" in "currywurst mit pommes") is a good match
+        if query_norm in name_norm:
+            score = max(score, 0.9)
+        if score >= MIN_MATCH_SCORE:
+            scored.append((score, name_norm))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored[:limit]
+
+
+class DishHistoryIndex:
+    """
+    In-memory index of dish name -> served dates per mensa, built from the menu archive.
+
+    Lookups only touch the dishes sharing a token with the query (or, as a
+    fallback, the distinct dish names), never the archive rows. The archive
+    listener updates the index from other threads, so access is locked.
+    """
+
+    def __init__(self):
+        self._dates = {}  # {name_norm: {mensa_name: sorted list of date strings}}
+        self._names = {}  # {name_norm: display name}
+        self._token_index = {}  # {token: {name_norm}}
+        self._menus = {}  # {(mensa_name, date_str): {name_norm}}
+        self._lock = threading.Lock()
+        self.loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name, mensa_name, date_str, name_norm=None):
+        """Record that a dish was (or will be) served on a date."""
+        if name_norm is None:
+            name_norm = normalize_text(name)
+        with self._lock:
+            self._add(name, mensa_name, date_str, name_norm)
+
+    def _add(self, name, mensa_name, date_str, name_norm):
+        self._menus.setdefault((mensa_name, date_str), set()).add(name_norm)
+        if name_norm not in self._names:
+            self._names[name_norm] = name
+            for token in tokenize(name_norm):
+                self._token_index.setdefault(token, set()).add(name_norm)
+
+        dates = self._dates.setdefault(name_norm, {}).setdefault(mensa_name, [])
+        position = bisect.bisect_left(dates, date_str)
+        if position == len(dates) or dates[position] != date_str:
+            dates.insert(position, date_str)
+
+    def _remove(self, name_norm, mensa_name, date_str):
+        """Forget one date of a dish, and the dish once it has no dates left."""
+        by_mensa = self._dates.get(name_norm, {})
+        dates = by_mensa.get(mensa_name, [])
+        position = bisect.bisect_left(dates, date_str)
+        if position < len(dates) and dates[position] == date_str:
+            del dates[position]
+        if not dates:
+            by_mensa.pop(mensa_name, None)
+        if by_mensa:
+            return
+        self._dates.pop(name_norm, None)
+        self._names.pop(name_norm, None)
+        for token in tokenize(name_norm):
+            names = self._token_index.get(token)
+            if names is not None:
+                names.discard(name_norm)
+                if not names:
+                    del self._token_index[token]
+
+    def add_day_menu(self, day_menu):
+        """Replace the dishes of a day with the meals of a DayMenu (used as archive listener)."""
+        key = (day_menu.mensa_name, day_menu.date_str)
+        names = {normalize_text(meal["name"]): meal["name"] for meal in day_menu.meals}
+        with self._lock:
+            # Dishes dropped from a planned menu were never served on that day
+            for name_norm in self._menus.pop(key, set()) - set(names):
+                self._remove(name_norm, day_menu.mensa_name, day_menu.date_str)
+            for name_norm, name in names.items():
+                self._add(name, day_menu.mensa_name, day_menu.date_str, name_norm)
+
+    def load_from_archive(self):
+        """Rebuild the index from all archived meals in a single pass."""
+        fresh = DishHistoryIndex()
+        for name_norm, name, mensa_name, date_str in iter_served_dates():
+            fresh._add(name, mensa_name, date_str, name_norm)
+        with self._lock:
+            self._dates, self._names = fresh._dates, fresh._names
+            self._token_index, self._menus = fresh._token_index, fresh._menus
+            self.loaded_at = time.monotonic()
+
+    def find_dishes(self, query, limit=3):
+        """
+        Fuzzy-match a query against all known dish names.
+
+        Args:
+            query (str): Dish name as typed by the user
+            limit (int): Maximum number of matches
+
+        Returns:
+            list: (score, name_norm) tuples, best first
+        """
+        query_norm, candidates = self.candidate_names(query)
+        return score_dish_names(query_norm, candidates, limit)
+
+    def candidate_names(self, query):
+        """
+        Return the normalized query and the dish names worth scoring for it.
+
+        Scoring them with score_dish_names is the expensive part of find_dishes
+        and can run in a worker process.
+        """
+        query_norm = normalize_text(query).strip()
+        with self._lock:
+            if query_norm in self._names:
+                return query_norm, [query_norm]
+
+            # Candidates share a (possibly misspelled) word with the query
+            candidates = set()
+            for token in tokenize(query_norm):
+                candidates |= self._token_index.get(token, set())
+                for indexed_token in difflib.get_close_matches(token, self._token_index, n=5, cutoff=0.8):
+                    candidates |= self._token_index[indexed_token]
+            if not candidates:
+                candidates = self._names
+            return query_norm, sorted(candidates)
+
+    def display_name(self, name_norm):
+        # The dish may have been dropped from a planned menu since it was matched
+        return self._names.get(name_norm, name_norm)
+
+    def served_dates(self, name_norm, mensa_name=None):
+        """Return the sorted served dates of a dish (for one mensa or all)."""
+        with self._lock:
+            by_mensa = self._dates.get(name_norm, {})
+            if mensa_name is not None:
+                return list(by_mensa.get(mensa_name, []))
+            return sorted({date_str for dates in by_mensa.values() for date_str in dates})
+
+    def forecast(self, name_norm, mensa_name=None, today=None):
+        """
+        Predict when a dish is served next.
+
+        Returns:
+            dict: next_date (known upcoming date or None), last_date, expected_date
+                (last date plus the median gap between servings, or None),
+                times_served
+        """
+        if today is None:
+            today = date.today()
+        today_str = today.strftime("%Y-%m-%d")
+        dates = self.served_dates(name_norm, mensa_name)
+
+        position = bisect.bisect_left(dates, today_str)
+        next_date = dates[position] if position < len(dates) else None
+        past_dates = dates[:position]
+        last_date = past_dates[-1] if past_dates else None
+
+        expected_date = None
+        if next_date is None and len(past_dates) >= 2:
+            parsed = [datetime.strptime(date_str, "%Y-%m-%d").date() for date_str in past_dates]
+            median_gap = statistics.median(
+                (later - earlier).days for earlier, later in zip(parsed, parsed[1:])
+            )
+            expected = parsed[-1].toordinal() + int(median_gap)
+            if expected >= today.toordinal():
+                expected_date = date.fromordinal(expected).strftime("%Y-%m-%d")
+
+        return {
+            "next_date": next_date,
+            "last_date": last_date,
+            "expected_date": expected_date,
+            "times_served": len(past_dates),
+        }
+
+
+_dish_history_index = None
+_index_lock = threading.Lock()
+
+
+def get_dish_history_index():
+    """Return the shared index, rebuilding it from the archive when it is older than DISH_INDEX_REFRESH_SECONDS."""
+    global _dish_history_index
+    with _index_lock:
+        if _dish_history_index is None:
+            _dish_history_index = DishHistoryIndex()
+            add_archive_listener(_dish_history_index.add_day_menu)
+        if time.monotonic() - _dish_history_index.loaded_at > DISH_INDEX_REFRESH_SECONDS or not _dish_history_index.loaded_at:
+            _dish_history_index.load_from_archive()
+    return _dish_history_index
@@ -0,0 +1,140 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+# Number of long-lived browsers and how many searches each one serves before it is restarted
+POOL_SIZE = 2
+MAX_USES_PER_DRIVER = 50
+
+
+class WebDriverPool:
+    """
+    Pool of long-lived WebDriver instances.
+
+    Drivers are started lazily up to size, checked for health before every
+    use and recycled (quit and replaced) after max_uses searches or when a
+    health check fails, so a crashed or leaking browser never stays in use.
+    """
+
+    def __init__(self, factory, size=POOL_SIZE, max_uses=MAX_USES_PER_DRIVER):
+        """
+        Args:
+            factory (callable): Returns a new WebDriver, e.g. scrape_image_selenium.create_driver
+            size (int): Maximum number of concurrent drivers
+            max_uses (int): Searches per driver before it is recycled
+        """
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()  # (driver, uses), most recently used first
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._all_drivers = set()
+        self._closed = False
+
+    @staticmethod
+    def is_healthy(driver):
+        """Check that the browser session still responds."""
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        with self._lock:
+            self._all_drivers.discard(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _get_driver(self):
+        """Return a healthy (driver, uses) pair, starting a new browser if needed."""
+        while True:
+            try:
+                driver, uses = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self.factory()
+                with self._lock:
+                    self._all_drivers.add(driver)
+                return driver, 0
+            if uses < self.max_uses and self.is_healthy(driver):
+                return driver, uses
+            self._quit(driver)
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """
+        Borrow a driver for one search.
+
+        Raises:
+            TimeoutError: If no driver became free within timeout seconds
+        """
+        if self._closed:
+            raise RuntimeError("WebDriverPool is closed")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("No WebDriver available")
+        driver = None
+        try:
+            driver, uses = self._get_driver()
+            yield driver
+            uses += 1
+            with self._lock:
+                # Checked under the lock, so close() cannot miss a driver returned meanwhile
+                keep = not self._closed and uses < self.max_uses
+                if keep:
+                    self._idle.put((driver, uses))
+            if not keep:
+                self._quit(driver)
+        except BaseException:
+            # A driver that raised is not trusted for the next search
+            if driver is not None:
+                self._quit(driver)
+            raise
+        finally:
+            self._slots.release()
+
+    def map(self, function, items):
+        """
+        Run function(item, driver) for a batch of items on the pooled drivers.
+
+        Items are put on a shared queue and consumed by one worker thread per
+        pool slot, so every driver processes items back to back.
+
+        Returns:
+            dict: {item: result}, None for items whose call raised
+        """
+        work = queue.Queue()
+        for item in dict.fromkeys(items):
+            work.put(item)
+        results = {}
+
+        def worker():
+            while True:
+                try:
+                    item = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    with self.driver() as driver:
+                        results[item] = function(item, driver)
+                except Exception as e:
+                    print(f"  Error processing {item}: {str(e)}")
+                    results[item] = None
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(self.size, work.qsize()))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def close(self):
+        """Quit the idle drivers now; borrowed ones are quit when they are returned."""
+        with self._lock:
+            self._closed = True
+            idle = []
+            while not self._idle.empty():
+                idle.append(self._idle.get_nowait()[0])
+        for driver in idle:
+            self._quit(driver)
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Concurrent image lookups for one menu
+MAX_WORKERS = 8
+# Politeness: at most this many parallel requests and this minimal spacing per host
+MAX_REQUESTS_PER_HOST = 2
+MIN_HOST_INTERVAL = 0.25
+# Whole-menu deadline in seconds, lookups still running afterwards are abandoned
+MENU_IMAGES_TIMEOUT = 15
+
+
+class PoliteSession(requests.Session):
+    """
+    requests.Session with a shared connection pool and per-host politeness limits.
+
+    Every request waits for a per-host slot (at most max_per_host in flight)
+    and keeps min_interval seconds between request starts to the same host.
+    """
+
+    def __init__(self, max_per_host=MAX_REQUESTS_PER_HOST, min_interval=MIN_HOST_INTERVAL, pool_size=MAX_WORKERS):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.max_per_host = max_per_host
+        self.min_interval = min_interval
+        self._host_lock = threading.Lock()
+        self._host_slots = {}  # {host: threading.Semaphore}
+        self._host_last_start = {}  # {host: monotonic time}
+
+    def _slot(self, host):
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.Semaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _wait_turn(self, host):
+        with self._host_lock:
+            now = time.monotonic()
+            start = max(now, self._host_last_start.get(host, 0) + self.min_interval)
+            self._host_last_start[host] = start
+        if start > now:
+            time.sleep(start - now)
+
+    def request(self, method, url, *args, **kwargs):
+        host = urlsplit(url).hostname or ""
+        with self._slot(host):
+            self._wait_turn(host)
+            return super().request(method, url, *args, **kwargs)
+
+
+class MenuImageFetcher:
+    """
+    Fetches pictures for all dishes of a menu concurrently through one pooled session.
+
+    Pictures already in the image store are returned without any request.
+    """
+
+    def __init__(self, store, fetch, max_workers=MAX_WORKERS, session=None, on_lookup=None):
+        """
+        Args:
+            store (ImageStore): Store used for lookups and to keep fetched pictures
+            fetch (callable): fetch(meal_name, session=...) returning photo bytes, a PIL
+                image or None, e.g. scrape_img_bs4.fetch_meal_photo
+            max_workers (int): Number of concurrent lookups
+            session (requests.Session): Session to share (a PoliteSession if None)
+            on_lookup (callable): Called with True/False for every store hit/miss
+        """
+        self.store = store
+        self.on_lookup = on_lookup
+        self.session = session if session is not None else PoliteSession(pool_size=max_workers)
+        self._fetch = partial(fetch, session=self.session)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="meal-image")
+
+    def _fetch_one(self, meal_name):
+        try:
+            return self.store.get_or_fetch(meal_name, self._fetch)
+        except Exception as e:
+            print(f"  Error storing image for {meal_name}: {str(e)}")
+            return None
+
+    async def fetch_all(self, meal_names, timeout=MENU_IMAGES_TIMEOUT):
+        """
+        Fetch pictures for several meals concurrently.
+
+        Lookups that did not finish within timeout (or when the awaiting task
+        is cancelled) are cancelled; lookups already running finish in the
+        background and still fill the store for the next request.
+
+        Returns:
+            dict: {meal_name: path} for every meal with a picture
+        """
+        loop = asyncio.get_running_loop()
+        names = list(dict.fromkeys(meal_names))
+        results = {}
+        pending = {}
+        for name in names:
+            # Stored pictures need no worker at all
+            path = self.store.get_path(name)
+            if self.on_lookup is not None:
+                self.on_lookup(path is not None)
+            if path is not None:
+                results[name] = path
+            else:
+                pending[loop.run_in_executor(self._executor, self._fetch_one, name)] = name
+
+        if not pending:
+            return results
+
+        try:
+            done, not_done = await asyncio.wait(pending, timeout=timeout)
+        except asyncio.CancelledError:
+            for future in pending:
+                future.cancel()
+            raise
+
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            if not future.cancelled() and future.exception() is None and future.result() is not None:
+                results[pending[future]] = future.result()
+        return results
+
+    def shutdown(self):
+        """Cancel queued lookups, close the pooled connections and save the store's use times."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+        self.store.flush()
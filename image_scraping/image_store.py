@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from io import BytesIO
+
+IMAGE_STORE_DIR = os.getenv("MEAL_IMAGE_DIR", "meal_images")
+IMAGE_STORE_MAX_BYTES = int(os.getenv("MEAL_IMAGE_MAX_BYTES", 50 * 1024 * 1024))
+
+# Telegram shows photos at up to 1280px, dish pictures never need more
+THUMBNAIL_SIZE = (800, 800)
+JPEG_QUALITY = 85
+# Use times and file_ids only mark the index dirty; the bot writes it this often (and on shutdown) with flush()
+INDEX_SAVE_INTERVAL = 60
+
+
+def normalize_meal_name(meal_name):
+    """
+    Normalize a meal name to the key used for the image index.
+
+    Allergen/additive annotations like "(a,c,g)" and extra whitespace are
+    dropped so that the same dish maps to the same picture every day.
+    """
+    name = re.sub(r"\([^)]*\)", " ", meal_name.lower())
+    return " ".join(name.split())
+
+
+def encode_thumbnail(img, size=THUMBNAIL_SIZE, quality=JPEG_QUALITY):
+    """Resize an image to fit into size and return it as JPEG bytes."""
+    img = img.copy()
+    img.thumbnail(size)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def photo_extension(data):
+    """File extension of encoded photo bytes, following the fmt they were encoded with (JPEG or WEBP)."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "jpg"
+
+
+class ImageStore:
+    """
+    Content-addressed on-disk store for meal pictures.
+
+    Thumbnails are stored once under the SHA-256 of their bytes in
+    objects/<hash[:2]>/<hash>.jpg (or .webp), so the same picture found for
+    different meal names is kept only once. index.json maps normalized meal names to
+    their object hash, last use time and the Telegram file_id of the first
+    upload. When the store grows beyond max_bytes the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, directory=IMAGE_STORE_DIR, max_bytes=IMAGE_STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._index = self._load_index()  # {normalized name: {"hash", "size", "extension", "last_used", "file_id"}}
+        self._dirty = False  # use times or file_ids changed since the index was saved
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = False
+
+    def _touch(self, entry):
+        """Record a use of an entry; it reaches index.json with the next flush, so the LRU order survives a restart."""
+        entry["last_used"] = time.time()
+        self._dirty = True
+
+    def flush(self):
+        """Write use times and file_ids that were not saved yet."""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _object_path(self, content_hash, extension="jpg"):
+        return os.path.join(self.directory, "objects", content_hash[:2], f"{content_hash}.{extension}")
+
+    def _entry_path(self, entry):
+        # Entries written before WEBP support have no extension and are JPEGs
+        return self._object_path(entry["hash"], entry.get("extension", "jpg"))
+
+    def get_path(self, meal_name):
+        """Return the path of the stored thumbnail for a meal, or None."""
+        with self._lock:
+            entry = self._index.get(normalize_meal_name(meal_name))
+            if entry is None:
+                return None
+            path = self._entry_path(entry)
+            if not os.path.exists(path):
+                del self._index[normalize_meal_name(meal_name)]
+                self._dirty = True
+                return None
+            self._touch(entry)
+            return path
+
+    def get_file_id(self, meal_name):
+        """Return the Telegram file_id of an earlier upload of this meal's picture, or None."""
+        with self._lock:
+            entry = self._index.get(normalize_meal_name(meal_name))
+            if entry is None:
+                return None
+            self._touch(entry)
+            return entry.get("file_id")
+
+    def set_file_id(self, meal_name, file_id):
+        """Remember the Telegram file_id after the picture was uploaded once."""
+        with self._lock:
+            entry = self._index.get(normalize_meal_name(meal_name))
+            if entry is not None and entry.get("file_id") != file_id:
+                entry["file_id"] = file_id
+                self._dirty = True
+
+    def put_bytes(self, meal_name, data):
+        """
+        Store already encoded thumbnail bytes for a meal.
+
+        Returns:
+            str: Path of the stored object
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        extension = photo_extension(data)
+        path = self._object_path(content_hash, extension)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+
+            self._index[normalize_meal_name(meal_name)] = {
+                "hash": content_hash,
+                "size": len(data),
+                "extension": extension,
+                "last_used": time.time(),
+                "file_id": None,
+            }
+            self._evict()
+            self._save_index()
+        return path
+
+    def put_image(self, meal_name, img):
+        """Resize a PIL image once and store it for a meal. Returns the stored path."""
+        return self.put_bytes(meal_name, encode_thumbnail(img))
+
+    def total_bytes(self):
+        """Size of all distinct stored objects."""
+        return sum({entry["hash"]: entry["size"] for entry in self._index.values()}.values())
+
+    def _evict(self):
+        """Drop least recently used entries (and unreferenced objects) until the store fits."""
+        sizes = {entry["hash"]: entry["size"] for entry in self._index.values()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        references = {}
+        for entry in self._index.values():
+            references[entry["hash"]] = references.get(entry["hash"], 0) + 1
+
+        for name, entry in sorted(self._index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            del self._index[name]
+            references[entry["hash"]] -= 1
+            if references[entry["hash"]] == 0:
+                total -= entry["size"]
+                try:
+                    os.remove(self._entry_path(entry))
+                except OSError:
+                    pass
+
+    def get_or_fetch(self, meal_name, fetch):
+        """
+        Return the stored thumbnail path for a meal, fetching it once if unknown.
+
+        Args:
+            meal_name (str): Name of the meal
+            fetch (callable): Returns encoded JPEG/WEBP bytes or a PIL image (or None)
+                for a meal name, e.g. scrape_img_bs4.fetch_meal_photo
+
+        Returns:
+            str: Path of the stored thumbnail, None if no image was found
+        """
+        path = self.get_path(meal_name)
+        if path is not None:
+            return path
+
+        img = fetch(meal_name)
+        if img is None:
+            return None
+        if isinstance(img, bytes):
+            # Already resized and encoded while streaming, stored as is
+            return self.put_bytes(meal_name, img)
+        return self.put_image(meal_name, img)
+
+
+_image_store = None
+
+
+def get_image_store():
+    """Return the shared image store in IMAGE_STORE_DIR."""
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore()
+    return _image_store
+
+
+def flush_image_store():
+    """Write pending index changes of the shared store, if it was used at all."""
+    if _image_store is not None:
+        _image_store.flush()
@@ -5,6 +5,7 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+import base64
 import os
 import time
 from urllib.parse import quote
@@ -12,37 +13,54 @@ from io import BytesIO
 from PIL import Image
 import requests
 
-def extract_meal_image_selenium(meal_name):
+GOOGLE_IMAGES_URL = "https://www.google.com/search?q={query}&tbm=isch"
+
+_chromedriver_path = None
+
+def create_driver():
+    """
+    Start a headless Chrome WebDriver.
+    
+    The chromedriver binary is resolved by webdriver-manager only once per process.
+    """
+    global _chromedriver_path
+    if _chromedriver_path is None:
+        _chromedriver_path = ChromeDriverManager().install()
+    
+    # Set up Chrome options
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")  # Run in headless mode
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    
+    return webdriver.Chrome(service=Service(_chromedriver_path), options=chrome_options)
+
+def extract_meal_image_selenium(meal_name, driver=None, search_url=GOOGLE_IMAGES_URL):
     """
     Searches for an image of a meal using Selenium with Google Images and returns the image object.
     
     Parameters:
         meal_name (str): Name of the meal to search for
+        driver: WebDriver to reuse (e.g. from a WebDriverPool); a new one is started
+            and quit afterwards if None
+        search_url (str): Search page URL template with a {query} placeholder
         
     Returns:
         PIL.Image.Image: Image object if found, None otherwise
     """
+    owns_driver = driver is None
     try:
         print(f"Searching for image of: {meal_name}")
         
         # Format the search query - add "food" to get better results
         search_query = quote(f"{meal_name} food dish")
         
-        # Set up Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")  # Run in headless mode
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        
-        # Initialize the Chrome driver
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=chrome_options
-        )
+        if owns_driver:
+            driver = create_driver()
         
         # Navigate to Google Images
-        driver.get(f"https://www.google.com/search?q={search_query}&tbm=isch")
+        driver.get(search_url.format(query=search_query))
         
         # Wait for the images to load
         WebDriverWait(driver, 10).until(
@@ -53,7 +71,8 @@ def extract_meal_image_selenium(meal_name):
         images = driver.find_elements(By.CSS_SELECTOR, "img.rg_i")
         if not images:
             print(f"  No images found for {meal_name}")
-            driver.quit()
+            if owns_driver:
+                driver.quit()
             return None
         
         # Get the source of the first image
@@ -78,7 +97,8 @@ def extract_meal_image_selenium(meal_name):
                 large_img = driver.find_element(By.CSS_SELECTOR, "img.n3VNCb")
                 img_url = large_img.get_attribute("src")
         
-        driver.quit()
+        if owns_driver:
+            driver.quit()
         
         if img_url:
             # Check if it's a base64 encoded image
@@ -102,13 +122,16 @@ def extract_meal_image_selenium(meal_name):
     except Exception as e:
         print(f"  Error finding image for {meal_name}: {str(e)}")
         # Make sure to quit the driver in case of an exception
-        try:
-            driver.quit()
-        except:
-            pass
+        if owns_driver:
+            try:
+                driver.quit()
+            except:
+                pass
         return None
 
 if __name__ == "__main__":
+    from driver_pool import WebDriverPool
+    
     # Create directory for images
     images_dir = "meal_images"
     os.makedirs(images_dir, exist_ok=True)
@@ -120,22 +143,25 @@ if __name__ == "__main__":
         "Vegetable Stir Fry"
     ]
     
-    # Process each meal and save images
+    # Long-lived browsers instead of one Chrome start per meal
+    pool = WebDriverPool(create_driver, size=2)
+    try:
+        images = pool.map(lambda meal_name, driver: extract_meal_image_selenium(meal_name, driver), meal_names)
+    finally:
+        pool.close()
+    
+    # Save the images
     meal_to_image_path = {}
-    for meal_name in meal_names:
-        img = extract_meal_image_selenium(meal_name)
+    for meal_name, img in images.items():
         if img:
             # Create a safe filename
             safe_filename = "".join(c if c.isalnum() else "_" for c in meal_name)
             img_path = os.path.join(images_dir, f"{safe_filename}.jpg")
             
             # Save the image
-            img.save(img_path)
+            img.convert("RGB").save(img_path)
             print(f"  Image saved to {img_path}")
             meal_to_image_path[meal_name] = img_path
-            
-        # Be nice to the server with a small delay
-        time.sleep(2)
     
     print("\nSummary of saved images:")
     for meal, path in meal_to_image_path.items():
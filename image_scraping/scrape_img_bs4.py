@@ -1,87 +1,322 @@
 import requests
 from bs4 import BeautifulSoup
+import math
 import os
+import re
 import time
 from urllib.parse import quote
 from io import BytesIO
 from PIL import Image
 
-def extract_meal_image(meal_name):
+# (connect, read) timeout in seconds for every request
+REQUEST_TIMEOUT = (5, 10)
+
+# Downloads larger than this are aborted, images are read in chunks of CHUNK_SIZE
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Telegram shows photos at up to 1280px, dish pictures never need more
+TELEGRAM_PHOTO_SIZE = (800, 800)
+
+# Number of search results considered by the ranking
+TOP_K = 20
+# Ranked candidates tried if downloading the winner fails
+MAX_DOWNLOAD_ATTEMPTS = 2
+
+# Recipe sites with good dish photos, and stock sites with watermarks
+PREFERRED_IMAGE_DOMAINS = [
+    "chefkoch.de", "lecker.de", "eatsmarter.de", "essen-und-trinken.de", "kitchenstories.com",
+    "springlane.de", "gutekueche.at", "einfachkochen.de", "wikipedia.org", "wikimedia.org",
+]
+BLOCKED_IMAGE_DOMAINS = [
+    "shutterstock.com", "alamy.com", "istockphoto.com", "gettyimages.com", "dreamstime.com",
+    "123rf.com", "depositphotos.com", "pinterest.com", "pinimg.com",
+]
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+def _domain_matches(url, domains):
+    host = re.sub(r"^[a-z]+://", "", (url or "").lower()).split("/")[0]
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+def score_image_candidate(candidate, meal_tokens):
     """
-    Searches for an image of a meal using DuckDuckGo Images and returns the image object.
+    Scores one DuckDuckGo image result using only its metadata.
     
     Parameters:
-        meal_name (str): Name of the meal to search for
+        candidate (dict): Result with image, url, title, width and height
+        meal_tokens (set): Lowercase word tokens of the meal name
         
     Returns:
-        PIL.Image.Image: Image object if found, None otherwise
+        float: Score, higher is better; -inf for unusable candidates
     """
-    try:
-        print(f"Searching for image of: {meal_name}")
+    image_url = candidate.get("image") or ""
+    source_url = candidate.get("url") or ""
+    if not image_url or image_url.startswith("data:"):
+        return float("-inf")
+    if _domain_matches(image_url, BLOCKED_IMAGE_DOMAINS) or _domain_matches(source_url, BLOCKED_IMAGE_DOMAINS):
+        return float("-inf")
+    
+    score = 0.0
+    width = candidate.get("width") or 0
+    height = candidate.get("height") or 0
+    if width and height:
+        # Dish photos look best between 1:1 and 16:9, 4:3 is ideal
+        score += 1.0 - min(1.0, abs(math.log((width / height) / (4 / 3))) / math.log(3))
+        # Large enough for Telegram, but no huge downloads
+        shorter_side = min(width, height)
+        if shorter_side < 300:
+            score -= 1.0
+        elif shorter_side <= 2000:
+            score += 0.5
+    
+    if _domain_matches(source_url, PREFERRED_IMAGE_DOMAINS) or _domain_matches(image_url, PREFERRED_IMAGE_DOMAINS):
+        score += 1.0
+    
+    # Share of the meal name's words that appear in the result title
+    title_tokens = set(re.findall(r"\w+", (candidate.get("title") or "").lower()))
+    if meal_tokens:
+        score += 2.0 * len(meal_tokens & title_tokens) / len(meal_tokens)
+    return score
+
+def rank_image_candidates(results, meal_name, k=TOP_K):
+    """
+    Ranks the top k search results for a meal by their metadata.
+    
+    Parameters:
+        results (list): DuckDuckGo i.js results
+        meal_name (str): Name of the meal
+        k (int): Number of results to consider
         
-        # Format the search query - add "food" to get better results
-        search_query = quote(f"{meal_name} food dish")
+    Returns:
+        list: Usable candidates, best first
+    """
+    # Short filler words ("mit", "und") do not tell anything about the dish
+    meal_tokens = {token for token in re.findall(r"\w+", meal_name.lower()) if len(token) > 3}
+    scored = [(score_image_candidate(candidate, meal_tokens), position, candidate)
+              for position, candidate in enumerate(results[:k])]
+    # Ties keep the search engine's order
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [candidate for score, position, candidate in scored if score != float("-inf")]
+
+def find_meal_image_url(meal_name, http=requests, timeout=REQUEST_TIMEOUT):
+    """
+    Searches DuckDuckGo Images for a meal and returns the URL of the best ranked result.
+    
+    Parameters:
+        meal_name (str): Name of the meal to search for
+        http: requests module or a requests.Session
+        timeout: Timeout passed to every request
         
-        # Use DuckDuckGo instead of Google as it's easier to scrape
-        search_url = f"https://duckduckgo.com/?q={search_query}&iax=images&ia=images"
+    Returns:
+        str: Image URL if found, None otherwise
+    """
+    candidates = find_meal_image_candidates(meal_name, http, timeout)
+    return candidates[0]["image"] if candidates else None
+
+def find_meal_image_candidates(meal_name, http=requests, timeout=REQUEST_TIMEOUT):
+    """
+    Searches DuckDuckGo Images for a meal and returns the ranked result metadata.
+    
+    One i.js request returns the metadata of many results, nothing is downloaded.
+    
+    Parameters:
+        meal_name (str): Name of the meal to search for
+        http: requests module or a requests.Session
+        timeout: Timeout passed to every request
         
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+    Returns:
+        list: Ranked candidate dicts (empty if nothing was found)
+    """
+    # Format the search query - add "food" to get better results
+    search_query = quote(f"{meal_name} food dish")
+    
+    # Use DuckDuckGo instead of Google as it's easier to scrape
+    search_url = f"https://duckduckgo.com/?q={search_query}&iax=images&ia=images"
+    
+    # Make the request
+    response = http.get(search_url, headers=HEADERS, timeout=timeout)
+    response.raise_for_status()
+    
+    # Parse the HTML
+    soup = BeautifulSoup(response.text, 'html.parser')
+    
+    # Look for image data in the page source
+    # DuckDuckGo includes image data in vqd attributes
+    scripts = soup.find_all('script')
+    
+    # Try to find image URLs in script tags
+    for script in scripts:
+        if script.string and 'vqd' in str(script.string):
+            # Extract the vqd value
+            vqd_start = script.string.find('vqd=')
+            if vqd_start != -1:
+                vqd_start += 4
+                vqd_end = script.string.find("'", vqd_start)
+                if vqd_end != -1:
+                    vqd = script.string[vqd_start:vqd_end]
+                    
+                    # Now make a request to the DuckDuckGo image API
+                    api_url = f"https://duckduckgo.com/i.js?q={search_query}&vqd={vqd}&o=json"
+                    api_response = http.get(api_url, headers=HEADERS, timeout=timeout)
+                    
+                    if api_response.status_code == 200:
+                        try:
+                            image_data = api_response.json()
+                            if 'results' in image_data and len(image_data['results']) > 0:
+                                return rank_image_candidates(image_data['results'], meal_name)
+                        except:
+                            pass
+    return []
+
+def download_image_limited(url, http=requests, timeout=REQUEST_TIMEOUT, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Streams an image download into a bounded buffer.
+    
+    The buffer is returned as is; copying it to bytes would double the peak memory.
+    
+    Parameters:
+        url (str): Image URL
+        http: requests module or a requests.Session
+        timeout: Request timeout
+        max_bytes (int): Abort when the image is larger than this
         
-        # Make the request
-        response = requests.get(search_url, headers=headers)
-        response.raise_for_status()
+    Returns:
+        bytearray: The compressed image data
         
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+    Raises:
+        ValueError: If the image exceeds max_bytes
+    """
+    with http.get(url, headers=HEADERS, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f"image too large ({content_length} bytes)")
         
-        # Look for image data in the page source
-        # DuckDuckGo includes image data in vqd attributes
-        scripts = soup.find_all('script')
-        img_url = None
+        buffer = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                raise ValueError(f"image larger than {max_bytes} bytes")
+        return buffer
+
+def open_reduced(data, size=TELEGRAM_PHOTO_SIZE):
+    """
+    Opens compressed image data and decodes it at reduced size.
+    
+    For JPEGs, draft() lets the decoder scale down by 1/2, 1/4 or 1/8 while
+    decoding, so the full-resolution bitmap is never held in memory.
+    
+    Returns:
+        PIL.Image.Image: Image fitting into size
+    """
+    img = Image.open(BytesIO(data))
+    img.draft("RGB", size)
+    img.thumbnail(size)
+    return img
+
+def encode_photo(img, fmt="JPEG", quality=85):
+    """Encodes an image as JPEG or WEBP bytes ready to be sent to Telegram."""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buffer = BytesIO()
+    img.save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue()
+
+def resize_photo(data, size=TELEGRAM_PHOTO_SIZE, fmt="JPEG"):
+    """
+    Decodes compressed image data at reduced size and encodes it for Telegram.
+    
+    Only takes and returns bytes, so it can run in a worker process.
+    """
+    return encode_photo(open_reduced(data, size), fmt)
+
+def extract_meal_image(meal_name, session=None, timeout=REQUEST_TIMEOUT, size=None):
+    """
+    Searches for an image of a meal using DuckDuckGo Images and returns the image object.
+    
+    Parameters:
+        meal_name (str): Name of the meal to search for
+        session (requests.Session): Session to reuse pooled connections (a plain request per call if None)
+        timeout: Timeout passed to every request
+        size (tuple): Decode reduced to fit into this size (full size if None)
         
-        # Try to find image URLs in script tags
-        for script in scripts:
-            if script.string and 'vqd' in str(script.string):
-                # Extract the vqd value
-                vqd_start = script.string.find('vqd=')
-                if vqd_start != -1:
-                    vqd_start += 4
-                    vqd_end = script.string.find("'", vqd_start)
-                    if vqd_end != -1:
-                        vqd = script.string[vqd_start:vqd_end]
-                        
-                        # Now make a request to the DuckDuckGo image API
-                        api_url = f"https://duckduckgo.com/i.js?q={search_query}&vqd={vqd}&o=json"
-                        api_response = requests.get(api_url, headers=headers)
-                        
-                        if api_response.status_code == 200:
-                            try:
-                                image_data = api_response.json()
-                                if 'results' in image_data and len(image_data['results']) > 0:
-                                    img_url = image_data['results'][0]['image']
-                                    break
-                            except:
-                                pass
+    Returns:
+        PIL.Image.Image: Image object if found, None otherwise
+    """
+    http = session if session is not None else requests
+    try:
+        print(f"Searching for image of: {meal_name}")
+        candidates = find_meal_image_candidates(meal_name, http, timeout)
         
-        if img_url:
-            # Download and return the image
-            img_response = requests.get(img_url, headers=headers)
-            img = Image.open(BytesIO(img_response.content))
-            return img
-        else:
+        if not candidates:
             print(f"  No valid image URL found for {meal_name}")
             return None
+        
+        # Only the winner is downloaded, the runner-up only if that fails
+        for candidate in candidates[:MAX_DOWNLOAD_ATTEMPTS]:
+            try:
+                data = download_image_limited(candidate["image"], http, timeout)
+                if size is None:
+                    return Image.open(BytesIO(data))
+                return open_reduced(data, size)
+            except Exception as e:
+                print(f"  Could not load {candidate['image']}: {str(e)}")
+        return None
             
     except Exception as e:
         print(f"  Error finding image for {meal_name}: {str(e)}")
         return None
 
+def fetch_meal_photo(meal_name, session=None, timeout=REQUEST_TIMEOUT, size=TELEGRAM_PHOTO_SIZE, fmt="JPEG",
+                     run_cpu=None):
+    """
+    Searches for an image of a meal and returns it as Telegram-sized JPEG/WEBP bytes.
+    
+    The download is streamed with a byte cap and decoded at reduced size, so
+    peak memory per image stays around the compressed size plus a small bitmap.
+    
+    Parameters:
+        meal_name (str): Name of the meal to search for
+        session (requests.Session): Session to reuse pooled connections
+        timeout: Timeout passed to every request
+        size (tuple): Maximum photo size
+        fmt (str): "JPEG" or "WEBP"
+        run_cpu (callable): run_cpu(function, *args) runs the decoding and resizing
+            elsewhere, e.g. in a process pool (in the calling thread if None)
+        
+    Returns:
+        bytes: Encoded photo if found, None otherwise
+    """
+    http = session if session is not None else requests
+    print(f"Searching for image of: {meal_name}")
+    try:
+        candidates = find_meal_image_candidates(meal_name, http, timeout)
+    except Exception as e:
+        print(f"  Error finding image for {meal_name}: {str(e)}")
+        return None
+    if not candidates:
+        print(f"  No valid image URL found for {meal_name}")
+        return None
+    
+    # Only the winner is downloaded, the runner-up only if that fails
+    for candidate in candidates[:MAX_DOWNLOAD_ATTEMPTS]:
+        try:
+            data = download_image_limited(candidate["image"], http, timeout)
+            if run_cpu is not None:
+                return run_cpu(resize_photo, data, size, fmt)
+            return resize_photo(data, size, fmt)
+        except Exception as e:
+            print(f"  Could not load {candidate['image']}: {str(e)}")
+    return None
+
 if __name__ == "__main__":
-    # Create directory for images
-    images_dir = "meal_images"
-    os.makedirs(images_dir, exist_ok=True)
+    from image_store import ImageStore
+    
+    # Content-addressed store, known dishes are not searched again
+    store = ImageStore("meal_images")
     
     meal_names = [
         "Spaghetti Bolognese",
@@ -90,23 +325,22 @@ if __name__ == "__main__":
         "Vegetable Stir Fry"
     ]
     
+    def fetch_politely(meal_name):
+        try:
+            return fetch_meal_photo(meal_name)
+        finally:
+            # Be nice to the server with a small delay
+            time.sleep(1)
+    
     # Process each meal and save images
     meal_to_image_path = {}
     for meal_name in meal_names:
-        img = extract_meal_image(meal_name)
-        if img:
-            # Create a safe filename
-            safe_filename = "".join(c if c.isalnum() else "_" for c in meal_name)
-            img_path = os.path.join(images_dir, f"{safe_filename}.jpg")
-            
-            # Save the image
-            img.save(img_path)
-            print(f"  Image saved to {img_path}")
+        img_path = store.get_or_fetch(meal_name, fetch_politely)
+        if img_path:
+            print(f"  Image of {meal_name}: {img_path}")
             meal_to_image_path[meal_name] = img_path
-            
-        # Be nice to the server with a small delay
-        time.sleep(1)
+    store.flush()
     
     print("\nSummary of saved images:")
     for meal, path in meal_to_image_path.items():
-        print(f"{meal}: {path}")
\ No newline at end of file
+        print(f"{meal}: {path}")
@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+import metrics
+from tracing import span, in_current_context
+
+# Deadline per call site in seconds; the menu path gets the shortest ones, since a meal
+# without classification is better than a menu that arrives late
+LLM_TIMEOUTS = {
+    "classify_meal": float(os.getenv("LLM_TIMEOUT_CLASSIFY_MEAL", "4")),
+    "classify_message_with_llm": float(os.getenv("LLM_TIMEOUT_CLASSIFY_MESSAGE", "5")),
+    "parse_date_with_llm": float(os.getenv("LLM_TIMEOUT_PARSE_DATE", "5")),
+    "chat": float(os.getenv("LLM_TIMEOUT_CHAT", "20")),
+}
+LLM_DEFAULT_TIMEOUT = 10
+# Client-side HTTP timeout, so threads of abandoned calls do not hang around for long
+LLM_CLIENT_TIMEOUT = max(LLM_DEFAULT_TIMEOUT, *LLM_TIMEOUTS.values())
+LLM_THREADS = int(os.getenv("LLM_THREADS", "8"))
+
+# Consecutive failed or timed-out calls that open the circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET", "60"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Threads the LLM calls run in, so callers can stop waiting after their deadline."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(LLM_THREADS, thread_name_prefix="llm")
+    return _executor
+
+
+class LLMUnavailable(Exception):
+    """The LLM did not answer in time or the circuit breaker is open; callers use their fallback."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing LLM for a while.
+
+    After failure_threshold consecutive failures the circuit opens and every call
+    fails immediately. After reset_seconds one trial call is let through
+    (half-open): success closes the circuit again, failure opens it for another
+    reset_seconds.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"LLM circuit breaker: {self.state} -> {state}")
+            self.state = state
+        metrics.set_gauge("llm_circuit_open", 0 if state == self.CLOSED else 1)
+
+    def allow(self):
+        """Whether a call may go to the LLM now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._set_state(self.HALF_OPEN)
+                return True  # the trial call
+            return False
+
+    def available(self):
+        """Like allow, but without using up the trial call."""
+        with self._lock:
+            return self.state == self.CLOSED or (
+                self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+llm_circuit = CircuitBreaker()
+
+
+def llm_available():
+    """False while the circuit breaker is open, so callers can skip the LLM right away."""
+    return llm_circuit.available()
+
+
+def invoke_llm(llm, messages, call_site, timeout=None, schema=None, max_output_tokens=None):
+    """
+    Invoke an LLM and record call count, latency and tokens for the call site.
+
+    The call is abandoned after the deadline of the call site (LLM_TIMEOUTS), counted from
+    the moment a pool thread starts it; a call that waits longer than the deadline for a
+    thread is cancelled without running. Failures and timeouts of calls that ran count
+    towards the circuit breaker; while it is open the LLM is not called.
+
+    Args:
+        llm: LangChain chat model
+        messages: Messages passed to llm.invoke
+        call_site (str): Name of the calling function, used as metrics label
+        timeout (float): Deadline in seconds, overrides LLM_TIMEOUTS
+        schema (dict): JSON schema the answer must follow (see BackendLLM)
+        max_output_tokens (int): Limit for the generated tokens
+
+    Returns:
+        The LLM response message
+
+    Raises:
+        LLMUnavailable: If the circuit is open or the deadline passed
+    """
+    if timeout is None:
+        timeout = LLM_TIMEOUTS.get(call_site, LLM_DEFAULT_TIMEOUT)
+    if not llm_circuit.allow():
+        metrics.inc("llm_calls_total", call_site=call_site, result="circuit_open")
+        raise LLMUnavailable(f"circuit open, {call_site} not sent")
+
+    with span("llm", call_site=call_site) as llm_span:
+        call = partial(llm.invoke, messages)
+        if schema is not None or max_output_tokens is not None:
+            call = partial(call, schema=schema, schema_name=call_site, max_output_tokens=max_output_tokens)
+        # The deadline starts when a pool thread picks the call up, waiting in the queue is no provider failure
+        started = threading.Event()
+        started_at = []
+
+        def run():
+            started_at.append(time.perf_counter())
+            started.set()
+            return call()
+
+        future = _get_executor().submit(in_current_context(run))
+        if not started.wait(timeout) and future.cancel():
+            metrics.inc("llm_calls_total", call_site=call_site, result="queue_timeout")
+            raise LLMUnavailable(f"{call_site} waited longer than {timeout}s for a free LLM thread")
+        started.wait()  # cancel() failed, so the call has just started
+        start = started_at[0]
+        try:
+            response = future.result(max(0.0, start + timeout - time.perf_counter()))
+        except FutureTimeoutError:
+            # The running thread finishes in the background, its result is dropped
+            future.cancel()
+            llm_circuit.record_failure()
+            metrics.record_llm_call(call_site, time.perf_counter() - start, error=True)
+            metrics.inc("llm_timeouts_total", call_site=call_site)
+            raise LLMUnavailable(f"{call_site} took longer than {timeout}s")
+        except Exception:
+            llm_circuit.record_failure()
+            metrics.record_llm_call(call_site, time.perf_counter() - start, error=True)
+            raise
+        llm_circuit.record_success()
+        metrics.record_llm_call(call_site, time.perf_counter() - start, response)
+        usage = getattr(response, "usage_metadata", None)
+        if llm_span is not None and usage:
+            llm_span.set_attribute("input_tokens", usage.get("input_tokens"))
+            llm_span.set_attribute("output_tokens", usage.get("output_tokens"))
+    return response
+
+
+class LazyLLM:
+    """
+    Creates the chat model on first use, so importing a module does not load any LLM provider.
+
+    Args:
+        factory: Called as factory(*args, **kwargs) to create the model, e.g. setup_llm
+    """
+
+    def __init__(self, factory, *args, **kwargs):
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._llm = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._factory(*self._args, **self._kwargs)
+        return self._llm
+
+    def invoke(self, messages, **kwargs):
+        return self.get().invoke(messages, **kwargs)
+
+    def __getattr__(self, name):
+        # Private names are never delegated: during copy.copy or unpickling _llm/_factory
+        # are not set yet, and self.get() would end up here again
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+def structured_output_kwargs(backend, name, schema):
+    """Invoke arguments that make a backend answer with a JSON object following schema."""
+    if backend == "ollama":
+        return {"format": schema}  # constrained decoding with a grammar built from the schema
+    if backend == "groq":
+        return {"response_format": {"type": "json_object"}}  # JSON mode, the schema is only in the prompt
+    return {"response_format": {"type": "json_schema",
+                                "json_schema": {"name": name, "schema": schema, "strict": True}}}
+
+
+class BackendLLM:
+    """
+    A provider chat model that understands the schema and max_output_tokens arguments of invoke_llm.
+
+    Args:
+        model: LangChain chat model
+        backend (str): openai, ollama or groq
+    """
+
+    def __init__(self, model, backend):
+        self.model = model
+        self.backend = backend
+
+    def invoke(self, messages, schema=None, schema_name="result", max_output_tokens=None, **kwargs):
+        if schema is not None:
+            kwargs.update(structured_output_kwargs(self.backend, schema_name, schema))
+        # Ollama sets num_predict when the model is created; its grammar stops after the closing brace anyway
+        if max_output_tokens is not None and self.backend != "ollama":
+            kwargs["max_tokens"] = max_output_tokens
+        return self.model.invoke(messages, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class HedgedLLM:
+    """
+    Sends a request to a second backend when the first one is slow, and uses whichever answers first.
+
+    Only requests still running after hedge_delay are duplicated, so the extra load
+    stays small while the slow tail of the primary backend is cut off.
+
+    Args:
+        primary, secondary: Chat models (or LazyLLM)
+        hedge_delay (float): Seconds to wait for the primary before sending the hedge
+    """
+
+    def __init__(self, primary, secondary, hedge_delay):
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_delay = hedge_delay
+        # Own threads: invoke itself already runs in the invoke_llm pool
+        self._executor = ThreadPoolExecutor(2 * LLM_THREADS, thread_name_prefix="llm-hedge")
+
+    def invoke(self, messages, **kwargs):
+        executor = self._executor
+        first = executor.submit(in_current_context(self.primary.invoke), messages, **kwargs)
+        try:
+            return first.result(self.hedge_delay)
+        except FutureTimeoutError:
+            pass
+
+        metrics.inc("llm_hedged_requests_total")
+        second = executor.submit(in_current_context(self.secondary.invoke), messages, **kwargs)
+        pending = {first: "primary", second: "secondary"}
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                backend = pending.pop(future)
+                if future.exception() is None:
+                    metrics.inc("llm_hedge_wins_total", backend=backend)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+metrics.describe("llm_circuit_open", "gauge", "1 while the LLM circuit breaker is open or half-open")
+metrics.describe("llm_timeouts_total", "counter", "LLM calls abandoned after their deadline per call site")
+metrics.describe("llm_hedged_requests_total", "counter", "LLM requests also sent to the hedge backend")
+metrics.describe("llm_hedge_wins_total", "counter", "Hedged LLM requests per backend that answered first")
@@ -1,38 +1,74 @@
-from openmensa import OpenMensa
+from metrics import timed
+from tracing import span
+from replay import wrap_openmensa
+
+
+class _LazyOpenMensa:
+    """Imports the openmensa package on the first API call instead of at startup."""
+
+    def __getattr__(self, name):
+        from openmensa import OpenMensa
+        return getattr(OpenMensa, name)
+
+
+# Records or replays OpenMensa responses when REPLAY_MODE is set
+OpenMensa = wrap_openmensa(_LazyOpenMensa())
+
+DEFAULT_EXCLUDED_CATEGORIES = ["Salattheke", "Dessert"]
+
+MENSA_IDS = {
+    "Kiepenheuerallee": 57,
+    "Griebnitzsee": 62,
+}
 
 def get_mensa_id(location: str) -> int:
     """Get the OpenMensa ID for a given mensa location."""
-    mensa_to_id = {
-        "Kiepenheuerallee": 57,
-        "Griebnitzsee": 62,
-    }
-    return mensa_to_id[location]
+    return MENSA_IDS[location]
 
 
 def get_canteen_name(mensa_id: int) -> str:
     """Get the name of the canteen for a given mensa ID."""
-    canteen_info = OpenMensa.get_canteen(mensa_id)
+    with timed("openmensa_request_seconds", endpoint="canteen"), span("openmensa.canteen", mensa_id=mensa_id):
+        canteen_info = OpenMensa.get_canteen(mensa_id)
     return canteen_info["name"]
 
 
 def is_canteen_closed(mensa_id: int, date: str) -> bool:
     """Check if the canteen is closed on a specific date."""
-    for day in OpenMensa.get_canteen_days(mensa_id):
+    with timed("openmensa_request_seconds", endpoint="days"), span("openmensa.days", mensa_id=mensa_id):
+        days = OpenMensa.get_canteen_days(mensa_id)
+    for day in days:
         if day["date"] == date:
             return day["closed"]
     return True  # Return True if date not found
 
 
+def get_open_days(mensa_id: int) -> list:
+    """Get the dates (YYYY-MM-DD) on which the canteen is open, as published by OpenMensa."""
+    with timed("openmensa_request_seconds", endpoint="days"), span("openmensa.days", mensa_id=mensa_id):
+        days = OpenMensa.get_canteen_days(mensa_id)
+    return [day["date"] for day in days if not day["closed"]]
+
+
+def get_raw_meals(mensa_id: int, date: str) -> list:
+    """
+    Get the unfiltered OpenMensa meal dicts for a specific date and mensa ID.
+    Raises on request errors.
+    """
+    with timed("openmensa_request_seconds", endpoint="meals"), span("openmensa.meals", mensa_id=mensa_id, date=date):
+        return OpenMensa.get_meals_by_day(mensa_id, date)
+
+
 def get_meals(mensa_id: int, date: str, excluded_categories=None) -> list:
     """
     Get meals for a specific date and mensa ID.
     Returns a list of tuples (category, name, price).
     """
     if excluded_categories is None:
-        excluded_categories = ["Salattheke", "Dessert"]
+        excluded_categories = DEFAULT_EXCLUDED_CATEGORIES
     
     try:
-        meals = OpenMensa.get_meals_by_day(mensa_id, date)
+        meals = get_raw_meals(mensa_id, date)
         filtered_meals = []
         
         for meal in meals:
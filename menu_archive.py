@@ -0,0 +1,235 @@
+import json
+import os
+import sqlite3
+import threading
+from dish_alerts import normalize_text
+
+MENU_ARCHIVE_PATH = os.getenv("MENU_ARCHIVE_PATH", "menu_archive.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meals (
+    mensa_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    price_students REAL,
+    price_employees REAL,
+    price_others REAL,
+    notes TEXT,
+    classification TEXT,
+    emojis TEXT,
+    PRIMARY KEY (mensa_name, date, category, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS meals_name_date ON meals (name_norm, date);
+CREATE INDEX IF NOT EXISTS meals_date ON meals (date);
+"""
+
+_connection = None
+_lock = threading.Lock()
+_archive_listeners = []  # callables receiving each archived DayMenu, which replaces the meals of its day
+
+
+def add_archive_listener(callback):
+    """Call callback(day_menu) whenever a day menu was archived (e.g. to update derived indexes)."""
+    _archive_listeners.append(callback)
+
+
+def get_connection(path=None):
+    """Return the shared archive connection, creating the database on first use."""
+    global _connection
+    if _connection is None:
+        connection = sqlite3.connect(path or MENU_ARCHIVE_PATH, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        _connection = connection
+    return _connection
+
+
+def close_archive():
+    """Close the shared archive connection (a later call reopens it)."""
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+
+def archive_day_menus(day_menus):
+    """
+    Store the meals of several day menus in one transaction.
+
+    Existing rows (same mensa, date, category and name) are updated, so
+    refetching a menu never creates duplicates. A missing classification
+    (e.g. for prefetched upcoming menus) keeps the archived one. Archived
+    meals of a day that are missing from its refetched menu (dropped from a
+    planned menu, or the mensa closed) are deleted.
+
+    Args:
+        day_menus (list): DayMenu objects; failed menus are skipped
+
+    Returns:
+        int: Number of written and deleted rows
+    """
+    rows = []
+    days = []
+    for day_menu in day_menus:
+        if day_menu.error is not None:
+            continue
+        days.append((day_menu.mensa_name, day_menu.date_str,
+                     {(meal["category"], meal["name"]) for meal in day_menu.meals}))
+        for meal in day_menu.meals:
+            prices = meal.get("prices") or {}
+            rows.append((
+                day_menu.mensa_name,
+                day_menu.date_str,
+                meal["category"],
+                meal["name"],
+                normalize_text(meal["name"]),
+                prices.get("students"),
+                prices.get("employees"),
+                prices.get("others"),
+                json.dumps(meal.get("notes") or [], ensure_ascii=False),
+                meal.get("classification"),
+                meal.get("emojis"),
+            ))
+    if not days:
+        return 0
+
+    with _lock:
+        connection = get_connection()
+        with connection:
+            removed = []
+            for mensa_name, date_str, keys in days:
+                archived = connection.execute(
+                    "SELECT category, name FROM meals WHERE mensa_name = ? AND date = ?", (mensa_name, date_str)
+                ).fetchall()
+                removed.extend((mensa_name, date_str, category, name)
+                               for category, name in archived if (category, name) not in keys)
+            connection.executemany(
+                "DELETE FROM meals WHERE mensa_name = ? AND date = ? AND category = ? AND name = ?", removed
+            )
+            connection.executemany(
+                """
+                INSERT INTO meals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (mensa_name, date, category, name) DO UPDATE SET
+                    price_students = excluded.price_students,
+                    price_employees = excluded.price_employees,
+                    price_others = excluded.price_others,
+                    notes = excluded.notes,
+                    classification = coalesce(excluded.classification, classification),
+                    emojis = coalesce(excluded.emojis, emojis)
+                """,
+                rows,
+            )
+    return len(rows) + len(removed)
+
+
+def archive_day_menu(day_menu):
+    """Store the meals of one day menu in the archive, never raising."""
+    try:
+        written = archive_day_menus([day_menu])
+    except sqlite3.Error as e:
+        print(f"Fehler beim Archivieren des Menüs von {day_menu.mensa_name}: {e}")
+        return 0
+
+    if written:
+        for callback in _archive_listeners:
+            callback(day_menu)
+    return written
+
+
+def iter_served_dates():
+    """Yield (name_norm, name, mensa_name, date) for every archived meal, oldest first."""
+    with _lock:
+        rows = get_connection().execute(
+            "SELECT name_norm, name, mensa_name, date FROM meals ORDER BY date"
+        ).fetchall()
+    yield from rows
+
+
+def iter_archived_meals(since):
+    """Yield (mensa_name, date, category, name, price_students, notes list, classification) of meals from since (YYYY-MM-DD) on."""
+    with _lock:
+        rows = get_connection().execute(
+            "SELECT mensa_name, date, category, name, price_students, notes, classification "
+            "FROM meals WHERE date >= ? ORDER BY date",
+            (since,),
+        ).fetchall()
+    for mensa_name, date_str, category, name, price, notes, classification in rows:
+        yield mensa_name, date_str, category, name, price, json.loads(notes or "[]"), classification
+
+
+def last_served(meal_name, mensa_name=None):
+    """
+    Find the last date a meal was served.
+
+    Args:
+        meal_name (str): Exact meal name (case-insensitive)
+        mensa_name (str): Restrict to one mensa (all mensas if None)
+
+    Returns:
+        tuple: (date_str, mensa_name) or None if it was never served
+    """
+    query = "SELECT date, mensa_name FROM meals WHERE name_norm = ?"
+    params = [normalize_text(meal_name)]
+    if mensa_name is not None:
+        query += " AND mensa_name = ?"
+        params.append(mensa_name)
+    query += " ORDER BY date DESC LIMIT 1"
+
+    with _lock:
+        row = get_connection().execute(query, params).fetchone()
+    return tuple(row) if row else None
+
+
+def price_trend(meal_name, mensa_name=None):
+    """
+    Average student price of a meal per month.
+
+    Returns:
+        list: (month as YYYY-MM, average price, times served) tuples, oldest first
+    """
+    query = (
+        "SELECT substr(date, 1, 7) AS month, avg(price_students), count(*) "
+        "FROM meals WHERE name_norm = ? AND price_students IS NOT NULL"
+    )
+    params = [normalize_text(meal_name)]
+    if mensa_name is not None:
+        query += " AND mensa_name = ?"
+        params.append(mensa_name)
+    query += " GROUP BY month ORDER BY month"
+
+    with _lock:
+        return [tuple(row) for row in get_connection().execute(query, params)]
+
+
+def get_archived_classifications(meal_names):
+    """
+    Look up the most recent known classification of several meals at once.
+
+    Args:
+        meal_names (list): Meal names
+
+    Returns:
+        dict: {meal_name: (classification, emojis)} for meals with a known classification
+    """
+    names_by_norm = {normalize_text(name): name for name in meal_names}
+    if not names_by_norm:
+        return {}
+
+    placeholders = ", ".join("?" for _ in names_by_norm)
+    query = (
+        "SELECT name_norm, classification, emojis FROM meals "
+        f"WHERE name_norm IN ({placeholders}) AND classification IN ('vegetarian', 'non-vegetarian') "
+        "ORDER BY date"
+    )
+    try:
+        with _lock:
+            rows = get_connection().execute(query, list(names_by_norm)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Fehler beim Lesen des Menü-Archivs: {e}")
+        return {}
+
+    # Later dates overwrite earlier ones
+    return {names_by_norm[name_norm]: (classification, emojis) for name_norm, classification, emojis in rows}
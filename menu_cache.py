@@ -0,0 +1,150 @@
+import time
+from metrics import record_cache
+from shared_state import shared_dict
+from ollama_mensa_bot_utils import format_mensa_meals
+from day_menu import (
+    get_day_menu, get_cached_day_menu, filter_day_menu, filter_key, shows_unclassified_meals, classify_hidden_meals
+)
+from time_utils import format_date_for_display
+
+# Output formats
+FORMAT_MENU = "menu"
+FORMAT_DAILY_REPORT = "daily_report"
+
+DEFAULT_LANGUAGE = "de"
+
+# Rendered menus are dropped after this many seconds so that menu updates
+# published by the canteen during the day eventually show up
+RENDERED_MENU_TTL = 15 * 60
+
+# Shared between worker processes in multi-worker mode
+_rendered_menus = shared_dict("rendered_menus")  # {(mensa_name, date_str, fmt, language, filter_key): (created_at, text)}
+_menu_fingerprints = shared_dict("menu_fingerprints")  # {(mensa_name, date_str): fingerprint}
+
+
+def invalidate_rendered_menus(mensa_name=None, date_str=None):
+    """
+    Drop cached renderings.
+
+    Args:
+        mensa_name (str): Only drop entries for this mensa (all mensas if None)
+        date_str (str): Only drop entries for this date (all dates if None)
+    """
+    for key in list(_rendered_menus):
+        if mensa_name is not None and key[0] != mensa_name:
+            continue
+        if date_str is not None and key[1] != date_str:
+            continue
+        _rendered_menus.pop(key, None)
+
+    for key in list(_menu_fingerprints):
+        if (mensa_name is None or key[0] == mensa_name) and (date_str is None or key[1] == date_str):
+            _menu_fingerprints.pop(key, None)
+
+
+def update_menu_fingerprint(mensa_name, date_str, fingerprint):
+    """
+    Record the fingerprint of the underlying menu data.
+
+    If the menu or its classifications changed since the last rendering,
+    all cached renderings for this mensa and date are dropped.
+
+    Returns:
+        bool: True if the fingerprint changed
+    """
+    key = (mensa_name, date_str)
+    previous = _menu_fingerprints.get(key)
+    if previous == fingerprint:
+        return False
+
+    if previous is not None:
+        invalidate_rendered_menus(mensa_name, date_str)
+    _menu_fingerprints[key] = fingerprint
+    return True
+
+
+def get_cached_menu(mensa_name, date_str, fmt=FORMAT_MENU, language=DEFAULT_LANGUAGE, meal_filter=None):
+    """Return the cached rendering or None if there is no fresh entry."""
+    key = (mensa_name, date_str, fmt, language, filter_key(meal_filter))
+    entry = _rendered_menus.get(key)
+    if entry is None:
+        record_cache("rendered_menu", False)
+        return None
+
+    created_at, text = entry
+    if time.monotonic() - created_at > RENDERED_MENU_TTL:
+        _rendered_menus.pop(key, None)
+        record_cache("rendered_menu", False)
+        return None
+    record_cache("rendered_menu", True)
+    return text
+
+
+def store_rendered_menu(mensa_name, date_str, text, fmt=FORMAT_MENU, language=DEFAULT_LANGUAGE, meal_filter=None):
+    """Store a final message text for the given mensa, date, format, language and filter."""
+    key = (mensa_name, date_str, fmt, language, filter_key(meal_filter))
+    _rendered_menus[key] = (time.monotonic(), text)
+
+
+def render_menu_text(mensa_name, date_str, meals_data, fmt=FORMAT_MENU):
+    """
+    Build the final message text for already fetched meals data.
+
+    Args:
+        mensa_name (str): Name of the mensa
+        date_str (str): Date string in YYYY-MM-DD format
+        meals_data (dict): Output of get_mensa_meals or DayMenu.to_meals_data
+        fmt (str): One of FORMAT_MENU, FORMAT_DAILY_REPORT
+
+    Returns:
+        str: The message text as it is sent to the user
+    """
+    friendly_date = format_date_for_display(date_str)
+    text = format_mensa_meals(mensa_name, date_str, meals_data)
+    text = text.replace(f"am {date_str}", f"am {friendly_date}")
+
+    if fmt == FORMAT_DAILY_REPORT:
+        text = (
+            f"☀️ Mensa-Bericht für {friendly_date}\n"
+            f"📍 Standort: {mensa_name}\n\n"
+            f"{text}"
+        )
+    return text
+
+
+def get_rendered_menu(mensa_name, date_str, llm=None, fmt=FORMAT_MENU, language=DEFAULT_LANGUAGE, meal_filter=None):
+    """
+    Get the final message text for a menu, rendering it only on a cache miss
+    or when the shared day menu changed since it was rendered.
+
+    Args:
+        mensa_name (str): Name of the mensa
+        date_str (str): Date string in YYYY-MM-DD format
+        llm: LLM instance used to classify the meals on a cache miss
+        fmt (str): One of FORMAT_MENU, FORMAT_DAILY_REPORT
+        language (str): Output language
+        meal_filter (dict): User filter preferences (see day_menu.DEFAULT_MEAL_FILTER)
+
+    Returns:
+        str: The message text as it is sent to the user
+    """
+    cached = get_cached_menu(mensa_name, date_str, fmt, language, meal_filter)
+    if cached is not None:
+        # A refetched or reclassified day menu makes the renderings of its mensa and date stale
+        day_menu = get_cached_day_menu(mensa_name, date_str)
+        if day_menu is None or not update_menu_fingerprint(mensa_name, date_str, day_menu.fingerprint()):
+            return cached
+
+    # The day menu is fetched and classified once per mensa and shared by all filters
+    day_menu = get_day_menu(mensa_name, date_str, llm)
+    if shows_unclassified_meals(day_menu, meal_filter):
+        # e.g. desserts for a user who included them, classified on first use
+        day_menu = classify_hidden_meals(day_menu, llm)
+    meals_data = filter_day_menu(day_menu, meal_filter).to_meals_data()
+    text = render_menu_text(mensa_name, date_str, meals_data, fmt)
+
+    # Failed fetches are not cached so they are retried
+    if day_menu.error is None:
+        update_menu_fingerprint(mensa_name, date_str, day_menu.fingerprint())
+        store_rendered_menu(mensa_name, date_str, text, fmt, language, meal_filter)
+    return text
@@ -0,0 +1,367 @@
+import math
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+import metrics
+from dish_alerts import tokenize
+from menu_archive import add_archive_listener, iter_archived_meals
+from mensa_utils import MENSA_IDS
+from time_utils import parse_date_query, parse_explicit_date, format_date_for_display, get_weekday_name
+
+# Past days kept in the index; older dishes are the job of /wann (dish_index.py)
+MENU_SEARCH_DAYS_BACK = 14
+# Other workers archive menus too, so the index is rebuilt from the archive after this many seconds
+MENU_SEARCH_REFRESH_SECONDS = 15 * 60
+UPCOMING_DAYS = 7  # searched when the question names no day or week
+MAX_LOOKUP_LINES = 10
+MAX_CONTEXT_MEALS = 8
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Query words at least this long also match compound words containing them ("fisch" -> "backfisch")
+MIN_COMPOUND_LENGTH = 4
+
+# Words a dish name does not contain, but that stand for dishes that do
+SYNONYMS = {
+    "fisch": ["lachs", "seelachs", "forelle", "kabeljau", "dorsch", "hering", "thunfisch", "pangasius", "scholle",
+              "zander", "matjes", "backfisch", "fischstäbchen", "garnelen", "meeresfrüchte"],
+    "fleisch": ["rind", "schwein", "hähnchen", "huhn", "pute", "geflügel", "lamm", "wurst", "schnitzel", "gulasch",
+                "hackfleisch", "frikadelle", "bratwurst", "currywurst", "bolognese", "steak"],
+    "hähnchen": ["huhn", "geflügel", "hühnchen", "chicken"],
+    "nudeln": ["pasta", "spaghetti", "penne", "tagliatelle", "lasagne", "spätzle", "maultaschen", "gnocchi"],
+    "pasta": ["nudeln", "spaghetti", "penne", "tagliatelle", "lasagne"],
+    "suppe": ["eintopf", "brühe"],
+    "nachtisch": ["dessert", "pudding", "kuchen", "quark", "joghurt", "eis"],
+    "dessert": ["nachtisch", "pudding", "kuchen", "quark", "joghurt", "eis"],
+    "kartoffeln": ["kartoffel", "pommes", "bratkartoffeln", "kartoffelpüree", "püree", "kroketten", "gratin"],
+    "reis": ["basmatireis", "risotto"],
+}
+VEGETARIAN_WORDS = {"vegetarisch", "vegetarische", "vegetarisches", "vegetarischen", "veggie", "vegan", "vegane",
+                    "veganes", "veganen", "fleischlos", "fleischlose", "fleischloses"}
+VEGETARIAN_NOTES = {"vegetarisch", "vegan"}
+
+# Question and filler words that never name a dish
+STOPWORDS = {
+    "gibt", "es", "gibts", "s", "was", "wann", "wo", "welche", "welcher", "welches", "welchen", "ob", "wie", "denn",
+    "mal", "noch", "auch", "bitte", "heute", "morgen", "übermorgen", "diese", "dieser", "diesen", "nächste",
+    "nächsten", "woche", "wochenende", "am", "an", "in", "im", "der", "die", "das", "dem", "den", "zum", "zur",
+    "und", "oder", "mit", "ohne", "etwas", "irgendwas", "ein", "eine", "einen", "kein", "keine", "mensa",
+    "mensen", "uni", "essen", "hat", "haben", "habt", "sind", "ist", "da", "dort", "ich", "du", "wir", "man",
+    "für", "zu", "bei", "von", "mir", "uns", "tag", "tage", "tagen", "welchem", "kommenden", "kommende",
+    "montag", "dienstag", "mittwoch", "donnerstag", "freitag", "samstag", "sonntag", "gericht", "gerichte",
+}
+# Phrasings of questions a listing of matching meals answers completely
+LOOKUP_PATTERN = re.compile(r"\b(gibt es|gibt's|gibts|wann gibt|welche[rsnm]?|wo gibt|hat die mensa|haben die)\b")
+
+
+class MenuQuestion:
+    """What a chat message asks about the menus: dish words, mensa, days and a vegetarian filter."""
+
+    def __init__(self, terms, mensa_name, start, end, vegetarian_only, is_lookup, mentions_menu):
+        self.terms = terms
+        self.mensa_name = mensa_name
+        self.start = start
+        self.end = end
+        self.vegetarian_only = vegetarian_only
+        self.is_lookup = is_lookup
+        # Names a day, week, mensa or diet, so menu data is useful context even without dish words
+        self.mentions_menu = mentions_menu
+
+    def describe_range(self):
+        if self.start == self.end:
+            return f"am {format_date_for_display(self.start)}"
+        start = datetime.strptime(self.start, "%Y-%m-%d")
+        end = datetime.strptime(self.end, "%Y-%m-%d")
+        return f"vom {start.strftime('%d.%m.')} bis {end.strftime('%d.%m.')}"
+
+
+def parse_menu_question(text, default_mensa, today=None):
+    """
+    Extract what a chat message asks about the menus, without the LLM.
+
+    Args:
+        text (str): The user's message
+        default_mensa (str): Mensa used when the message names none
+        today (date): Reference day (default: today)
+
+    Returns:
+        MenuQuestion
+    """
+    if today is None:
+        today = date.today()
+    lowered = text.lower()
+    words = tokenize(text)
+
+    mensa_name = default_mensa
+    mentioned = set()
+    for name in MENSA_IDS:
+        if name.lower() in lowered:
+            mensa_name = name
+            mentioned.add(name.lower())
+
+    has_date = True
+    if re.search(r"\bnächste[n]? woche\b", lowered):
+        start = today + timedelta(days=7 - today.weekday())
+        end = start + timedelta(days=6)
+    elif re.search(r"\b(diese[rn]? woche|der woche|die woche)\b", lowered):
+        start, end = today, today + timedelta(days=6 - today.weekday())
+    elif (re.search(r"\b(heute|morgen|übermorgen|montag|dienstag|mittwoch|donnerstag|freitag|samstag|sonntag)\b",
+                    lowered) or parse_explicit_date(text, today)):
+        start = end = datetime.strptime(parse_date_query(text), "%Y-%m-%d").date()
+    else:
+        start, end = today, today + timedelta(days=UPCOMING_DAYS - 1)
+        has_date = False
+
+    vegetarian_only = any(word in VEGETARIAN_WORDS for word in words)
+    terms = [
+        word for word in words
+        if word not in STOPWORDS and word not in VEGETARIAN_WORDS and word not in mentioned
+        and not word.isdigit() and len(word) > 2
+    ]
+    return MenuQuestion(
+        terms, mensa_name, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), vegetarian_only,
+        bool(LOOKUP_PATTERN.search(lowered)), has_date or bool(mentioned) or vegetarian_only,
+    )
+
+
+class MenuSearchIndex:
+    """
+    BM25 index over the meals of recent and upcoming menus.
+
+    One document per meal and day (mensa, date, category, name), with the
+    tokens of the name, the category and the notes. Query words are
+    expanded with SYNONYMS and with compound words containing them, and
+    every query word counts with its best matching expansion.
+    """
+
+    def __init__(self):
+        self._docs = {}  # {(mensa_name, date, category, name): meal dict}
+        self._term_freqs = {}  # {doc key: {token: count}}
+        self._postings = {}  # {token: {doc key}}
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self.loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, mensa_name, date_str, category, name, price=None, notes=None, classification=None):
+        """Index a meal served (or planned) on a day; re-adding it updates price, notes and classification."""
+        key = (mensa_name, date_str, category, name)
+        with self._lock:
+            previous = self._docs.get(key)
+            if previous is not None:
+                # Prefetched upcoming menus are unclassified, keep a known classification
+                classification = classification or previous["classification"]
+                self._remove(key)
+            notes = list(notes or [])
+            self._docs[key] = {
+                "mensa_name": mensa_name, "date": date_str, "category": category, "name": name,
+                "price": price, "notes": notes, "classification": classification,
+            }
+            freqs = {}
+            for token in tokenize(" ".join([name, category] + notes)):
+                freqs[token] = freqs.get(token, 0) + 1
+            self._term_freqs[key] = freqs
+            self._total_length += sum(freqs.values())
+            for token in freqs:
+                self._postings.setdefault(token, set()).add(key)
+
+    def _remove(self, key):
+        freqs = self._term_freqs.pop(key)
+        self._total_length -= sum(freqs.values())
+        for token in freqs:
+            self._postings[token].discard(key)
+            if not self._postings[token]:
+                del self._postings[token]
+        del self._docs[key]
+
+    def add_day_menu(self, day_menu):
+        """Replace the meals of a day with those of a DayMenu (used as archive listener)."""
+        day = (day_menu.mensa_name, day_menu.date_str)
+        keys = {day + (meal["category"], meal["name"]) for meal in day_menu.meals}
+        with self._lock:
+            for key in [key for key in self._docs if key[:2] == day and key not in keys]:
+                self._remove(key)
+        for meal in day_menu.meals:
+            price = (meal.get("prices") or {}).get("students", meal.get("price"))
+            self.add(day_menu.mensa_name, day_menu.date_str, meal["category"], meal["name"], price,
+                     meal.get("notes"), meal.get("classification"))
+
+    def load_from_archive(self, today=None):
+        """Rebuild the index from the archived meals of the last MENU_SEARCH_DAYS_BACK days and all later ones."""
+        since = ((today or date.today()) - timedelta(days=MENU_SEARCH_DAYS_BACK)).strftime("%Y-%m-%d")
+        fresh = MenuSearchIndex()
+        for row in iter_archived_meals(since):
+            fresh.add(*row)
+        with self._lock:
+            self._docs, self._term_freqs, self._postings = fresh._docs, fresh._term_freqs, fresh._postings
+            self._total_length = fresh._total_length
+            self.loaded_at = time.monotonic()
+
+    def expand(self, term):
+        """Indexed tokens a query word stands for: itself, its synonyms and compounds containing either."""
+        with self._lock:
+            return self._expand(term)
+
+    def _expand(self, term):
+        wanted = {term, *SYNONYMS.get(term, [])}
+        expanded = set()
+        for token in self._postings:
+            for word in wanted:
+                if token == word or (len(word) >= MIN_COMPOUND_LENGTH and word in token):
+                    expanded.add(token)
+                    break
+        return expanded
+
+    def knows_term(self, term):
+        """Whether a word can be about food: it is a synonym key or matches an indexed token."""
+        return term in SYNONYMS or bool(self.expand(term))
+
+    def _idf(self, token):
+        count = len(self._postings.get(token, ()))
+        return math.log(1 + (len(self._docs) - count + 0.5) / (count + 0.5))
+
+    def search(self, question, limit=None):
+        """
+        Meals of the question's mensa and days matching its dish words, best first.
+
+        Without dish words all meals of the range match (in date order).
+
+        Returns:
+            list: Meal dicts with an added "score"
+        """
+        with self._lock:
+            candidates = [
+                doc for doc in self._docs.values()
+                if doc["mensa_name"] == question.mensa_name and question.start <= doc["date"] <= question.end
+                and (not question.vegetarian_only or is_vegetarian(doc))
+            ]
+            if not question.terms:
+                results = [dict(doc, score=0.0) for doc in sorted(candidates, key=lambda d: (d["date"], d["category"]))]
+                return results[:limit] if limit else results
+
+            expansions = [self._expand(term) for term in question.terms]
+            average_length = self._total_length / max(1, len(self._docs))
+            results = []
+            for doc in candidates:
+                key = (doc["mensa_name"], doc["date"], doc["category"], doc["name"])
+                freqs = self._term_freqs[key]
+                length_norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(freqs.values()) / average_length)
+                score = 0.0
+                for tokens in expansions:
+                    score += max(
+                        (self._idf(token) * freqs[token] * (BM25_K1 + 1) / (freqs[token] + length_norm)
+                         for token in tokens if token in freqs),
+                        default=0.0,
+                    )
+                if score > 0:
+                    results.append(dict(doc, score=score))
+        results.sort(key=lambda doc: (-doc["score"], doc["date"]))
+        return results[:limit] if limit else results
+
+    def has_menus(self, question):
+        """Whether any menu of the question's mensa and days is indexed."""
+        with self._lock:
+            return any(doc["mensa_name"] == question.mensa_name and question.start <= doc["date"] <= question.end
+                       for doc in self._docs.values())
+
+
+def is_vegetarian(doc):
+    return doc["classification"] == "vegetarian" or any(note.lower() in VEGETARIAN_NOTES for note in doc["notes"])
+
+
+def format_meal_line(doc):
+    day = datetime.strptime(doc["date"], "%Y-%m-%d")
+    line = f"• {get_weekday_name(doc['date'])[:2]}, {day.strftime('%d.%m.')}: {doc['name']}"
+    if doc["price"] is not None:
+        line += f" ({doc['price']:.2f}€)"
+    return line
+
+
+def answer_lookup(index, question):
+    """
+    Answer a lookup question ("Gibt es diese Woche Fisch?") from the index alone.
+
+    Returns:
+        str: The answer, or None if the message is not a lookup the index can answer
+    """
+    if not question.is_lookup:
+        return None
+    if question.terms:
+        if not all(index.knows_term(term) for term in question.terms):
+            return None  # not (only) about dishes, e.g. "Gibt es eine Hilfe?"
+    elif not question.vegetarian_only:
+        return None  # "Was gibt es morgen?" is a menu request
+
+    subject = " ".join(term.capitalize() for term in question.terms) or "Vegetarisches"
+    if question.terms and question.vegetarian_only:
+        subject = f"{subject} (vegetarisch)"
+    where = f"in der Mensa {question.mensa_name} {question.describe_range()}"
+    if not index.has_menus(question):
+        return f"🤷 Für die Mensa {question.mensa_name} {question.describe_range()} liegt mir noch kein Speiseplan vor."
+
+    metrics.inc("menu_search_requests_total", kind="lookup")
+    matches = index.search(question)
+    if not matches:
+        answer = f"🔎 Nein, {where} finde ich nichts zu „{subject}“."
+        for other in MENSA_IDS:
+            if other == question.mensa_name:
+                continue
+            other_question = MenuQuestion(question.terms, other, question.start, question.end,
+                                          question.vegetarian_only, question.is_lookup, question.mentions_menu)
+            other_matches = index.search(other_question, limit=3)
+            if other_matches:
+                answer += f"\nIn der Mensa {other} aber:\n" + "\n".join(
+                    format_meal_line(doc) for doc in sorted(other_matches, key=lambda doc: doc["date"]))
+        return answer
+    matches.sort(key=lambda doc: (doc["date"], -doc["score"]))
+    lines = [format_meal_line(doc) for doc in matches[:MAX_LOOKUP_LINES]]
+    if len(matches) > MAX_LOOKUP_LINES:
+        lines.append(f"… und {len(matches) - MAX_LOOKUP_LINES} weitere")
+    return f"🔎 Ja, {where} gibt es „{subject}“:\n" + "\n".join(lines)
+
+
+def menu_context(index, question):
+    """
+    Relevant meals as a context message for the chat LLM.
+
+    Returns:
+        str: Context text, or None if the question is not about the menus
+    """
+    known_terms = [term for term in question.terms if index.knows_term(term)]
+    if not known_terms and not question.mentions_menu:
+        return None
+    if known_terms != question.terms:
+        question = MenuQuestion(known_terms, question.mensa_name, question.start, question.end,
+                                question.vegetarian_only, question.is_lookup, question.mentions_menu)
+    metrics.inc("menu_search_requests_total", kind="context")
+    meals = index.search(question, limit=MAX_CONTEXT_MEALS)
+    if not meals:
+        return (f"Speiseplan der Mensa {question.mensa_name} {question.describe_range()}: keine passenden Gerichte "
+                "bekannt. Erfinde keine Gerichte.")
+    lines = [f"{format_meal_line(doc)} [{doc['category']}, {doc['classification'] or 'unbekannt'}]"
+             for doc in sorted(meals, key=lambda doc: doc["date"])]
+    return (f"Passende Gerichte der Mensa {question.mensa_name} {question.describe_range()}:\n" + "\n".join(lines)
+            + "\nBeantworte Fragen zu Gerichten nur anhand dieser Liste.")
+
+
+_menu_search_index = None
+_index_lock = threading.Lock()
+
+
+def get_menu_search_index():
+    """Return the shared index, rebuilding it from the archive when it is older than MENU_SEARCH_REFRESH_SECONDS."""
+    global _menu_search_index
+    with _index_lock:
+        if _menu_search_index is None:
+            _menu_search_index = MenuSearchIndex()
+            add_archive_listener(_menu_search_index.add_day_menu)
+        if time.monotonic() - _menu_search_index.loaded_at > MENU_SEARCH_REFRESH_SECONDS or not _menu_search_index.loaded_at:
+            _menu_search_index.load_from_archive()
+    return _menu_search_index
+
+
+metrics.describe("menu_search_requests_total", "counter",
+                 "Chat messages answered from the menu index (lookup) or grounded with menu data (context)")
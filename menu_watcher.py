@@ -0,0 +1,148 @@
+import mensa_utils
+from day_menu import (
+    DayMenu, build_day_menu, content_hash, filter_day_menu, get_cached_day_menu, store_day_menu, unclassified_meal
+)
+from menu_cache import invalidate_rendered_menus
+from shared_state import shared_dict
+
+# How often today's menus are refetched (seconds)
+MENU_WATCH_INTERVAL = 5 * 60
+
+# Meals of the last version the watcher compared against. Kept apart from the day menu
+# cache (refetched by /menu as well) and shared, so a new leader worker continues from it
+_last_seen = shared_dict("menu_watch_snapshots")  # {(mensa_name, date_str): meals}
+
+
+class MenuDelta:
+    """Structural difference between two versions of a day menu."""
+
+    def __init__(self, mensa_name, date_str, added=None, removed=None, price_changed=None):
+        self.mensa_name = mensa_name
+        self.date_str = date_str
+        self.added = added or []  # meal dicts only in the new menu
+        self.removed = removed or []  # meal dicts only in the old menu
+        self.price_changed = price_changed or []  # (old_meal, new_meal) tuples
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.price_changed)
+
+    def __str__(self):
+        return (f"MenuDelta: {self.mensa_name} {self.date_str}, +{len(self.added)} "
+                f"-{len(self.removed)} ~{len(self.price_changed)}")
+
+
+def diff_meals(old_meals, new_meals):
+    """
+    Compute which meals were added, removed or changed their price.
+
+    Meals are matched by (category, name). Notes changes without a price change
+    are not reported.
+
+    Returns:
+        tuple: (added, removed, price_changed)
+    """
+    old_by_key = {(meal["category"], meal["name"]): meal for meal in old_meals}
+    new_by_key = {(meal["category"], meal["name"]): meal for meal in new_meals}
+
+    added = [meal for key, meal in new_by_key.items() if key not in old_by_key]
+    removed = [meal for key, meal in old_by_key.items() if key not in new_by_key]
+    price_changed = [
+        (old_by_key[key], meal) for key, meal in new_by_key.items()
+        if key in old_by_key and (old_by_key[key].get("prices") or {}) != (meal.get("prices") or {})
+    ]
+    return added, removed, price_changed
+
+
+def check_menu_for_changes(mensa_name, date_str, llm=None):
+    """
+    Refetch a day menu and compare it to the version seen by the last check.
+
+    Only the raw OpenMensa data is fetched and hashed. If the hash matches the
+    last seen version nothing is classified or invalidated. If it differs, only
+    meals with new names are classified, the shared day menu is replaced and
+    cached renderings for the mensa/date are dropped. The first check of a day
+    (or the first with meals) only records the unclassified meals as baseline,
+    and closed days are skipped.
+
+    Args:
+        mensa_name (str): Name of the mensa
+        date_str (str): Date string in YYYY-MM-DD format
+        llm: LLM instance used to classify new meals
+
+    Returns:
+        MenuDelta: The changes, or None if nothing changed or there was no
+            previous version to compare against
+    """
+    mensa_id = mensa_utils.get_mensa_id(mensa_name)
+    try:
+        if mensa_utils.is_canteen_closed(mensa_id, date_str):
+            return None
+        raw_meals = mensa_utils.get_raw_meals(mensa_id, date_str)
+    except Exception as e:
+        print(f"Fehler beim Prüfen des Menüs von {mensa_name}: {e}")
+        return None
+
+    key = (mensa_name, date_str)
+    old_meals = _last_seen.get(key)
+    if not old_meals:
+        # The first (or first non-empty) menu of a day is the baseline, not worth any LLM call
+        _last_seen[key] = [unclassified_meal(meal) for meal in raw_meals]
+        return None
+    if content_hash(old_meals) == content_hash(raw_meals):
+        return None
+
+    cached_menu = get_cached_day_menu(mensa_name, date_str)
+    known_classifications = {
+        meal["name"]: (meal["classification"], meal["emojis"])
+        for meal in old_meals + (cached_menu.meals if cached_menu is not None else [])
+        if meal["classification"] is not None
+    }
+    new_menu = build_day_menu(mensa_name, date_str, raw_meals, llm, known_classifications)
+    store_day_menu(new_menu)
+    invalidate_rendered_menus(mensa_name, date_str)
+    _last_seen[key] = new_menu.meals
+
+    added, removed, price_changed = diff_meals(old_meals, new_menu.meals)
+    delta = MenuDelta(mensa_name, date_str, added, removed, price_changed)
+    return delta if delta else None
+
+
+def prune_menu_snapshots(today_str):
+    """Forget the snapshots of past days."""
+    for key in list(_last_seen):
+        if key[1] < today_str:
+            _last_seen.pop(key, None)
+
+
+def filter_menu_delta(delta, meal_filter=None):
+    """Restrict a delta to the meals a user would see with their filter."""
+    def visible(meals):
+        return filter_day_menu(DayMenu(delta.mensa_name, delta.date_str, meals), meal_filter).meals
+
+    visible_changed = {
+        (meal["category"], meal["name"]) for meal in visible([new for _, new in delta.price_changed])
+    }
+    return MenuDelta(
+        delta.mensa_name,
+        delta.date_str,
+        visible(delta.added),
+        visible(delta.removed),
+        [(old, new) for old, new in delta.price_changed if (new["category"], new["name"]) in visible_changed],
+    )
+
+
+def format_menu_delta(delta):
+    """Format a menu delta as a notification message."""
+    def price_str(meal):
+        price = meal.get("price")
+        return f" ({price:.2f}€)" if price is not None else ""
+
+    output = [f"🔔 Das Menü der Mensa {delta.mensa_name} wurde aktualisiert:"]
+    for meal in delta.added:
+        # Meals of LAZY_CATEGORIES may not be classified yet
+        output.append(f"  ➕ {meal['emojis'] or '🍽️'} {meal['name']}{price_str(meal)}")
+    for meal in delta.removed:
+        output.append(f"  ➖ {meal['name']}")
+    for old_meal, new_meal in delta.price_changed:
+        output.append(f"  💶 {new_meal['name']}:{price_str(old_meal)} →{price_str(new_meal)}")
+    return "\n".join(output)
@@ -1,6 +1,8 @@
-from langchain.schema import HumanMessage, SystemMessage
 import re
+from datetime import datetime
 from time_utils import parse_date_query
+from llm_calls import invoke_llm, llm_available
+from structured_output import parse_structured
 
 # Command types
 COMMAND_HELP = "help"
@@ -94,6 +96,39 @@ def classify_message_simple(message_text):
     # Default to chat for anything else
     return MessageIntent(COMMAND_CHAT)
 
+# Constant, so every call shares the same cacheable prompt prefix
+MESSAGE_CLASSIFICATION_PROMPT = """Classify the intent of a message to a university canteen (Mensa) bot.
+Commands: help (asks for help or the commands), menu (wants the menu, maybe for a date), mensa (wants to change the canteen), chat (anything else), settings (wants to change settings), restart (wants to reset the conversation).
+Reply with JSON only: {"command": "<command>", "date": "YYYY-MM-DD" or null, "mensa_location": "Kiepenheuerallee" or "Griebnitzsee" or null}"""
+
+LLM_COMMANDS = [COMMAND_HELP, COMMAND_MENU, COMMAND_MENSA, COMMAND_CHAT, COMMAND_SETTINGS, COMMAND_RESTART]
+MENSA_LOCATIONS = ["Kiepenheuerallee", "Griebnitzsee"]
+
+MESSAGE_INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "command": {"type": "string", "enum": LLM_COMMANDS},
+        "date": {"type": ["string", "null"]},
+        "mensa_location": {"type": ["string", "null"], "enum": MENSA_LOCATIONS + [None]},
+    },
+    "required": ["command", "date", "mensa_location"],
+    "additionalProperties": False,
+}
+MESSAGE_INTENT_MAX_TOKENS = 60
+
+def parse_message_intent(data):
+    """Validate an intent following MESSAGE_INTENT_SCHEMA and return it as MessageIntent."""
+    command = data["command"]
+    if command not in LLM_COMMANDS:
+        raise ValueError(f"unknown command {command!r}")
+    date_str = data.get("date") or None
+    if date_str is not None:
+        datetime.strptime(date_str, "%Y-%m-%d")  # raises ValueError
+    mensa_location = data.get("mensa_location") or None
+    if mensa_location is not None and mensa_location not in MENSA_LOCATIONS:
+        raise ValueError(f"unknown mensa {mensa_location!r}")
+    return MessageIntent(command, date_str=date_str, mensa_location=mensa_location)
+
 def classify_message_with_llm(message_text, llm):
     """
     Use LLM to classify user message intent.
@@ -105,51 +140,15 @@ def classify_message_with_llm(message_text, llm):
     Returns:
         MessageIntent: The classified intent
     """
-    system_prompt = """
-    You are a helpful assistant that classifies user messages into intents.
-    Analyze the user's message and determine which command they want to use.
-    
-    Available commands:
-    - help: User wants help or information about available commands
-    - menu: User wants to see the menu (possibly for a specific date)
-    - mensa: User wants to change their preferred mensa location
-    - chat: User just wants to chat or ask a general question
-    - settings: User wants to change settings
-    - restart: User wants to restart or reset the conversation
-    
-    Respond with a JSON object containing:
-    {
-        "command": "one of [help, menu, mensa, chat, settings, restart]",
-        "date": "YYYY-MM-DD if a date is mentioned, otherwise null",
-        "mensa_location": "location name if mentioned (correct to valid names: "Kiepenheuerallee", "Griebnitzsee"), otherwise null"
-    }
-    
-    Only include the JSON in your response, nothing else.
-    """
-    
     messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"Classify this message: '{message_text}'")
+        ("system", MESSAGE_CLASSIFICATION_PROMPT),
+        ("human", message_text)
     ]
     
     try:
-        response = llm.invoke(messages).content.strip()
-        
-        # Extract JSON from response
-        import json
-        import re
-        
-        # Find JSON pattern in the response
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(0)
-            result = json.loads(json_str)
-            
-            command = result.get("command", COMMAND_UNKNOWN)
-            date_str = result.get("date")
-            mensa_location = result.get("mensa_location")
-            
-            return MessageIntent(command, date_str=date_str, mensa_location=mensa_location)
+        response = invoke_llm(llm, messages, "classify_message_with_llm", schema=MESSAGE_INTENT_SCHEMA,
+                              max_output_tokens=MESSAGE_INTENT_MAX_TOKENS).content
+        return parse_structured(response, "classify_message_with_llm", parse_message_intent)
     except Exception as e:
         print(f"Error in LLM classification: {e}")
     
@@ -167,6 +166,11 @@ def process_user_message(message_text, llm=None):
     Returns:
         tuple: (command, args) where command is the command to execute and args are the arguments
     """
+    # While the LLM is degraded (circuit breaker open) only the keyword rules are used
+    degraded = llm is not None and not llm_available()
+    if degraded:
+        llm = None
+    
     # First try simple classification
     intent = classify_message_simple(message_text)
     
@@ -191,6 +195,9 @@ def process_user_message(message_text, llm=None):
         elif llm:
             date_str = parse_date_query(message_text, llm)
             return "menu", [date_str]
+        # Without the LLM the date is taken from the rule-based parsing
+        elif degraded:
+            return "menu", [parse_date_query(message_text)]
         # If no date and no LLM, return as is
         else:
             return "menu", intent.args
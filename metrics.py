@@ -0,0 +1,211 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_lock = threading.Lock()
+_counters = {}  # {(name, labels): value}
+_gauges = {}  # {(name, labels): value}
+_histograms = {}  # {(name, labels): [bucket counts..., sum, count]}
+_help = {}  # {name: (type, help text)}
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def describe(name, metric_type, help_text):
+    """Register the type and help text of a metric for the exposition format."""
+    _help[name] = (metric_type, help_text)
+
+
+def inc(name, amount=1, **labels):
+    """Increase a counter."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to a value."""
+    with _lock:
+        _gauges[(name, _labels_key(labels))] = value
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the duration of the with block in the histogram name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed_handler(command, handler):
+    """Wrap an async Telegram handler to record its duration and errors per command."""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await handler(update, context)
+        except Exception:
+            inc("handler_errors_total", command=command)
+            raise
+        finally:
+            observe("handler_duration_seconds", time.perf_counter() - start, command=command)
+            inc("handler_calls_total", command=command)
+    return wrapper
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup as hit or miss."""
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_call(call_site, seconds, response=None, error=False):
+    """
+    Record one LLM call.
+
+    Args:
+        call_site (str): e.g. classify_meal, classify_message_with_llm, parse_date_with_llm, chat
+        seconds (float): Duration of the call
+        response: LangChain message; token counts are taken from its usage_metadata if present
+        error (bool): Whether the call raised
+    """
+    inc("llm_calls_total", call_site=call_site, result="error" if error else "ok")
+    observe("llm_call_seconds", seconds, call_site=call_site)
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        inc("llm_input_tokens_total", usage["input_tokens"], call_site=call_site)
+    if usage.get("output_tokens"):
+        inc("llm_output_tokens_total", usage["output_tokens"], call_site=call_site)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def render_prometheus():
+    """Return all metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+    written_help = set()
+
+    def header(name, default_type):
+        if name in written_help:
+            return
+        written_help.add(name)
+        metric_type, help_text = _help.get(name, (default_type, ""))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        header(name, "histogram")
+        # Bucket counts are cumulative already, observe() counts a value for every bound above it
+        for bound, count in zip(LATENCY_BUCKETS, histogram):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-2]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def cache_hit_ratios():
+    """Return {cache: hit ratio} computed from cache_requests_total."""
+    totals = {}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            if name != "cache_requests_total":
+                continue
+            labels = dict(labels)
+            hits, lookups = totals.get(labels["cache"], (0, 0))
+            if labels["result"] == "hit":
+                hits += value
+            totals[labels["cache"]] = (hits, lookups + value)
+    return {cache: hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+
+def counter_total(name, **labels):
+    """Sum of the counter name over all label sets that contain the given labels."""
+    wanted = set(_labels_key(labels))
+    with _lock:
+        return sum(value for (counter, key), value in _counters.items()
+                   if counter == name and wanted <= set(key))
+
+
+def dump_metrics(path):
+    """Write the current metrics to a file (atomically replaced)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics on a local port from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+describe("handler_duration_seconds", "histogram", "Duration of Telegram update handlers per command")
+describe("handler_calls_total", "counter", "Handled Telegram updates per command")
+describe("handler_errors_total", "counter", "Telegram handlers that raised per command")
+describe("chat_messages_total", "counter", "Free-text messages per keyword-matched intent")
+describe("openmensa_request_seconds", "histogram", "Duration of OpenMensa API requests per endpoint")
+describe("llm_calls_total", "counter", "LLM calls per call site and result")
+describe("llm_call_seconds", "histogram", "LLM call latency per call site")
+describe("llm_input_tokens_total", "counter", "LLM input tokens per call site")
+describe("llm_output_tokens_total", "counter", "LLM output tokens per call site")
+describe("cache_requests_total", "counter", "Cache lookups per cache and result (hit/miss)")
+describe("bot_errors_total", "counter", "Errors reported to the Telegram error handler per type")
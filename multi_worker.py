@@ -0,0 +1,177 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from datetime import date
+from shared_state import SharedUpdateQueue, LeaderLease, claim_job_run, worker_name
+
+# Scheduled jobs run on the worker holding this lease; it is renewed every third of its lifetime
+LEADER_LEASE_SECONDS = 60
+QUEUE_POLL_INTERVAL = 0.05  # seconds an idle worker waits before looking for updates again
+MAX_PENDING_UPDATES = 1000  # the receiver stops taking updates from Telegram above this
+WORKER_CHECK_INTERVAL = 5  # seconds between checks for crashed workers
+
+_leader_lease = None
+
+
+def get_leader_lease():
+    global _leader_lease
+    if _leader_lease is None:
+        _leader_lease = LeaderLease("scheduled_jobs", ttl=LEADER_LEASE_SECONDS)
+    return _leader_lease
+
+
+async def renew_leadership(context):
+    get_leader_lease().acquire()
+
+
+def leader_only(callback, once_per_day=False):
+    """
+    Wrap a job callback so that only the leader worker runs it.
+
+    Args:
+        once_per_day (bool): Additionally record the run per day, so a daily job
+            also runs exactly once when the leadership moves at the scheduled time
+    """
+    @functools.wraps(callback)
+    async def wrapper(context):
+        if not get_leader_lease().acquire():
+            return
+        if once_per_day and not claim_job_run(f"{callback.__name__}:{date.today().isoformat()}"):
+            return
+        return await callback(context)
+    return wrapper
+
+
+async def consume_updates(application, stop_event):
+    """Handle updates from the shared queue one after another until stop_event is set."""
+    from telegram import Update
+    queue = SharedUpdateQueue()
+    me = worker_name()
+    async with application:
+        await application.start()
+        try:
+            while not stop_event.is_set():
+                claimed = await asyncio.to_thread(queue.claim, me)
+                if claimed is None:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), QUEUE_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                update_id, data = claimed
+                try:
+                    await application.process_update(Update.de_json(data, application.bot))
+                except Exception as e:
+                    print(f"Fehler beim Verarbeiten des Updates {update_id}: {e}")
+                finally:
+                    await asyncio.to_thread(queue.complete, update_id)
+        finally:
+            get_leader_lease().release()
+            await application.stop()
+
+
+def worker_main(index):
+    """Entry point of a worker process: builds the bot and consumes the shared queue."""
+    os.environ["BOT_WORKER_INDEX"] = str(index)
+    import telegram_mensa_bot
+    from webhook_server import stop_on_signals
+    # Handler, LLM and cache metrics are recorded here, not in the receiver
+    telegram_mensa_bot.serve_metrics(index)
+
+    async def run():
+        await consume_updates(telegram_mensa_bot.build_application(), stop_on_signals())
+
+    print(f"Worker {index} ({worker_name()}) gestartet")
+    asyncio.run(run())
+
+
+async def receive_polling(bot, queue, stop_event):
+    """Long-poll Telegram and put every update into the shared queue."""
+    from telegram import Update
+    from telegram.error import TimedOut, NetworkError
+    await bot.delete_webhook(drop_pending_updates=True)
+    offset = None
+    while not stop_event.is_set():
+        # Backpressure: unfetched updates simply wait at Telegram
+        if queue.pending() >= MAX_PENDING_UPDATES:
+            await asyncio.sleep(1)
+            continue
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=10, allowed_updates=Update.ALL_TYPES)
+        except (TimedOut, NetworkError) as e:
+            print(f"Polling-Fehler: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            queue.put(update.to_dict())
+            # The offset confirms the update to Telegram only after it is stored
+            offset = update.update_id + 1
+
+
+class WorkerSupervisor:
+    """Starts the worker processes and replaces crashed ones."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.processes = {}
+        self._context = multiprocessing.get_context("spawn")
+
+    def start(self, index):
+        process = self._context.Process(target=worker_main, args=(index,), name=f"bot-worker-{index}")
+        process.start()
+        self.processes[index] = process
+
+    def start_all(self):
+        for index in range(self.workers):
+            self.start(index)
+
+    def restart_dead(self):
+        for index, process in list(self.processes.items()):
+            if not process.is_alive():
+                print(f"Worker {index} beendet (Exit-Code {process.exitcode}), starte neu")
+                self.start(index)
+
+    def stop_all(self, timeout=30):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()  # SIGTERM, the worker finishes its current update
+        for process in self.processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+
+
+async def run_multi_worker(application, workers, webhook=None):
+    """
+    Receive updates in this process and handle them in worker processes.
+
+    Args:
+        application: Application used only for receiving (no handlers needed)
+        workers (int): Number of worker processes
+        webhook (dict): Keyword arguments for webhook_server.run_webhook, or None for long polling
+    """
+    from webhook_server import run_webhook, stop_on_signals
+    stop_event = stop_on_signals()
+    queue = SharedUpdateQueue()
+    supervisor = WorkerSupervisor(workers)
+    supervisor.start_all()
+
+    async def supervise():
+        while not stop_event.is_set():
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            supervisor.restart_dead()
+
+    monitor = asyncio.create_task(supervise())
+    print(f"{workers} Worker gestartet, {queue.pending()} Updates in der Warteschlange")
+    try:
+        if webhook is not None:
+            await run_webhook(application, **webhook, stop_event=stop_event,
+                              enqueue=lambda data: queue.put(data, MAX_PENDING_UPDATES))
+        else:
+            async with application.bot:
+                await receive_polling(application.bot, queue, stop_event)
+    finally:
+        monitor.cancel()
+        await asyncio.to_thread(supervisor.stop_all)
@@ -1,100 +1,119 @@
-from openmensa import OpenMensa
-from langchain_ollama import ChatOllama
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
-import json
-import re
 import mensa_utils
+from llm_calls import invoke_llm, LazyLLM, HedgedLLM, BackendLLM, LLM_CLIENT_TIMEOUT
+from structured_output import parse_structured
+from replay import wrap_llm
 from datetime import date
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # openai, ollama or groq; only this provider is imported
+# Optional second backend that gets a copy of requests the first one has not answered after LLM_HEDGE_DELAY seconds
+LLM_HEDGE_BACKEND = os.getenv("LLM_HEDGE_BACKEND", "")
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2"))
+# How long Ollama keeps the model and its prompt cache loaded between calls
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
-# Define system prompt for meal classification
-MEAL_CLASSIFICATION_PROMPT = """You are a helpful assistant that classifies meals as vegetarian or non-vegetarian.
-Analyze the meal name and ingredients to determine if it's vegetarian.
-Respond in JSON format as follows:
-{
-    "type": "vegetarian" or "non-vegetarian",
-    "emojis": ["emoji1", "emoji2", "emoji3"]  # 1-3 fitting food emojis
+# System prompts are constants so every call starts with the same prefix (provider prompt
+# caching, Ollama KV cache); everything that varies goes into the human message.
+# Keep them within the budgets checked by benchmark_prompts.py.
+MEAL_CLASSIFICATION_PROMPT = """Classify a German meal name as vegetarian or non-vegetarian and pick 1-3 fitting food emojis.
+Reply with JSON only: {"type": "vegetarian" or "non-vegetarian", "emojis": ["emoji", ...]}
+
+Examples:
+Spaghetti Bolognese -> {"type": "non-vegetarian", "emojis": ["🍝", "🥩"]}
+Kartoffeln mit Spiegelei -> {"type": "vegetarian", "emojis": ["🥔", "🍳"]}"""
+
+MEAL_CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {"type": "string", "enum": ["vegetarian", "non-vegetarian"]},
+        "emojis": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["type", "emojis"],
+    "additionalProperties": False,
 }
+MEAL_CLASSIFICATION_MAX_TOKENS = 40
 
-Note that the input text is German. But the output should be in English.
-Choose appropriate emojis based on the ingredients or type of dish.
-
-Example 1:
-Input: "Spaghetti Bolognese"
-Output: {"type": "non-vegetarian", "emojis": ["🍝", "🥩"]}
-
-Example 2:
-Input: "Kartoffeln mit Spiegelei"
-Output: {"type": "vegetarian", "emojis": ["🥔", "🍳"]}
-
-Example 3:
-Input: "Hamburger"
-Output: {"type": "non-vegetarian", "emojis": ["🍔"]}
-"""
-
-def setup_llm(model="phi3:3.8b", temperature=0.3, num_predict=512):
-    """Initialize and return the LLM with specified parameters"""
-    # return ChatOllama(
-    #     model=model,
-    #     temperature=temperature,
-    #     num_predict=num_predict,
-    # )
+def create_chat_model(backend, model, temperature, num_predict):
+    """Import the provider package of the backend and create its chat model"""
+    if backend == "ollama":
+        from langchain_ollama import ChatOllama
+        return BackendLLM(ChatOllama(
+            model=model,
+            temperature=temperature,
+            num_predict=num_predict,
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            client_kwargs={"timeout": LLM_CLIENT_TIMEOUT},
+        ), backend)
     
-    # return ChatGroq(
-    #     model="llama-3.2-90b-vision-preview",
-    #     temperature=temperature,
-    #     api_key="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",
-    # )
+    if backend == "groq":
+        from langchain_groq import ChatGroq
+        return BackendLLM(ChatGroq(
+            model="llama-3.2-90b-vision-preview",
+            temperature=temperature,
+            api_key=GROQ_API_KEY,
+            timeout=LLM_CLIENT_TIMEOUT,
+            max_retries=0,
+        ), backend)
     
-    return ChatOpenAI(
+    from langchain_openai import ChatOpenAI
+    return BackendLLM(ChatOpenAI(
         model="gpt-4o-mini",
         temperature=temperature,
         api_key=OPENAI_API_KEY,
-    )
+        timeout=LLM_CLIENT_TIMEOUT,
+        max_retries=0,
+    ), backend)
+
+def setup_llm(model="phi3:3.8b", temperature=0.3, num_predict=512, backend=None):
+    """Initialize and return the LLM of LLM_BACKEND with specified parameters, hedged if LLM_HEDGE_BACKEND is set"""
+    backend = backend or LLM_BACKEND
+
+    def create():
+        primary = create_chat_model(backend, model, temperature, num_predict)
+        if not LLM_HEDGE_BACKEND or LLM_HEDGE_BACKEND == backend:
+            return primary
+        secondary = LazyLLM(create_chat_model, LLM_HEDGE_BACKEND, model, temperature, num_predict)
+        return HedgedLLM(primary, secondary, LLM_HEDGE_DELAY)
+
+    return wrap_llm(create)
+
+# Used when classify_meal is called without an LLM
+_default_llm = LazyLLM(setup_llm)
+
+def parse_meal_classification(data):
+    """
+    Validate a classification following MEAL_CLASSIFICATION_SCHEMA.
+    
+    Returns:
+        tuple: (meal_type, emoji string)
+    """
+    meal_type = data["type"].lower()
+    if meal_type not in ("vegetarian", "non-vegetarian"):
+        raise ValueError(f"unknown meal type {meal_type!r}")
+    emojis = [emoji for emoji in data.get("emojis") or [] if isinstance(emoji, str) and emoji.strip()]
+    return meal_type, "".join(emojis[:3]) or "🍽️"
 
 def classify_meal(meal_name, llm=None):
     """Use LLM to classify a meal as vegetarian or non-vegetarian"""
     if llm is None:
-        llm = setup_llm()
+        llm = _default_llm
         
     messages = [
         ("system", MEAL_CLASSIFICATION_PROMPT),
-        ("human", f"Classify this meal as vegetarian or non-vegetarian: {meal_name}")
+        ("human", meal_name)
     ]
     
     try:
-        response = llm.invoke(messages).content.strip()
-        
-        # Extract JSON object from response
-        json_match = re.search(r'\{.*?\}', response, re.DOTALL)
-        if not json_match:
-            # Could not find JSON in response
-            return "unknown", "🍽️"
-            
-        json_str = json_match.group()
-        
-        # Parse JSON and get classification
-        try:
-            result = json.loads(json_str)
-            meal_type = result.get('type', '').lower()
-            emojis = result.get('emojis', ['🍽️'])  # Default emoji if none provided
-            emoji_str = ''.join(emojis)
-            if meal_type in ['vegetarian', 'non-vegetarian']:
-                return meal_type, emoji_str
-            else:
-                # Invalid meal type in response
-                return "unknown", "🍽️"
-        except json.JSONDecodeError as e:
-            # Error parsing JSON response
-            return "unknown", "🍽️"
-            
+        response = invoke_llm(llm, messages, "classify_meal", schema=MEAL_CLASSIFICATION_SCHEMA,
+                              max_output_tokens=MEAL_CLASSIFICATION_MAX_TOKENS).content
+        return parse_structured(response, "classify_meal", parse_meal_classification)
     except Exception as e:
-        # Error classifying meal
+        # LLM unavailable or answer not matching the schema
+        print(f"Error classifying meal {meal_name!r}: {e}")
         return "unknown", "🍽️"
 
 def get_mensa_meals(mensa_name, date_str, llm=None):
@@ -160,21 +179,25 @@ def format_meals_output(meals_data):
     
     return "\n".join(output)
 
-def get_formatted_mensa_meals(mensa_name, date_str=None, llm=None):
-    """Get and format meals for a specific mensa and date"""
-    if date_str is None:
-        date_str = date.today().strftime("%Y-%m-%d")
-  
+def format_mensa_meals(mensa_name, date_str, meals_data):
+    """Format already fetched meals data with the mensa/date header"""
     header = f"\nGerichte in der Mensa {mensa_name} am {date_str}:"
     separator = "=" * 35
     
-    meals_data = get_mensa_meals(mensa_name, date_str, llm)
     if "error" in meals_data:
         return f"{header}\n{separator}\n{meals_data['error']}"
     
     formatted_meals = format_meals_output(meals_data)
     return f"{header}\n{separator}{formatted_meals}"
 
+def get_formatted_mensa_meals(mensa_name, date_str=None, llm=None):
+    """Get and format meals for a specific mensa and date"""
+    if date_str is None:
+        date_str = date.today().strftime("%Y-%m-%d")
+    
+    meals_data = get_mensa_meals(mensa_name, date_str, llm)
+    return format_mensa_meals(mensa_name, date_str, meals_data)
+
 if __name__ == "__main__":
     mensa_name = "Kiepenheuerallee"
     current_date = date.today().strftime("%Y-%m-%d")  # e.g. 2025-03-13
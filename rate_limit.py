@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+import metrics
+
+# Requests that need the LLM, lower value = served first
+PRIORITY_MENU = 0
+PRIORITY_CHAT = 1
+PRIORITY_BACKGROUND = 2  # e.g. chat summaries, nobody waits for them
+PRIORITY_NAMES = {PRIORITY_MENU: "menu", PRIORITY_CHAT: "chat", PRIORITY_BACKGROUND: "background"}
+
+# Rates are per minute; the burst is how many requests may come at once after a quiet period
+LLM_USER_RATE = float(os.getenv("LLM_USER_RATE", "6"))
+LLM_USER_BURST = int(os.getenv("LLM_USER_BURST", "5"))
+LLM_GLOBAL_RATE = float(os.getenv("LLM_GLOBAL_RATE", "120"))
+LLM_GLOBAL_BURST = int(os.getenv("LLM_GLOBAL_BURST", "20"))
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "4"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "50"))
+LLM_MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "30"))  # seconds
+
+MAX_TRACKED_USERS = 10000
+
+
+class TokenBucket:
+    """Allows rate tokens per second on average and up to capacity at once."""
+
+    def __init__(self, rate, capacity, now=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now=None):
+        """Take one token if available."""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self):
+        """Give back a token taken for a request that was not served."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def seconds_until_available(self, now=None):
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def is_full(self, now=None):
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= self.capacity
+
+
+class RateLimited(Exception):
+    """A request was not admitted; reason is "user" (own limit) or "overloaded" (shed)."""
+
+    def __init__(self, reason, retry_after=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LLMAdmission:
+    """
+    Admission control in front of the LLM.
+
+    Every request first needs a token of its user's bucket, otherwise it is
+    rejected right away; a request shed later gets its user token back. Admitted requests wait in a bounded priority queue
+    (menu requests ahead of free chat) until a global token and one of
+    max_concurrent slots are free. When the queue is full, or a request waited
+    longer than max_wait, it is shed.
+
+    Args:
+        user_rate, global_rate (float): Tokens per second
+        user_burst, global_burst (int): Bucket capacities
+        queueing (bool): Let requests wait for a slot. Without concurrent updates
+            a waiting request would stall the whole bot, so with False a request
+            is shed right away when no global token or slot is free
+    """
+
+    def __init__(self, user_rate, user_burst, global_rate, global_burst,
+                 max_concurrent=LLM_MAX_CONCURRENT, max_queue=LLM_QUEUE_SIZE, max_wait=LLM_MAX_QUEUE_WAIT,
+                 queueing=True):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.queueing = queueing
+        self.running = 0
+        self._user_buckets = {}
+        self._queue = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._wakeup = None
+
+    def _user_bucket(self, user_id):
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            if len(self._user_buckets) >= MAX_TRACKED_USERS:
+                # Full buckets carry no information, a new one would be full as well
+                self._user_buckets = {
+                    uid: b for uid, b in self._user_buckets.items() if not b.is_full()
+                }
+            bucket = self._user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _dispatch(self):
+        """Admit queued requests while slots and global tokens are available."""
+        while self._queue and self.running < self.max_concurrent:
+            _, _, future = self._queue[0]
+            if future.done():  # cancelled or timed out
+                heapq.heappop(self._queue)
+                continue
+            if not self.global_bucket.try_take():
+                self._schedule_wakeup(self.global_bucket.seconds_until_available())
+                break
+            heapq.heappop(self._queue)
+            self.running += 1
+            future.set_result(None)
+        metrics.set_gauge("llm_queue_depth", len(self._queue))
+
+    def _schedule_wakeup(self, delay):
+        if math.isinf(delay) or (self._wakeup is not None and not self._wakeup.cancelled()):
+            return
+        def wake():
+            self._wakeup = None
+            self._dispatch()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, wake)
+
+    async def acquire(self, user_id, priority=PRIORITY_CHAT):
+        """
+        Wait until the request may use the LLM.
+
+        Raises:
+            RateLimited: If the user is over their limit or the request was shed
+        """
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        bucket = self._user_bucket(user_id)
+        if not bucket.try_take():
+            metrics.inc("llm_requests_rejected_total", reason="user", priority=name)
+            raise RateLimited("user", math.ceil(bucket.seconds_until_available()))
+        if not self._queue and self.running < self.max_concurrent and self.global_bucket.try_take():
+            self.running += 1
+            metrics.observe("llm_queue_wait_seconds", 0, priority=name)
+            metrics.inc("llm_requests_admitted_total", priority=name)
+            return
+        if not self.queueing:
+            self._shed(bucket, "busy", name)
+        if len(self._queue) >= self.max_queue:
+            self._shed(bucket, "queue_full", name)
+
+        metrics.inc("llm_requests_queued_total", priority=name)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        start = time.monotonic()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            self._withdraw(future)
+            self._shed(bucket, "timeout", name)
+        except asyncio.CancelledError:
+            self._withdraw(future)
+            raise
+        finally:
+            metrics.observe("llm_queue_wait_seconds", time.monotonic() - start, priority=name)
+        metrics.inc("llm_requests_admitted_total", priority=name)
+
+    def _shed(self, bucket, reason, name):
+        """Reject a request the bot had no capacity for; it does not count against its user's limit."""
+        bucket.refund()
+        metrics.inc("llm_requests_rejected_total", reason=reason, priority=name)
+        raise RateLimited("overloaded")
+
+    def _withdraw(self, future):
+        """Remove a request that gave up waiting, or give its slot back if it was admitted just now."""
+        if not future.cancel():
+            self.release()
+            return
+        self._queue = [entry for entry in self._queue if entry[2] is not future]
+        heapq.heapify(self._queue)
+        metrics.set_gauge("llm_queue_depth", len(self._queue))
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, user_id, priority=PRIORITY_CHAT):
+        """async with admission.admit(user_id, PRIORITY_MENU): ... (raises RateLimited)"""
+        await self.acquire(user_id, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def create_llm_admission(workers=1, queueing=True):
+    """Admission control configured by the LLM_* variables; the global rate is split between worker processes."""
+    return LLMAdmission(
+        LLM_USER_RATE / 60, LLM_USER_BURST,
+        LLM_GLOBAL_RATE / 60 / workers, max(1, LLM_GLOBAL_BURST // workers),
+        queueing=queueing,
+    )
+
+
+metrics.describe("llm_queue_wait_seconds", "histogram", "Time requests waited for LLM admission per priority")
+metrics.describe("llm_queue_depth", "gauge", "Requests waiting for LLM admission")
+metrics.describe("llm_requests_admitted_total", "counter", "Requests admitted to the LLM per priority")
+metrics.describe("llm_requests_queued_total", "counter", "Requests that had to wait for LLM admission per priority")
+metrics.describe("llm_requests_rejected_total", "counter",
+                 "Requests rejected per reason (user/busy/queue_full/timeout) and priority")
@@ -0,0 +1,182 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+# off (default), record (call the real services and store the responses) or replay (serve stored responses only)
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off")
+REPLAY_STORE_PATH = os.getenv("REPLAY_STORE_PATH", os.path.join("fixtures", "replay_store.json"))
+
+_DATE_PATTERN = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_OFFSET_PATTERN = re.compile(r"\{today([+-]\d+)\}")
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def to_offsets(text, today):
+    """Replace ISO dates by {today+N} so fixtures recorded on one day replay on any other."""
+    def replace(match):
+        try:
+            offset = (date(*map(int, match.groups())) - today).days
+        except ValueError:
+            return match.group(0)
+        return f"{{today{offset:+d}}}"
+    return _DATE_PATTERN.sub(replace, text)
+
+
+def from_offsets(text, today):
+    """Inverse of to_offsets."""
+    return _OFFSET_PATTERN.sub(lambda match: (today + timedelta(days=int(match.group(1)))).strftime("%Y-%m-%d"), text)
+
+
+class ReplayStore:
+    """
+    Recorded responses in one JSON file: {"openmensa": {key: response}, "llm": {key: response}}.
+
+    Dates in keys and responses are stored relative to the day of recording.
+    """
+
+    def __init__(self, path=REPLAY_STORE_PATH, today=None):
+        self.path = path
+        self.today = today or date.today()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.data = {"openmensa": {}, "llm": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data.update(json.load(f))
+
+    def get(self, section, key):
+        """Return the stored response with dates shifted to today, or raise ReplayMissError."""
+        stored = self.data[section].get(key)
+        if stored is None:
+            raise ReplayMissError(f"No recorded {section} response for {key}")
+        return json.loads(from_offsets(stored, self.today))
+
+    def put(self, section, key, response):
+        stored = to_offsets(json.dumps(response, ensure_ascii=False, separators=(",", ":")), self.today)
+        with self._lock:
+            if self.data[section].get(key) != stored:
+                self.data[section][key] = stored
+                self._dirty = True
+
+    def save(self):
+        """Write the store if anything was recorded (atomically replaced)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+class RecordReplayOpenMensa:
+    """Drop-in for the OpenMensa wrapper that records or replays its responses."""
+
+    METHODS = ("get_canteen", "get_canteen_days", "get_meals_by_day")
+
+    def __init__(self, client, store, mode):
+        self.client = client
+        self.store = store
+        self.mode = mode
+
+    def _call(self, method, *args):
+        key = to_offsets(" ".join([method] + [str(arg) for arg in args]), self.store.today)
+        if self.mode == "replay":
+            return self.store.get("openmensa", key)
+        response = getattr(self.client, method)(*args)
+        self.store.put("openmensa", key, response)
+        return response
+
+    def get_canteen(self, canteen_id):
+        return self._call("get_canteen", canteen_id)
+
+    def get_canteen_days(self, canteen_id):
+        return self._call("get_canteen_days", canteen_id)
+
+    def get_meals_by_day(self, canteen_id, date_str):
+        return self._call("get_meals_by_day", canteen_id, date_str)
+
+
+class ReplayedMessage:
+    """Stands in for a LangChain AIMessage in replay mode."""
+
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+
+def _message_parts(message):
+    if isinstance(message, tuple):
+        return list(message)
+    return [getattr(message, "type", type(message).__name__), message.content]
+
+
+class RecordReplayLLM:
+    """Wraps a chat model; invoke() is keyed by a hash of the messages."""
+
+    def __init__(self, llm, store, mode):
+        self.llm = llm
+        self.store = store
+        self.mode = mode
+
+    def key(self, messages):
+        serialized = json.dumps([_message_parts(message) for message in messages], ensure_ascii=False)
+        return hashlib.sha256(to_offsets(serialized, self.store.today).encode("utf-8")).hexdigest()[:20]
+
+    def invoke(self, messages, **kwargs):
+        key = self.key(messages)
+        if self.mode == "replay":
+            stored = self.store.get("llm", key)
+            return ReplayedMessage(stored["content"], stored.get("usage"))
+        response = self.llm.invoke(messages, **kwargs)
+        self.store.put("llm", key, {"content": response.content,
+                                    "usage": getattr(response, "usage_metadata", None)})
+        return response
+
+    def __getattr__(self, name):
+        # Everything except invoke goes to the wrapped model
+        if self.llm is None:
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+
+_store = None
+
+
+def get_replay_store():
+    """Shared store for REPLAY_STORE_PATH, saved at exit."""
+    global _store
+    if _store is None:
+        _store = ReplayStore()
+        atexit.register(_store.save)
+    return _store
+
+
+def wrap_openmensa(client, mode=REPLAY_MODE):
+    """Return the OpenMensa client, wrapped for recording or replaying when REPLAY_MODE is set."""
+    if mode not in ("record", "replay"):
+        return client
+    return RecordReplayOpenMensa(client, get_replay_store(), mode)
+
+
+def wrap_llm(factory, mode=REPLAY_MODE):
+    """
+    Create the LLM via factory, wrapped for recording or replaying when REPLAY_MODE is set.
+    In replay mode the factory is not called, so no API key or server is needed.
+    """
+    if mode == "replay":
+        return RecordReplayLLM(None, get_replay_store(), mode)
+    if mode == "record":
+        return RecordReplayLLM(factory(), get_replay_store(), mode)
+    return factory()
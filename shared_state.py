@@ -0,0 +1,314 @@
+import json
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping, MutableSet
+
+# More than one worker process switches preferences, caches and the update queue to SQLite
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+SHARED_STATE_ENABLED = BOT_WORKERS > 1
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "shared_state.sqlite3")
+
+# A claimed update that is not completed within this time is handed to another worker
+UPDATE_LEASE_SECONDS = 120
+MAX_UPDATE_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS updates (
+    update_id INTEGER PRIMARY KEY,
+    chat_id INTEGER,
+    payload TEXT NOT NULL,
+    claimed_by TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS updates_chat ON updates (chat_id, update_id);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_runs (
+    run_key TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+"""
+
+_connection = None
+_lock = threading.Lock()
+
+
+def get_connection(path=None):
+    """Return the connection to the shared state database, creating it on first use."""
+    global _connection
+    if _connection is None:
+        # Other processes hold short write locks, wait for them instead of failing
+        connection = sqlite3.connect(path or SHARED_STATE_PATH, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        _connection = connection
+    return _connection
+
+
+def close_shared_state():
+    """Close the connection (a later call reopens it, e.g. in a forked worker)."""
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+
+def worker_name():
+    """Identifies this process in leases and claimed updates."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _encode_key(key):
+    return json.dumps(key, ensure_ascii=False)
+
+
+def _decode_key(text):
+    # JSON turns tuple keys into lists, turn them back so they stay hashable
+    def restore(value):
+        return tuple(restore(item) for item in value) if isinstance(value, list) else value
+    return restore(json.loads(text))
+
+
+class SharedDict(MutableMapping):
+    """
+    Dict stored in the shared SQLite database, visible to all worker processes.
+
+    Keys must be JSON serializable (tuples are restored); values are pickled.
+    Mutating a stored value in place does not write it back, assign it again.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def __getitem__(self, key):
+        with _lock:
+            row = get_connection().execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?", (self.namespace, _encode_key(key))
+            ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def __setitem__(self, key, value):
+        with _lock:
+            get_connection().execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)",
+                (self.namespace, _encode_key(key), pickle.dumps(value)),
+            )
+
+    def __delitem__(self, key):
+        with _lock:
+            deleted = get_connection().execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ?", (self.namespace, _encode_key(key))
+            ).rowcount
+        if not deleted:
+            raise KeyError(key)
+
+    def __iter__(self):
+        with _lock:
+            rows = get_connection().execute("SELECT key FROM kv WHERE namespace = ?", (self.namespace,)).fetchall()
+        return iter([_decode_key(key) for key, in rows])
+
+    def __len__(self):
+        with _lock:
+            return get_connection().execute(
+                "SELECT count(*) FROM kv WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def items(self):
+        # One query instead of one per key
+        with _lock:
+            rows = get_connection().execute(
+                "SELECT key, value FROM kv WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return [(_decode_key(key), pickle.loads(value)) for key, value in rows]
+
+    def clear(self):
+        with _lock:
+            get_connection().execute("DELETE FROM kv WHERE namespace = ?", (self.namespace,))
+
+
+class SharedSet(MutableSet):
+    """Set stored in the shared SQLite database (elements must be JSON serializable)."""
+
+    def __init__(self, namespace):
+        self._items = SharedDict(namespace)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        self._items[item] = True
+
+    def discard(self, item):
+        self._items.pop(item, None)
+
+
+def shared_dict(namespace):
+    """A SharedDict in multi-worker mode, a plain dict otherwise."""
+    return SharedDict(namespace) if SHARED_STATE_ENABLED else {}
+
+
+def shared_set(namespace):
+    """A SharedSet in multi-worker mode, a plain set otherwise."""
+    return SharedSet(namespace) if SHARED_STATE_ENABLED else set()
+
+
+def _chat_id(data):
+    for key in ("message", "edited_message", "callback_query", "my_chat_member"):
+        item = data.get(key)
+        if item:
+            chat = item.get("chat") or item.get("message", {}).get("chat") or item.get("from") or {}
+            return chat.get("id")
+    return None
+
+
+class SharedUpdateQueue:
+    """
+    Durable queue of Telegram updates (raw JSON dicts) consumed by all workers.
+
+    An update is claimed with a lease and deleted when it was handled. If the
+    worker dies, the lease runs out and another worker takes the update, so
+    updates are delivered at least once. Updates of the same chat are never
+    handed out while an older one is still pending, which keeps per-chat order.
+    """
+
+    def put(self, data, max_pending=None):
+        """
+        Add an update; redelivered updates (same update_id) are ignored.
+
+        Returns:
+            bool: False if max_pending updates are already waiting (backpressure)
+        """
+        with _lock:
+            connection = get_connection()
+            if max_pending is not None and self._pending(connection) >= max_pending:
+                return False
+            connection.execute(
+                "INSERT OR IGNORE INTO updates (update_id, chat_id, payload) VALUES (?, ?, ?)",
+                (data["update_id"], _chat_id(data), json.dumps(data, ensure_ascii=False)),
+            )
+        return True
+
+    def _pending(self, connection):
+        return connection.execute("SELECT count(*) FROM updates").fetchone()[0]
+
+    def pending(self):
+        with _lock:
+            return self._pending(get_connection())
+
+    def claim(self, worker, lease_seconds=UPDATE_LEASE_SECONDS):
+        """
+        Take the oldest update whose chat has no earlier pending update.
+
+        Returns:
+            tuple: (update_id, data) or None if nothing is available
+        """
+        now = time.time()
+        with _lock:
+            connection = get_connection()
+            # BEGIN IMMEDIATE takes the write lock first, so two workers never claim the same update
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    """
+                    SELECT update_id, payload, attempts FROM updates AS u
+                    WHERE (claimed_by IS NULL OR lease_until < ?)
+                      AND NOT EXISTS (
+                        SELECT 1 FROM updates AS earlier
+                        WHERE earlier.chat_id = u.chat_id AND earlier.update_id < u.update_id
+                      )
+                    ORDER BY update_id LIMIT 1
+                    """,
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+
+                update_id, payload, attempts = row
+                if attempts >= MAX_UPDATE_ATTEMPTS:
+                    # Crashed the workers too often, drop it so the chat is not blocked forever
+                    print(f"Update {update_id} nach {attempts} Versuchen verworfen")
+                    connection.execute("DELETE FROM updates WHERE update_id = ?", (update_id,))
+                    connection.execute("COMMIT")
+                    return None
+                connection.execute(
+                    "UPDATE updates SET claimed_by = ?, lease_until = ?, attempts = attempts + 1 WHERE update_id = ?",
+                    (worker, now + lease_seconds, update_id),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return update_id, json.loads(payload)
+
+    def complete(self, update_id):
+        """Remove a handled update."""
+        with _lock:
+            get_connection().execute("DELETE FROM updates WHERE update_id = ?", (update_id,))
+
+
+class LeaderLease:
+    """
+    Leader election through a lease row: the holder renews it before it expires,
+    otherwise any other worker can take it over.
+    """
+
+    def __init__(self, name, holder=None, ttl=60):
+        self.name = name
+        self.holder = holder or worker_name()
+        self.ttl = ttl
+
+    def acquire(self):
+        """Take or renew the lease. Returns True if this worker is the leader."""
+        now = time.time()
+        with _lock:
+            connection = get_connection()
+            connection.execute(
+                """
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+                """,
+                (self.name, self.holder, now + self.ttl, now),
+            )
+            holder = connection.execute("SELECT holder FROM leases WHERE name = ?", (self.name,)).fetchone()[0]
+        return holder == self.holder
+
+    def release(self):
+        with _lock:
+            get_connection().execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+
+
+def claim_job_run(run_key, holder=None):
+    """Record that a job run (e.g. daily_mensa_report:2024-05-13) started. Returns False if it already did."""
+    with _lock:
+        inserted = get_connection().execute(
+            "INSERT OR IGNORE INTO job_runs (run_key, holder, started_at) VALUES (?, ?, ?)",
+            (run_key, holder or worker_name(), time.time()),
+        ).rowcount
+    return inserted == 1
@@ -0,0 +1,52 @@
+import json
+import metrics
+
+
+def parse_json_object(text):
+    """
+    Decode the JSON object at the start of a model answer.
+
+    Code fences or words before and after the object are skipped; nested objects
+    and braces inside strings are handled by the JSON decoder.
+
+    Raises:
+        ValueError: If the text contains no JSON object
+    """
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("no JSON object in answer")
+    data, _ = json.JSONDecoder().raw_decode(text, start)
+    if not isinstance(data, dict):
+        raise ValueError("answer is not a JSON object")
+    return data
+
+
+def parse_structured(text, call_site, validate):
+    """
+    Parse a structured LLM answer into a typed result and count the outcome per call site.
+
+    Args:
+        text (str): Content of the LLM answer
+        call_site (str): Metrics label, e.g. classify_meal
+        validate: Callable(dict) returning the typed result; raises ValueError, TypeError
+            or KeyError if the object does not match the schema
+
+    Raises:
+        ValueError: If the answer is no JSON object or does not match the schema
+    """
+    try:
+        data = parse_json_object(text)
+    except ValueError:
+        metrics.inc("llm_structured_output_total", call_site=call_site, result="invalid_json")
+        raise
+    try:
+        result = validate(data)
+    except (ValueError, TypeError, KeyError) as e:
+        metrics.inc("llm_structured_output_total", call_site=call_site, result="invalid_schema")
+        raise ValueError(f"answer does not match the schema: {e}")
+    metrics.inc("llm_structured_output_total", call_site=call_site, result="ok")
+    return result
+
+
+metrics.describe("llm_structured_output_total", "counter",
+                 "Structured LLM answers per call site and result (ok/invalid_json/invalid_schema)")
@@ -1,19 +1,38 @@
 import re
 import asyncio
-from telegram import Bot, Update
+from telegram import Bot, Update, InputMediaPhoto
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler, 
     CallbackContext, ContextTypes, filters,
     JobQueue
 )
-from mensa_utils import get_mensa_id, get_canteen_name, is_canteen_closed, get_meals
+from mensa_utils import get_mensa_id, get_canteen_name, is_canteen_closed, get_meals, MENSA_IDS
 from ollama_mensa_bot_utils import get_formatted_mensa_meals, classify_meal, setup_llm
-from message_classifier import process_user_message, COMMAND_HELP, COMMAND_MENU, COMMAND_MENSA, COMMAND_CHAT, COMMAND_SETTINGS, COMMAND_RESTART
-from time_utils import parse_date_query, format_date_for_display
-from langchain_ollama import ChatOllama
+from menu_cache import get_rendered_menu, FORMAT_MENU, FORMAT_DAILY_REPORT
+from day_menu import DEFAULT_MEAL_FILTER, group_raw_meals, get_day_menu, filter_day_menu
+from menu_watcher import check_menu_for_changes, prune_menu_snapshots, filter_menu_delta, format_menu_delta, MENU_WATCH_INTERVAL
+from dish_alerts import DishAlertIndex, get_upcoming_meals, find_dish_alerts, prune_sent_alerts
+from dish_index import get_dish_history_index, score_dish_names, OFFLOAD_MIN_CANDIDATES
+from menu_search import get_menu_search_index, parse_menu_question, answer_lookup, menu_context
+from menu_archive import archive_day_menu
+# Only the store (standard library); the scrapers with PIL, requests and bs4 are imported on first use
+from image_scraping.image_store import flush_image_store, INDEX_SAVE_INTERVAL
+from llm_calls import invoke_llm, LazyLLM, LLMUnavailable
+from webhook_server import run_webhook
+from worker_pool import get_worker_pools, run_cpu, run_io, shutdown_worker_pools
+from chat_memory import ChatMemory, CHAT_EVICT_INTERVAL
+from rate_limit import create_llm_admission, RateLimited, PRIORITY_MENU, PRIORITY_CHAT, PRIORITY_BACKGROUND
+from shared_state import SharedDict, shared_dict, shared_set, SHARED_STATE_ENABLED, BOT_WORKERS
+from multi_worker import run_multi_worker, leader_only, renew_leadership, LEADER_LEASE_SECONDS
+import metrics
+import tracing
+from message_classifier import process_user_message, classify_message_simple, COMMAND_HELP, COMMAND_MENU, COMMAND_MENSA, COMMAND_CHAT, COMMAND_SETTINGS, COMMAND_RESTART, COMMAND_UNKNOWN
+from time_utils import parse_date_rules, parse_date_with_llm, format_date_for_display
 import time
+from functools import partial
 from datetime import time as dt_time, datetime, date
 from telegram.error import TimedOut, NetworkError
+from telegram.request import HTTPXRequest
 from dotenv import load_dotenv
 import os
 
@@ -22,11 +41,42 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
 # Default configurations
 DEFAULT_MENSA = "Kiepenheuerallee"
-user_mensa_prefs = {}  # {user_id: mensa_name}
+# With BOT_WORKERS > 1 these live in the shared SQLite database (see shared_state.py)
+user_mensa_prefs = shared_dict("user_mensa_prefs")  # {user_id: mensa_name}
+user_meal_filters = shared_dict("user_meal_filters")  # {user_id: meal filter dict, see day_menu.DEFAULT_MEAL_FILTER}
+menu_update_subscribers = shared_set("menu_update_subscribers")  # {user_id} notified when today's menu changes
+# favourite dish keywords of all users
+dish_alert_index = DishAlertIndex(SharedDict("dish_alert_subscriptions") if SHARED_STATE_ENABLED else None)
+sent_dish_alerts = shared_set("sent_dish_alerts")  # {(user_id, keyword, mensa_name, date_str, meal_name)}
 DAILY_REPORT_TIME = dt_time(9, 0, 0, tzinfo=datetime.now().astimezone().tzinfo)
+MENU_WATCH_HOURS = (7, 14)  # Only poll for menu changes between these hours
+DISH_ALERT_TIME = dt_time(8, 0, 0, tzinfo=datetime.now().astimezone().tzinfo)
 
-# Replace LLM configuration with Ollama setup
-llm = setup_llm(model="phi3:3.8b", temperature=0.3)
+MENU_PHOTOS_ENABLED = os.getenv("MENU_PHOTOS_ENABLED", "1") == "1"
+# e.g. 9108, serves http://127.0.0.1:<port>/metrics; in multi-worker mode worker i uses <port> + 1 + i
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH")  # e.g. metrics.prom, rewritten every minute
+if METRICS_DUMP_PATH and os.getenv("BOT_WORKER_INDEX"):
+    # One file per worker process in multi-worker mode
+    METRICS_DUMP_PATH += "." + os.getenv("BOT_WORKER_INDEX")
+
+# polling (default) or webhook; the webhook server listens on WEBHOOK_LISTEN:WEBHOOK_PORT behind a reverse proxy
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public HTTPS URL, e.g. https://bot.example.org/telegram
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "100"))  # per worker, further updates get a 503
+_menu_image_fetcher = None
+
+# Created on the first LLM call, so startup does not import the LLM provider
+llm = LazyLLM(setup_llm, model="phi3:3.8b", temperature=0.3)
+# Recent chat turns and a summary of older ones per user, cleared by /neustart
+chat_memory = ChatMemory(shared_dict("chat_sessions"))
+_summary_tasks = set()  # keeps references to running background summaries
+# Per-user and global limits for messages that need the LLM (see rate_limit.py)
+llm_admission = create_llm_admission(BOT_WORKERS)
 system_prompt = "Du bist ein hilfsbereicher Assistent, der auch Informationen über die Uni-Mensa geben kann. Antworte bitte auf Deutsch."
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -54,6 +104,11 @@ async def hilfe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/hilfe - Zeigt diese Hilfe an\n"
         "/menu [datum] - Zeigt das heutige Menü (oder für ein bestimmtes Datum)\n"
         "/mensa <standort> - Setzt deine bevorzugte Mensa\n"
+        "/filter - Filtert dein Menü (vegetarisch, preis <betrag>, ohne <kategorie>, reset)\n"
+        "/updates - Benachrichtigt dich, wenn sich das heutige Menü ändert\n"
+        "/abo <gericht> - Benachrichtigt dich, wenn dein Lieblingsgericht auf dem Plan steht\n"
+        "/wann <gericht> - Zeigt, wann es ein Gericht das nächste Mal gibt\n"
+        "/bild <gericht> - Zeigt ein Bild eines Gerichts\n"
         "/chat - Wechselt in den Chat-Modus\n"
         "/einstellungen - Konfiguriert Menü-Einstellungen\n"
         "/neustart - Setzt Konversation und Einstellungen zurück\n\n"
@@ -106,19 +161,32 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         target_date = date.today().strftime("%Y-%m-%d")
     
+    # Try to parse the date if it's not in YYYY-MM-DD format
+    if not re.match(r'\d{4}-\d{2}-\d{2}', target_date):
+        with tracing.span("parse_date_query"):
+            parsed_date = parse_date_rules(target_date)
+            if parsed_date is None:
+                # Only free text the rules do not understand costs an LLM call, and it counts against the limits
+                try:
+                    async with llm_admission.admit(user_id, PRIORITY_MENU):
+                        parsed_date = await run_io(parse_date_with_llm, target_date, llm)
+                except RateLimited as e:
+                    await update.message.reply_text(rate_limited_text(e))
+                    return
+        target_date = parsed_date
+    
     try:
-        # Try to parse the date if it's not in YYYY-MM-DD format
-        if not re.match(r'\d{4}-\d{2}-\d{2}', target_date):
-            target_date = parse_date_query(target_date, llm)
-        
         mensa_name = user_mensa_prefs.get(user_id, DEFAULT_MENSA)
-        response = get_formatted_mensa_meals(mensa_name, target_date, llm)
-        
-        # Add a friendly date display
-        friendly_date = format_date_for_display(target_date)
-        response = response.replace(f"am {target_date}", f"am {friendly_date}")
+        meal_filter = user_meal_filters.get(user_id, DEFAULT_MEAL_FILTER)
+        with tracing.span("render_menu", mensa=mensa_name, date=target_date):
+            response = await run_io(get_rendered_menu, mensa_name, target_date, llm, fmt=FORMAT_MENU, meal_filter=meal_filter)
         
         await update.message.reply_text(response)
+        if MENU_PHOTOS_ENABLED:
+            # Fetching uncached photos takes up to 15 s (MENU_IMAGES_TIMEOUT), so it must not hold up other updates
+            context.application.create_task(
+                send_day_menu_photos(update.message, mensa_name, target_date, meal_filter)
+            )
     except Exception as e:
         await update.message.reply_text(
             f"❌ Fehler beim Abrufen der Mensa-Daten: {str(e)}\n"
@@ -129,31 +197,289 @@ async def daily_mensa_report(context: CallbackContext):
     job = context.job
     today = date.today()
     today_str = today.strftime("%Y-%m-%d")
-    friendly_date = format_date_for_display(today_str)
     
-    for user_id, mensa_name in user_mensa_prefs.items():
+    for user_id, mensa_name in list(user_mensa_prefs.items()):
         try:
-            report = get_formatted_mensa_meals(mensa_name, today_str)
-            # Replace the date format with a more friendly one
-            report = report.replace(f"am {today_str}", f"am {friendly_date}")
-            
-            await context.bot.send_message(
-                user_id,
-                f"☀️ Mensa-Bericht für {friendly_date}\n"
-                f"📍 Standort: {mensa_name}\n\n"
-                f"{report}"
-            )
+            # Fetched and classified once per mensa, rendered once per distinct filter
+            meal_filter = user_meal_filters.get(user_id, DEFAULT_MEAL_FILTER)
+            report = await run_io(get_rendered_menu, mensa_name, today_str, llm, fmt=FORMAT_DAILY_REPORT, meal_filter=meal_filter)
+            await context.bot.send_message(user_id, report)
         except Exception as e:
             print(f"Fehler beim Senden des Tagesberichts an {user_id}: {str(e)}")
 
+async def watch_menu_changes(context: CallbackContext):
+    now = datetime.now()
+    if not MENU_WATCH_HOURS[0] <= now.hour < MENU_WATCH_HOURS[1]:
+        return
+    
+    today_str = date.today().strftime("%Y-%m-%d")
+    await run_io(prune_menu_snapshots, today_str)
+    # Only poll mensas that somebody is subscribed to
+    watched_mensas = {user_mensa_prefs.get(user_id, DEFAULT_MENSA) for user_id in menu_update_subscribers}
+    
+    for mensa_name in watched_mensas:
+        # OpenMensa requests and the classification of new dishes block, so they run in the I/O pool
+        delta = await run_io(check_menu_for_changes, mensa_name, today_str, llm)
+        if delta is None:
+            continue
+        
+        for user_id in list(menu_update_subscribers):
+            if user_mensa_prefs.get(user_id, DEFAULT_MENSA) != mensa_name:
+                continue
+            user_delta = filter_menu_delta(delta, user_meal_filters.get(user_id, DEFAULT_MEAL_FILTER))
+            if not user_delta:
+                continue
+            try:
+                await context.bot.send_message(user_id, format_menu_delta(user_delta))
+            except Exception as e:
+                print(f"Fehler beim Senden des Menü-Updates an {user_id}: {str(e)}")
+
+def archive_upcoming_meals(mensa_name):
+    """Fetch the upcoming week of a mensa and archive it, so /wann knows about future dates."""
+    upcoming_meals = get_upcoming_meals(mensa_name)
+    for day_menu in group_raw_meals(mensa_name, upcoming_meals):
+        archive_day_menu(day_menu)
+    return upcoming_meals
+
+async def check_dish_alerts(context: CallbackContext):
+    dish_alert_index.reload()
+    await run_io(prune_sent_alerts, sent_dish_alerts, date.today().strftime("%Y-%m-%d"))
+    watched_users = {
+        user_id for user_id in user_mensa_prefs if dish_alert_index.keywords_for(user_id)
+    }
+    watched_mensas = {user_mensa_prefs.get(user_id, DEFAULT_MENSA) for user_id in watched_users}
+    
+    for mensa_name in MENSA_IDS:
+        try:
+            upcoming_meals = await run_io(archive_upcoming_meals, mensa_name)
+        except Exception as e:
+            print(f"Fehler beim Abrufen der kommenden Gerichte von {mensa_name}: {e}")
+            continue
+        
+        if mensa_name not in watched_mensas:
+            continue
+        alerts = find_dish_alerts(
+            dish_alert_index, mensa_name, upcoming_meals,
+            lambda user_id: user_mensa_prefs.get(user_id, DEFAULT_MENSA),
+            sent_dish_alerts
+        )
+        for user_id, user_alerts in alerts.items():
+            context.job_queue.run_once(
+                send_dish_alert, 0, data=(mensa_name, user_alerts), chat_id=user_id
+            )
+
+async def send_dish_alert(context: CallbackContext):
+    job = context.job
+    mensa_name, user_alerts = job.data
+    lines = [f"⭐ Deine Lieblingsgerichte in der Mensa {mensa_name}:"]
+    for keyword, date_str, meal_name in user_alerts:
+        lines.append(f"  • {format_date_for_display(date_str)}: {meal_name}")
+    try:
+        await context.bot.send_message(job.chat_id, "\n".join(lines))
+    except Exception as e:
+        print(f"Fehler beim Senden des Gericht-Alarms an {job.chat_id}: {str(e)}")
+
+async def abo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not update.effective_user or not update.message:
+        return
+        
+    user_id = update.effective_user.id
+    args = context.args or []
+    user_mensa_prefs.setdefault(user_id, DEFAULT_MENSA)
+    
+    if not args:
+        keywords = dish_alert_index.keywords_for(user_id)
+        if keywords:
+            await update.message.reply_text(
+                "⭐ Deine Lieblingsgerichte:\n" + "\n".join(f"  • {keyword}" for keyword in keywords) +
+                "\n\nEntfernen mit /abo weg <gericht>"
+            )
+        else:
+            await update.message.reply_text(
+                "Du hast noch keine Lieblingsgerichte.\n"
+                "Füge eins hinzu mit: /abo <gericht>, z.B. /abo Käsespätzle"
+            )
+        return
+    
+    if args[0].lower() in ["weg", "remove"]:
+        keyword = " ".join(args[1:])
+        if dish_alert_index.unsubscribe(user_id, keyword or None):
+            await update.message.reply_text(f"🗑️ Abo entfernt: {keyword or 'alle'}")
+        else:
+            await update.message.reply_text(f"❌ Kein Abo gefunden für: {keyword}")
+        return
+    
+    keyword = " ".join(args)
+    if dish_alert_index.subscribe(user_id, keyword):
+        await update.message.reply_text(
+            f"✅ Ich sage dir Bescheid, wenn \"{keyword}\" in deiner Mensa angeboten wird."
+        )
+    else:
+        await update.message.reply_text(f"❌ Ungültiges Gericht: {keyword}")
+
+async def wann_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not update.effective_user or not update.message:
+        return
+        
+    query = " ".join(context.args or [])
+    if not query:
+        await update.message.reply_text("Nutze den Befehl so: /wann <gericht>, z.B. /wann Käsespätzle")
+        return
+    
+    mensa_name = user_mensa_prefs.get(update.effective_user.id, DEFAULT_MENSA)
+    # Rebuilds from the archive every DISH_INDEX_REFRESH_SECONDS, so it runs in the I/O pool
+    index = await run_io(get_dish_history_index)
+    query_norm, candidates = index.candidate_names(query)
+    if len(candidates) >= OFFLOAD_MIN_CANDIDATES:
+        matches = await run_cpu(score_dish_names, query_norm, candidates)
+    else:
+        matches = score_dish_names(query_norm, candidates)
+    if not matches:
+        await update.message.reply_text(f"🤷 Ich kenne kein Gericht wie \"{query}\".")
+        return
+    
+    lines = []
+    for _, name_norm in matches:
+        forecast = index.forecast(name_norm, mensa_name)
+        name = index.display_name(name_norm)
+        if forecast["next_date"]:
+            lines.append(f"🔮 {name}: am {format_date_for_display(forecast['next_date'])}")
+        elif forecast["last_date"]:
+            line = f"🕰️ {name}: zuletzt am {format_date_for_display(forecast['last_date'])}"
+            if forecast["expected_date"]:
+                line += f", erwartet etwa am {format_date_for_display(forecast['expected_date'])}"
+            lines.append(line)
+        else:
+            lines.append(f"❔ {name}: bisher nicht in der Mensa {mensa_name}")
+    
+    await update.message.reply_text(f"📅 Mensa {mensa_name}:\n" + "\n".join(lines))
+
+async def send_meal_photo(message, meal_name):
+    """Reply with a dish picture, reusing the Telegram file_id or the stored thumbnail if possible."""
+    # Image modules pull in PIL, requests and bs4, only load them when pictures are needed
+    from image_scraping.image_store import get_image_store
+    from image_scraping.scrape_img_bs4 import fetch_meal_photo
+    store = get_image_store()
+    file_id = store.get_file_id(meal_name)
+    if file_id:
+        await message.reply_photo(file_id, caption=meal_name)
+        return True
+    
+    fetch = partial(fetch_meal_photo, run_cpu=get_worker_pools().call_cpu)
+    path = await run_io(store.get_or_fetch, meal_name, fetch)
+    if path is None:
+        return False
+    
+    with open(path, "rb") as photo:
+        sent = await message.reply_photo(photo, caption=meal_name)
+    if sent.photo:
+        store.set_file_id(meal_name, sent.photo[-1].file_id)
+    return True
+
+def get_menu_image_fetcher():
+    global _menu_image_fetcher
+    if _menu_image_fetcher is None:
+        from image_scraping.image_store import get_image_store
+        from image_scraping.scrape_img_bs4 import fetch_meal_photo
+        from image_scraping.image_fetcher import MenuImageFetcher
+        _menu_image_fetcher = MenuImageFetcher(
+            # Resizing runs in the CPU worker processes, the fetcher threads only wait for it
+            get_image_store(), partial(fetch_meal_photo, run_cpu=get_worker_pools().call_cpu),
+            on_lookup=lambda hit: metrics.record_cache("meal_image", hit)
+        )
+    return _menu_image_fetcher
+
+async def send_day_menu_photos(message, mensa_name, target_date, meal_filter):
+    """Send the pictures of a day menu after the menu text (runs as a background task)."""
+    try:
+        # The day menu is cached by now, so this does not fetch again
+        day_menu = filter_day_menu(await run_io(get_day_menu, mensa_name, target_date, llm), meal_filter)
+        await send_menu_photos(message, [meal["name"] for meal in day_menu.meals])
+    except Exception as e:
+        print(f"Fehler beim Senden der Menü-Bilder: {str(e)}")
+
+async def send_menu_photos(message, meal_names):
+    """Reply with pictures of all dishes of a menu, fetched concurrently."""
+    if not meal_names:
+        return
+    from image_scraping.image_store import get_image_store
+    store = get_image_store()
+    
+    # Dishes uploaded before are sent by file_id, only the rest is looked up
+    file_ids = {name: store.get_file_id(name) for name in meal_names}
+    for name in meal_names:
+        metrics.record_cache("telegram_file_id", file_ids[name] is not None)
+    paths = await get_menu_image_fetcher().fetch_all(
+        [name for name in meal_names if not file_ids[name]]
+    )
+    
+    photos = [(name, file_ids[name] or paths.get(name)) for name in meal_names]
+    photos = [(name, photo) for name, photo in photos if photo]
+    # Telegram accepts 2 to 10 photos per media group, a single photo is sent on its own
+    for start in range(0, len(photos), 10):
+        chunk = photos[start:start + 10]
+        files = []
+        try:
+            media = []
+            for name, photo in chunk:
+                if photo == file_ids[name]:
+                    media.append(InputMediaPhoto(photo, caption=name))
+                else:
+                    files.append(open(photo, "rb"))
+                    media.append(InputMediaPhoto(files[-1], caption=name))
+            if len(media) == 1:
+                sent_messages = [await message.reply_photo(media[0].media, caption=media[0].caption)]
+            else:
+                sent_messages = await message.reply_media_group(media)
+        except Exception as e:
+            print(f"Fehler beim Senden der Menü-Bilder: {str(e)}")
+            return
+        finally:
+            for f in files:
+                f.close()
+        
+        for (name, photo), sent in zip(chunk, sent_messages):
+            if photo != file_ids[name] and sent.photo:
+                store.set_file_id(name, sent.photo[-1].file_id)
+
+async def bild_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not update.effective_user or not update.message:
+        return
+        
+    meal_name = " ".join(context.args or [])
+    if not meal_name:
+        await update.message.reply_text("Nutze den Befehl so: /bild <gericht>, z.B. /bild Käsespätzle")
+        return
+    
+    if not await send_meal_photo(update.message, meal_name):
+        await update.message.reply_text(f"🖼️ Ich habe kein Bild für \"{meal_name}\" gefunden.")
+
+async def updates_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not update.effective_user or not update.message:
+        return
+        
+    user_id = update.effective_user.id
+    if user_id in menu_update_subscribers:
+        menu_update_subscribers.discard(user_id)
+        await update.message.reply_text("🔕 Du erhältst keine Menü-Updates mehr.")
+    else:
+        menu_update_subscribers.add(user_id)
+        await update.message.reply_text(
+            "🔔 Du wirst benachrichtigt, wenn sich das heutige Menü deiner Mensa ändert."
+        )
+
 async def neustart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.effective_user or not update.message:
         return
         
     user_id = update.effective_user.id
     user_mensa_prefs[user_id] = DEFAULT_MENSA
+    user_meal_filters.pop(user_id, None)
+    menu_update_subscribers.discard(user_id)
+    dish_alert_index.unsubscribe(user_id)
+    chat_memory.clear(user_id)
     await update.message.reply_text(
-        "🔄 Alle Einstellungen wurden zurückgesetzt.\n"
+        "🔄 Alle Einstellungen und der Chat-Verlauf wurden zurückgesetzt.\n"
         f"Standard-Mensa ist jetzt: {DEFAULT_MENSA}"
     )
 
@@ -166,13 +492,129 @@ async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     settings_text = (
         "⚙️ Deine aktuellen Einstellungen:\n\n"
-        f"📍 Mensa: {mensa_name}\n\n"
+        f"📍 Mensa: {mensa_name}\n"
+        f"{describe_meal_filter(user_meal_filters.get(user_id, DEFAULT_MEAL_FILTER))}\n\n"
         "Um deine Mensa zu ändern, nutze den Befehl:\n"
-        "/mensa <standort>"
+        "/mensa <standort>\n"
+        "Um dein Menü zu filtern, nutze den Befehl:\n"
+        "/filter"
     )
     
     await update.message.reply_text(settings_text)
 
+def describe_meal_filter(meal_filter):
+    """Return a short German description of a meal filter."""
+    max_price = meal_filter.get("max_price")
+    excluded_categories = meal_filter.get("excluded_categories") or []
+    return (
+        f"🥦 Nur vegetarisch: {'ja' if meal_filter.get('vegetarian_only') else 'nein'}\n"
+        f"💶 Maximaler Preis: {f'{max_price:.2f}€' if max_price is not None else 'keiner'}\n"
+        f"🚫 Ausgeblendet: {', '.join(excluded_categories) if excluded_categories else 'nichts'}"
+    )
+
+async def filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not update.effective_user or not update.message:
+        return
+        
+    user_id = update.effective_user.id
+    args = context.args or []
+    # Copy so that the shared default filter is never modified
+    meal_filter = dict(user_meal_filters.get(user_id, DEFAULT_MEAL_FILTER))
+    meal_filter["excluded_categories"] = list(meal_filter["excluded_categories"])
+    
+    option = args[0].lower() if args else ""
+    value = " ".join(args[1:])
+    
+    if option in ["vegetarisch", "vegetarian"]:
+        meal_filter["vegetarian_only"] = not meal_filter["vegetarian_only"]
+    elif option in ["preis", "price"]:
+        if not value:
+            meal_filter["max_price"] = None
+        else:
+            try:
+                meal_filter["max_price"] = float(value.replace(",", ".").rstrip("€"))
+            except ValueError:
+                await update.message.reply_text(f"❌ Ungültiger Preis: {value}")
+                return
+    elif option in ["ohne", "without"] and value:
+        if value in meal_filter["excluded_categories"]:
+            meal_filter["excluded_categories"].remove(value)
+        else:
+            meal_filter["excluded_categories"].append(value)
+    elif option == "reset":
+        user_meal_filters.pop(user_id, None)
+        await update.message.reply_text(
+            "🔄 Filter zurückgesetzt.\n\n" + describe_meal_filter(DEFAULT_MEAL_FILTER)
+        )
+        return
+    else:
+        await update.message.reply_text(
+            "Nutze den Befehl so:\n"
+            "/filter vegetarisch - Nur vegetarische Gerichte an/aus\n"
+            "/filter preis 3,50 - Maximaler Preis (ohne Betrag: kein Limit)\n"
+            "/filter ohne <kategorie> - Kategorie aus-/einblenden\n"
+            "/filter reset - Filter zurücksetzen\n\n"
+            + describe_meal_filter(meal_filter)
+        )
+        return
+    
+    user_meal_filters[user_id] = meal_filter
+    await update.message.reply_text("✅ Filter aktualisiert.\n\n" + describe_meal_filter(meal_filter))
+
+def chat_response(user_id, message_text):
+    """
+    Answer a free chat message with the LLM, using the user's conversation memory.
+    
+    Returns:
+        tuple: (answer, whether older turns should be summarized now)
+    """
+    messages = chat_memory.build_messages(user_id, system_prompt, message_text)
+    # Meals matching the question, so answers about dishes are grounded in the menus
+    question = parse_menu_question(message_text, user_mensa_prefs.get(user_id, DEFAULT_MENSA))
+    context_text = menu_context(get_menu_search_index(), question)
+    if context_text:
+        messages.insert(-1, ("system", context_text))
+    try:
+        response = invoke_llm(llm, messages, "chat").content.strip()
+    except LLMUnavailable:
+        return "🤖 Ich kann gerade leider nicht chatten, das Sprachmodell antwortet nicht. Den Speiseplan bekommst du trotzdem mit /menu.", False
+    except Exception as e:
+        print(f"Fehler bei der Chat-Antwort: {e}")
+        return "🤖 Da ist etwas schiefgelaufen. Bitte versuche es später noch einmal oder nutze /menu.", False
+    return response, chat_memory.add_turn(user_id, message_text, response)
+
+def answer_menu_lookup(user_id, message_text):
+    """Answer lookups like "Gibt es diese Woche Fisch?" from the menu index, or return None."""
+    question = parse_menu_question(message_text, user_mensa_prefs.get(user_id, DEFAULT_MENSA))
+    return answer_lookup(get_menu_search_index(), question)
+
+async def summarize_chat(user_id):
+    try:
+        async with llm_admission.admit(user_id, PRIORITY_BACKGROUND):
+            await run_io(chat_memory.summarize, user_id, llm)
+    except RateLimited:
+        pass  # the pending turns are summarized after one of the next messages
+
+def summarize_chat_in_background(user_id):
+    """Summarize older chat turns after the reply was sent, so the user does not wait for it."""
+    task = asyncio.get_running_loop().create_task(summarize_chat(user_id))
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+
+async def flush_image_store_job(context: ContextTypes.DEFAULT_TYPE):
+    # Lookups on the event loop only mark the picture index dirty, it is written here
+    await run_io(flush_image_store)
+
+async def evict_chat_sessions(context: ContextTypes.DEFAULT_TYPE):
+    evicted = await run_io(chat_memory.evict_idle)
+    if evicted:
+        print(f"{evicted} inaktive Chat-Verläufe entfernt")
+
+def rate_limited_text(error):
+    if error.reason == "user":
+        return f"⏳ Du sendest gerade sehr viele Nachrichten. Bitte warte {error.retry_after} Sekunden und versuche es dann noch einmal."
+    return "😵 Der Bot ist gerade stark ausgelastet. Bitte versuche es gleich noch einmal – den Speiseplan bekommst du jederzeit mit /menu."
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.text:
         return
@@ -188,10 +630,29 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if message_text.startswith('/'):
         return
     
-    print(f"Chat-Nachricht von {user_id}: {message_text}")
-    
-    # Process the message to determine intent
-    command, args = process_user_message(message_text, llm)
+    # Only free chat and menu questions may need the LLM, everything else is matched by keywords
+    intent = classify_message_simple(message_text).command_type
+    # Counted per intent; user ids and message texts are not logged
+    metrics.inc("chat_messages_total", intent=intent)
+    if intent in (COMMAND_CHAT, COMMAND_MENU):
+        lookup_answer = await run_io(answer_menu_lookup, user_id, message_text)
+        if lookup_answer:
+            await update.message.reply_text(lookup_answer)
+            return
+        
+        priority = PRIORITY_MENU if intent == COMMAND_MENU else PRIORITY_CHAT
+        try:
+            async with llm_admission.admit(user_id, priority):
+                with tracing.span("process_user_message"):
+                    command, args = await run_io(process_user_message, message_text, llm)
+                if command in (COMMAND_CHAT, COMMAND_UNKNOWN):
+                    response, summary_due = await run_io(chat_response, user_id, message_text)
+        except RateLimited as e:
+            await update.message.reply_text(rate_limited_text(e))
+            return
+    else:
+        with tracing.span("process_user_message"):
+            command, args = process_user_message(message_text, llm)
     
     # Handle the command based on the intent
     if command == COMMAND_HELP:
@@ -216,30 +677,49 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await neustart_command(update, context)
     
     else:  # Default to chat for anything else
-        # Use Ollama for general chat
-        messages = [
-            ("system", system_prompt),
-            ("human", message_text)
-        ]
-        response = llm.invoke(messages).content.strip()
         await update.message.reply_text(response)
+        if summary_due:
+            summarize_chat_in_background(user_id)
 
-def main():
-    print("Starte Mensa-Bot...")
+class TracedRequest(HTTPXRequest):
+    """Opens a span for every Telegram Bot API call (sendMessage, sendMediaGroup, ...)."""
     
+    async def do_request(self, url, method, *args, **kwargs):
+        # The URL ends with the API method; the part before contains the token and is not recorded
+        with tracing.span(f"telegram.{url.rsplit('/', 1)[-1]}"):
+            return await super().do_request(url, method, *args, **kwargs)
+
+def instrument_handler(command, handler):
+    """Time the handler per command and open a root span for every update."""
+    return metrics.timed_handler(command, tracing.traced_handler(command, handler))
+
+def serve_metrics(worker_index=None):
+    """Start the /metrics server of this process if METRICS_PORT is set."""
+    if not METRICS_PORT:
+        return
+    port = int(METRICS_PORT) + (0 if worker_index is None else 1 + worker_index)
+    metrics.start_metrics_server(port)
+    print(f"Metrics: http://127.0.0.1:{port}/metrics")
+
+async def dump_metrics_job(context: CallbackContext):
+    metrics.dump_metrics(METRICS_DUMP_PATH)
+
+def build_application(concurrent_updates=False):
+    """Create the bot application with all handlers and scheduled jobs."""
+    # Updates handled one after another must not wait for LLM admission, that would stall all chats
+    llm_admission.queueing = bool(concurrent_updates)
     # Add retry settings to the application builder
     app = (ApplicationBuilder()
            .token(TELEGRAM_TOKEN)
-           .read_timeout(30)
-           .write_timeout(30)
-           .connect_timeout(30)
+           .request(TracedRequest(read_timeout=30, write_timeout=30, connect_timeout=30))
            .get_updates_read_timeout(42)
-           .concurrent_updates(False)  # Process updates sequentially
+           .concurrent_updates(concurrent_updates)
            .build())
     
     # Add error handlers
     async def error_handler(update, context):
         print(f"Exception while handling an update: {context.error}")
+        metrics.inc("bot_errors_total", type=type(context.error).__name__)
         
         if isinstance(context.error, TimedOut):
             print("Connection timed out. Will retry automatically.")
@@ -251,26 +731,84 @@ def main():
     
     app.add_error_handler(error_handler)
     
-    # Command handlers
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("hilfe", hilfe_command))
-    app.add_handler(CommandHandler("help", hilfe_command))
-    app.add_handler(CommandHandler("menu", menu_command))
-    app.add_handler(CommandHandler("mensa", set_mensa_command))
-    app.add_handler(CommandHandler("einstellungen", settings_command))
-    app.add_handler(CommandHandler("settings", settings_command))
-    app.add_handler(CommandHandler("neustart", neustart_command))
-    app.add_handler(CommandHandler("restart", neustart_command))
+    # Command handlers (each one timed and traced per command)
+    commands = {
+        "start": start,
+        "hilfe": hilfe_command,
+        "help": hilfe_command,
+        "menu": menu_command,
+        "mensa": set_mensa_command,
+        "filter": filter_command,
+        "updates": updates_command,
+        "abo": abo_command,
+        "wann": wann_command,
+        "bild": bild_command,
+        "einstellungen": settings_command,
+        "settings": settings_command,
+        "neustart": neustart_command,
+        "restart": neustart_command,
+    }
+    for command, handler in commands.items():
+        app.add_handler(CommandHandler(command, instrument_handler(command, handler)))
     
     # Message handler for all text messages that are not commands
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrument_handler("message", handle_message)))
     
-    # Job queue setup
+    # Build the dish history and menu search indexes once so /wann and chat never scan the archive
+    get_dish_history_index()
+    get_menu_search_index()
+    
+    # Job queue setup; with several workers only the leader runs the jobs
     job_queue = app.job_queue
     if job_queue:
-        job_queue.run_daily(daily_mensa_report, time=DAILY_REPORT_TIME)
+        if SHARED_STATE_ENABLED:
+            job_queue.run_repeating(renew_leadership, interval=LEADER_LEASE_SECONDS / 3, first=0)
+            job_queue.run_daily(leader_only(daily_mensa_report, once_per_day=True), time=DAILY_REPORT_TIME)
+            job_queue.run_repeating(leader_only(watch_menu_changes), interval=MENU_WATCH_INTERVAL, first=MENU_WATCH_INTERVAL)
+            job_queue.run_daily(leader_only(check_dish_alerts, once_per_day=True), time=DISH_ALERT_TIME)
+            job_queue.run_repeating(leader_only(evict_chat_sessions), interval=CHAT_EVICT_INTERVAL, first=CHAT_EVICT_INTERVAL)
+        else:
+            job_queue.run_daily(daily_mensa_report, time=DAILY_REPORT_TIME)
+            job_queue.run_repeating(watch_menu_changes, interval=MENU_WATCH_INTERVAL, first=MENU_WATCH_INTERVAL)
+            job_queue.run_daily(check_dish_alerts, time=DISH_ALERT_TIME)
+            job_queue.run_repeating(evict_chat_sessions, interval=CHAT_EVICT_INTERVAL, first=CHAT_EVICT_INTERVAL)
+        # Every worker has its own picture index in memory
+        job_queue.run_repeating(flush_image_store_job, interval=INDEX_SAVE_INTERVAL, first=INDEX_SAVE_INTERVAL)
+        if METRICS_DUMP_PATH:
+            job_queue.run_repeating(dump_metrics_job, interval=60, first=60)
     else:
         print("Warning: Job queue is not available")
+    return app
+
+def main():
+    print("Starte Mensa-Bot...")
+    webhook = BOT_MODE == "webhook"
+    if webhook and not (WEBHOOK_URL and WEBHOOK_SECRET):
+        raise ValueError("BOT_MODE=webhook braucht WEBHOOK_URL und WEBHOOK_SECRET")
+    webhook_settings = dict(
+        url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET,
+        workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE,
+        host=WEBHOOK_LISTEN, port=WEBHOOK_PORT,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    
+    serve_metrics()
+    
+    if BOT_WORKERS > 1:
+        # This process only receives updates, the worker processes build the full bot
+        receiver = (ApplicationBuilder()
+                    .token(TELEGRAM_TOKEN)
+                    .request(TracedRequest(read_timeout=30, write_timeout=30, connect_timeout=30))
+                    .get_updates_read_timeout(42)
+                    .build())
+        asyncio.run(run_multi_worker(receiver, BOT_WORKERS, webhook_settings if webhook else None))
+        return
+    
+    # Polling processes updates sequentially, the webhook workers keep the order per chat
+    app = build_application(WEBHOOK_WORKERS if webhook else False)
+    if webhook:
+        asyncio.run(run_webhook(app, **webhook_settings))
+        return
     
     # Start polling
     print("Polling...")
@@ -286,6 +824,10 @@ if __name__ == "__main__":
         import atexit
         def cleanup():
             print("Shutting down bot...")
+            if _menu_image_fetcher is not None:
+                _menu_image_fetcher.shutdown()
+            flush_image_store()
+            shutdown_worker_pools()
         atexit.register(cleanup)
         
         main()
@@ -0,0 +1,114 @@
+from chat_memory import ChatMemory, estimate_tokens
+
+class SummaryLLM:
+    """Returns a fixed summary and keeps the transcripts it was asked to summarize"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.transcripts = []
+
+    def invoke(self, messages, **kwargs):
+        self.transcripts.append(messages[-1][1])
+        if self.fail:
+            raise RuntimeError("down")
+        return type("Response", (), {"content": "Der Nutzer isst vegetarisch."})()
+
+def chat(memory, user_id, count):
+    due = False
+    for i in range(count):
+        due = memory.add_turn(user_id, f"Frage {i} " + "x" * 80, f"Antwort {i} " + "y" * 80)
+    return due
+
+def test_bounded_window():
+    """Test that the prompt stays within the token budget however long the chat gets"""
+    memory = ChatMemory(history_tokens=100)
+    sizes = []
+    for count in [1, 5, 20]:
+        memory.clear(1)
+        chat(memory, 1, count)
+        messages = memory.build_messages(1, "System", "Neue Frage")
+        sizes.append(sum(estimate_tokens(text) for _, text in messages))
+    print(f"Prompt tokens after 1/5/20 turns: {sizes}")
+    print(f"Correct: {sizes[1] == sizes[2] and max(sizes) < 150}")
+    assert sizes[1] == sizes[2] and max(sizes) < 150
+
+    messages = memory.build_messages(1, "System", "Neue Frage")
+    print(f"Correct order: {messages[0] == ('system', 'System') and messages[-1] == ('human', 'Neue Frage')}")
+    assert messages[0] == ('system', 'System') and messages[-1] == ('human', 'Neue Frage')
+    print(f"Correct latest turn kept: {messages[-2][1].startswith('Antwort 19')}")
+    assert messages[-2][1].startswith('Antwort 19')
+    print("---")
+
+def test_summary():
+    """Test that older turns are folded into the summary and kept when summarizing fails"""
+    memory = ChatMemory(history_tokens=100)
+    due = chat(memory, 1, 3)
+    print(f"Correct not due yet: {not due}")
+    assert not due
+    due = chat(memory, 1, 1)
+    print(f"Correct summary due: {due}")
+    assert due
+
+    failing = SummaryLLM(fail=True)
+    memory.summarize(1, failing)
+    pending = len(memory.sessions[1]["pending"])
+    print(f"Correct kept on failure: {pending == 4}")
+    assert pending == 4
+
+    llm = SummaryLLM()
+    memory.summarize(1, llm)
+    session = memory.sessions[1]
+    print(f"Correct summarized: {'Frage 0' in llm.transcripts[0] and not session['pending']}")
+    assert 'Frage 0' in llm.transcripts[0] and not session['pending']
+    messages = memory.build_messages(1, "System", "Und morgen?")
+    print(f"Correct summary sent: {messages[1] == ('system', 'Bisheriges Gespräch: Der Nutzer isst vegetarisch.')}")
+    assert messages[1] == ('system', 'Bisheriges Gespräch: Der Nutzer isst vegetarisch.')
+    print("---")
+
+class ChattingSummaryLLM(SummaryLLM):
+    """Adds a turn while the summary is written, like a user chatting on in the meantime"""
+
+    def __init__(self, memory):
+        super().__init__()
+        self.memory = memory
+
+    def invoke(self, messages, **kwargs):
+        chat(self.memory, 1, 1)
+        return super().invoke(messages, **kwargs)
+
+def test_summary_after_trimming():
+    """Test that summarized turns are removed even if the full pending list was trimmed meanwhile"""
+    memory = ChatMemory(history_tokens=60)
+    chat(memory, 1, 20)
+    print(f"Correct full: {len(memory.sessions[1]['pending']) == 20}")
+    assert len(memory.sessions[1]['pending']) == 20
+    memory.summarize(1, ChattingSummaryLLM(memory))
+    pending = memory.sessions[1]["pending"]
+    print(f"Pending after summary: {len(pending)}")
+    print(f"Correct: {len(pending) == 2 and pending[0][1].startswith('Frage 19')}")
+    assert len(pending) == 2 and pending[0][1].startswith('Frage 19')
+    print("---")
+
+def test_clear_and_evict():
+    """Test /neustart and removal of idle sessions"""
+    memory = ChatMemory(idle_seconds=60)
+    chat(memory, 1, 1)
+    chat(memory, 2, 1)
+    memory.sessions[2]["last_active"] = 0
+    evicted = memory.evict_idle()
+    print(f"Correct eviction: {evicted == 1 and list(memory.sessions) == [1]}")
+    assert evicted == 1 and list(memory.sessions) == [1]
+    memory.clear(1)
+    print(f"Correct clear: {not memory.sessions and len(memory.build_messages(1, 'System', 'Hallo')) == 2}")
+    assert not memory.sessions and len(memory.build_messages(1, 'System', 'Hallo')) == 2
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing bounded window...")
+    test_bounded_window()
+    print("Testing summaries...")
+    test_summary()
+    print("Testing summaries after trimming...")
+    test_summary_after_trimming()
+    print("Testing clear and eviction...")
+    test_clear_and_evict()
@@ -0,0 +1,88 @@
+import os
+
+os.environ.setdefault("MENU_ARCHIVE_PATH", ":memory:")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from bot_fakes import FakeLLM
+from day_menu import (
+    DayMenu, filter_day_menu, filter_key, DEFAULT_MEAL_FILTER, build_day_menu, shows_unclassified_meals,
+    classify_hidden_meals
+)
+
+def make_day_menu():
+    """Build a small classified day menu without calling OpenMensa or the LLM"""
+    meals = [
+        {"category": "Angebot 1", "name": "Käsespätzle", "price": 2.90, "prices": {"students": 2.90},
+         "notes": [], "classification": "vegetarian", "emojis": "🧀"},
+        {"category": "Angebot 2", "name": "Currywurst mit Pommes", "price": 3.40, "prices": {"students": 3.40},
+         "notes": [], "classification": "non-vegetarian", "emojis": "🌭🍟"},
+        {"category": "Dessert", "name": "Schokopudding", "price": 0.90, "prices": {"students": 0.90},
+         "notes": [], "classification": "vegetarian", "emojis": "🍮"},
+        {"category": "Salattheke", "name": "Salat", "price": None, "prices": {},
+         "notes": [], "classification": "vegetarian", "emojis": "🥗"},
+    ]
+    return DayMenu("Kiepenheuerallee", "2025-03-10", meals)
+
+def test_filters():
+    """Test that user filters are applied to the shared day menu"""
+    day_menu = make_day_menu()
+
+    test_cases = [
+        ("default", DEFAULT_MEAL_FILTER, ["Käsespätzle", "Currywurst mit Pommes"]),
+        ("vegetarian only", dict(DEFAULT_MEAL_FILTER, vegetarian_only=True), ["Käsespätzle"]),
+        ("price cap 3.00", dict(DEFAULT_MEAL_FILTER, max_price=3.0), ["Käsespätzle"]),
+        ("no exclusions", {"excluded_categories": []},
+         ["Käsespätzle", "Currywurst mit Pommes", "Schokopudding", "Salat"]),
+    ]
+
+    for description, meal_filter, expected in test_cases:
+        result = [meal["name"] for meal in filter_day_menu(day_menu, meal_filter).meals]
+        print(f"Filter: {description} {filter_key(meal_filter)}")
+        print(f"Expected: {expected}")
+        print(f"Got: {result}")
+        print(f"Correct: {result == expected}")
+        assert result == expected
+        print("---")
+
+def test_meals_data():
+    """Test the conversion to the format_meals_output layout"""
+    meals_data = filter_day_menu(make_day_menu()).to_meals_data()
+    print(f"Vegetarian: {meals_data['vegetarian']}")
+    print(f"Non-vegetarian: {meals_data['non_vegetarian']}")
+
+    closed = DayMenu("Griebnitzsee", "2025-03-09", closed=True).to_meals_data()
+    print(f"Closed: {closed}")
+    print("---")
+
+def test_lazy_classification():
+    """Test that meals hidden by the default filter are only classified when a filter shows them"""
+    raw_meals = [
+        {"category": "Angebot 1", "name": "Linsensuppe", "prices": {"students": 1.80}, "notes": []},
+        {"category": "Dessert", "name": "Grießpudding", "prices": {"students": 0.90}, "notes": []},
+    ]
+    llm = FakeLLM()
+    day_menu = build_day_menu("Griebnitzsee", "2025-03-11", raw_meals, llm)
+    print(f"Classifications: {[meal['classification'] for meal in day_menu.meals]}, LLM calls: {llm.calls}")
+    print(f"Correct lazy: {llm.calls == 1 and day_menu.meals[1]['classification'] is None}")
+    assert llm.calls == 1 and day_menu.meals[1]['classification'] is None
+
+    all_categories = {"excluded_categories": []}
+    print(f"Correct default hides them: {not shows_unclassified_meals(day_menu)}")
+    assert not shows_unclassified_meals(day_menu)
+    print(f"Correct filter shows them: {shows_unclassified_meals(day_menu, all_categories)}")
+    assert shows_unclassified_meals(day_menu, all_categories)
+
+    completed = classify_hidden_meals(day_menu, llm)
+    print(f"Correct classified on demand: {llm.calls == 2 and not shows_unclassified_meals(completed, all_categories)}")
+    assert llm.calls == 2 and not shows_unclassified_meals(completed, all_categories)
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing filters...")
+    test_filters()
+
+    print("\nTesting meals data...")
+    test_meals_data()
+
+    print("\nTesting lazy classification...")
+    test_lazy_classification()
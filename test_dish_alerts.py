@@ -0,0 +1,85 @@
+from dish_alerts import DishAlertIndex, find_dish_alerts, prune_sent_alerts
+
+def test_index_matching():
+    """Test that meal names are matched against subscribed keywords"""
+    index = DishAlertIndex()
+    index.subscribe(1, "Käsespätzle")
+    index.subscribe(2, "Currywurst")
+    index.subscribe(3, "Chili sin Carne")
+
+    test_cases = [
+        ("Käsespätzle mit Röstzwiebeln", {(1, "käsespätzle")}),
+        ("Bio-Currywurst mit Pommes", {(2, "currywurst")}),
+        ("Chili sin Carne mit Reis", {(3, "chili sin carne")}),
+        ("Chili con Carne", set()),
+        ("Gemüsepfanne", set()),
+    ]
+
+    for meal_name, expected in test_cases:
+        result = index.match_meal(meal_name)
+        print(f"Meal: '{meal_name}'")
+        print(f"Expected: {expected}")
+        print(f"Got: {result}")
+        print(f"Correct: {result == expected}")
+        assert result == expected
+        print("---")
+
+def test_alerts_are_sent_once():
+    """Test that repeated matching of the same menu does not produce duplicate alerts"""
+    index = DishAlertIndex()
+    index.subscribe(1, "Käsespätzle")
+    upcoming = [("2025-03-10", {"name": "Käsespätzle"}), ("2025-03-11", {"name": "Linseneintopf"})]
+    sent_alerts = set()
+
+    first = find_dish_alerts(index, "Kiepenheuerallee", upcoming, lambda user_id: "Kiepenheuerallee", sent_alerts)
+    second = find_dish_alerts(index, "Kiepenheuerallee", upcoming, lambda user_id: "Kiepenheuerallee", sent_alerts)
+    print(f"First run: {first}")
+    print(f"Second run: {second}")
+    print(f"Correct: {len(first) == 1 and not second}")
+    assert len(first) == 1 and not second
+    print("---")
+
+def test_persisted_subscriptions():
+    """Test that a subscription change only reloads its own user from the shared mapping"""
+    subscriptions = {}
+    worker_a, worker_b = DishAlertIndex(subscriptions), DishAlertIndex(subscriptions)
+    worker_a.subscribe(1, "Käsespätzle")
+    worker_a.subscribe(2, "Currywurst")
+    worker_b.subscribe(1, "Falafel")
+    print(f"Shared: {subscriptions}")
+    print(f"Correct own user merged: {subscriptions[1] == ['falafel', 'käsespätzle']}")
+    assert subscriptions[1] == ["falafel", "käsespätzle"]
+    print(f"Correct other users left to reload: {not worker_b.match_meal('Currywurst')}")
+    assert not worker_b.match_meal("Currywurst")
+
+    worker_b.unsubscribe(1, "Käsespätzle")
+    worker_b.reload()
+    result = worker_b.match_meal("Käsespätzle mit Falafel und Currywurst")
+    print(f"Correct after reload: {result == {(1, 'falafel'), (2, 'currywurst')} and subscriptions[1] == ['falafel']}")
+    assert result == {(1, "falafel"), (2, "currywurst")} and subscriptions[1] == ["falafel"]
+    print("---")
+
+def test_prune_sent_alerts():
+    """Test that sent alerts of past days are forgotten"""
+    sent_alerts = {
+        (1, "käsespätzle", "Kiepenheuerallee", "2025-03-09", "Käsespätzle"),
+        (1, "käsespätzle", "Kiepenheuerallee", "2025-03-10", "Käsespätzle"),
+    }
+    prune_sent_alerts(sent_alerts, "2025-03-10")
+    print(f"Remaining: {sent_alerts}")
+    print(f"Correct: {[key[3] for key in sent_alerts] == ['2025-03-10']}")
+    assert [key[3] for key in sent_alerts] == ['2025-03-10']
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing index matching...")
+    test_index_matching()
+
+    print("\nTesting alert deduplication...")
+    test_alerts_are_sent_once()
+
+    print("\nTesting pruning of sent alerts...")
+    test_prune_sent_alerts()
+
+    print("\nTesting persisted subscriptions...")
+    test_persisted_subscriptions()
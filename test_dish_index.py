@@ -0,0 +1,88 @@
+from datetime import date
+from dish_index import DishHistoryIndex
+
+class FakeDayMenu:
+    """The DayMenu attributes DishHistoryIndex.add_day_menu reads"""
+
+    def __init__(self, mensa_name, date_str, names):
+        self.mensa_name = mensa_name
+        self.date_str = date_str
+        self.meals = [{"name": name} for name in names]
+
+def make_index():
+    index = DishHistoryIndex()
+    for date_str in ["2025-01-06", "2025-01-20", "2025-02-03"]:
+        index.add("Käsespätzle mit Röstzwiebeln", "Griebnitzsee", date_str)
+    index.add("Currywurst mit Pommes", "Griebnitzsee", "2025-01-07")
+    index.add("Currywurst mit Pommes", "Kiepenheuerallee", "2025-01-14")
+    index.add("Gemüsecurry", "Griebnitzsee", "2025-01-08")
+    return index
+
+def test_find_dishes():
+    """Test exact, misspelled and partial dish names"""
+    index = make_index()
+    test_cases = [
+        ("Käsespätzle mit Röstzwiebeln", "käsespätzle mit röstzwiebeln"),
+        ("kässpätzle", "käsespätzle mit röstzwiebeln"),
+        ("currywurst", "currywurst mit pommes"),
+        ("Sushi", None),
+    ]
+    for query, expected in test_cases:
+        matches = index.find_dishes(query)
+        result = matches[0][1] if matches else None
+        print(f"Query: '{query}', got: {result}")
+        print(f"Correct: {result == expected}")
+        assert result == expected
+    print("---")
+
+def test_forecast():
+    """Test known upcoming dates and the prediction from the median gap"""
+    index = make_index()
+    name = "käsespätzle mit röstzwiebeln"
+
+    # Two-week rhythm: expected two weeks after the last serving
+    forecast = index.forecast(name, "Griebnitzsee", today=date(2025, 2, 10))
+    print(f"Forecast: {forecast}")
+    print(f"Correct expected date: {forecast['next_date'] is None and forecast['expected_date'] == '2025-02-17'}")
+    assert forecast["next_date"] is None and forecast["expected_date"] == "2025-02-17"
+    assert forecast["last_date"] == "2025-02-03" and forecast["times_served"] == 3
+
+    # An archived upcoming date wins over the prediction
+    forecast = index.forecast(name, "Griebnitzsee", today=date(2025, 1, 15))
+    print(f"Correct next date: {forecast['next_date'] == '2025-01-20' and forecast['expected_date'] is None}")
+    assert forecast["next_date"] == "2025-01-20" and forecast["expected_date"] is None
+
+    # One serving gives no rhythm, and a predicted date in the past is dropped
+    once = index.forecast("gemüsecurry", today=date(2025, 2, 10))
+    overdue = index.forecast(name, "Griebnitzsee", today=date(2025, 3, 31))
+    print(f"Correct no prediction: {once['expected_date'] is None and overdue['expected_date'] is None}")
+    assert once["expected_date"] is None and overdue["expected_date"] is None
+
+    both = index.served_dates("currywurst mit pommes")
+    print(f"Correct all mensas: {both == ['2025-01-07', '2025-01-14']}")
+    assert both == ["2025-01-07", "2025-01-14"]
+    print("---")
+
+def test_add_day_menu():
+    """Test that a refetched day menu replaces the dishes of its day"""
+    index = DishHistoryIndex()
+    index.add_day_menu(FakeDayMenu("Griebnitzsee", "2025-03-10", ["Linsensuppe", "Falafel"]))
+    index.add_day_menu(FakeDayMenu("Griebnitzsee", "2025-03-11", ["Falafel"]))
+    index.add_day_menu(FakeDayMenu("Griebnitzsee", "2025-03-10", ["Falafel", "Gemüsecurry"]))
+
+    print(f"Dishes: {len(index)}, Falafel on {index.served_dates('falafel')}")
+    print(f"Correct dropped dish removed: {index.served_dates('linsensuppe') == [] and not index.find_dishes('Linsensuppe')}")
+    assert index.served_dates("linsensuppe") == [] and not index.find_dishes("Linsensuppe")
+    print(f"Correct others kept: {index.served_dates('falafel') == ['2025-03-10', '2025-03-11'] and len(index) == 2}")
+    assert index.served_dates("falafel") == ["2025-03-10", "2025-03-11"] and len(index) == 2
+    print(f"Correct display name: {index.display_name('gemüsecurry') == 'Gemüsecurry'}")
+    assert index.display_name("gemüsecurry") == "Gemüsecurry"
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing dish search...")
+    test_find_dishes()
+    print("Testing forecasts...")
+    test_forecast()
+    print("Testing day menu updates...")
+    test_add_day_menu()
@@ -0,0 +1,106 @@
+import os
+from pathlib import Path
+import pytest
+from image_scraping.driver_pool import WebDriverPool
+
+FIXTURE_URL = (Path(__file__).parent / "image_scraping" / "fixtures" / "google_images.html").as_uri()
+
+class FakeDriver:
+    """Stands in for a WebDriver to test pooling without starting a browser"""
+    started = 0
+
+    def __init__(self):
+        FakeDriver.started += 1
+        self.healthy = True
+        self.quit_called = False
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise RuntimeError("session deleted")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+def test_recycling():
+    """Test that drivers are reused, recycled after max_uses and replaced when unhealthy"""
+    FakeDriver.started = 0
+    pool = WebDriverPool(FakeDriver, size=1, max_uses=3)
+
+    used = []
+    for _ in range(4):
+        with pool.driver() as driver:
+            used.append(driver)
+    print(f"Drivers started for 4 searches with max_uses=3: {FakeDriver.started}")
+    print(f"Correct: {FakeDriver.started == 2 and used[0] is used[2] and used[0].quit_called}")
+    assert FakeDriver.started == 2 and used[0] is used[2] and used[0].quit_called
+    print("---")
+
+    used[-1].healthy = False
+    with pool.driver() as driver:
+        print(f"Unhealthy driver replaced: {driver is not used[-1]}")
+    print("---")
+    pool.close()
+
+def test_batch():
+    """Test the queue-based batch API"""
+    pool = WebDriverPool(FakeDriver, size=2)
+    results = pool.map(lambda meal_name, driver: meal_name.upper(), ["Käsespätzle", "Currywurst", "Käsespätzle"])
+    print(f"Results: {results}")
+    print(f"Correct: {results == {'Käsespätzle': 'KÄSESPÄTZLE', 'Currywurst': 'CURRYWURST'}}")
+    assert results == {'Käsespätzle': 'KÄSESPÄTZLE', 'Currywurst': 'CURRYWURST'}
+    print("---")
+    pool.close()
+
+def test_close_waits_for_borrowed():
+    """Test that close quits idle drivers right away and borrowed ones when they are returned"""
+    pool = WebDriverPool(FakeDriver, size=2)
+    with pool.driver() as borrowed:
+        with pool.driver() as idle:
+            pass
+        pool.close()
+        print(f"Correct idle quit, borrowed still open: {idle.quit_called and not borrowed.quit_called}")
+        assert idle.quit_called and not borrowed.quit_called
+    print(f"Correct borrowed quit on return: {borrowed.quit_called}")
+    assert borrowed.quit_called
+    print("---")
+
+def test_selenium_fixture():
+    """Test the Selenium scraper with pooled Chrome against the local static HTML fixture"""
+    # Needs Chrome installed
+    if not os.getenv("RUN_SELENIUM_TESTS"):
+        pytest.skip("set RUN_SELENIUM_TESTS=1 to run")
+
+    from image_scraping.scrape_image_selenium import create_driver, extract_meal_image_selenium
+
+    pool = WebDriverPool(create_driver, size=1)
+    try:
+        results = pool.map(
+            lambda meal_name, driver: extract_meal_image_selenium(meal_name, driver, search_url=FIXTURE_URL),
+            ["Spaghetti Bolognese", "Caesar Salad"]
+        )
+    finally:
+        pool.close()
+
+    for meal_name, img in results.items():
+        print(f"Meal: '{meal_name}'")
+        print(f"Got: {img.size if img else None}")
+        print(f"Correct: {img is not None}")
+        assert img is not None
+        print("---")
+
+if __name__ == "__main__":
+    print("Testing driver recycling...")
+    test_recycling()
+
+    print("\nTesting batch API...")
+    test_batch()
+
+    print("\nTesting close with a borrowed driver...")
+    test_close_waits_for_borrowed()
+
+    print("\nTesting Selenium against the HTML fixture...")
+    if os.getenv("RUN_SELENIUM_TESTS"):
+        test_selenium_fixture()
+    else:
+        print("Skipped (set RUN_SELENIUM_TESTS=1 to run)")
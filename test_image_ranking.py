@@ -0,0 +1,26 @@
+from image_scraping.scrape_img_bs4 import rank_image_candidates
+
+def test_ranking():
+    """Test that the best matching search result wins instead of the first one"""
+    results = [
+        {"image": "https://image.shutterstock.com/spaetzle.jpg", "url": "https://www.shutterstock.com/x",
+         "title": "Käsespätzle stock photo", "width": 1200, "height": 900},
+        {"image": "https://example.com/banner.jpg", "url": "https://example.com/",
+         "title": "Restaurant banner", "width": 3000, "height": 400},
+        {"image": "https://img.chefkoch-cdn.de/spaetzle.jpg", "url": "https://www.chefkoch.de/rezepte/kaesespaetzle",
+         "title": "Käsespätzle mit Röstzwiebeln", "width": 1024, "height": 768},
+        {"image": "https://example.org/small.jpg", "url": "https://example.org/",
+         "title": "Käsespätzle", "width": 120, "height": 90},
+    ]
+
+    ranked = rank_image_candidates(results, "Käsespätzle mit Röstzwiebeln")
+    result = [candidate["image"] for candidate in ranked]
+    print(f"Ranked: {result}")
+    print(f"Correct winner: {result[0] == 'https://img.chefkoch-cdn.de/spaetzle.jpg'}")
+    assert result[0] == 'https://img.chefkoch-cdn.de/spaetzle.jpg'
+    print(f"Stock photo dropped: {'https://image.shutterstock.com/spaetzle.jpg' not in result}")
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing image ranking...")
+    test_ranking()
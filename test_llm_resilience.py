@@ -0,0 +1,139 @@
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import llm_calls
+from llm_calls import invoke_llm, CircuitBreaker, HedgedLLM, LazyLLM, LLMUnavailable
+from message_classifier import process_user_message
+
+class SlowLLM:
+    """Answers after a delay, or raises if error is set"""
+
+    def __init__(self, delay=0, answer="ok", error=None):
+        self.delay = delay
+        self.answer = answer
+        self.error = error
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return type("Response", (), {"content": self.answer})()
+
+def test_deadline_and_circuit():
+    """Test that slow calls are abandoned and open the circuit after repeated failures"""
+    llm_calls.llm_circuit = CircuitBreaker(failure_threshold=2, reset_seconds=0.2)
+    slow = SlowLLM(delay=0.3)
+
+    results = []
+    for _ in range(3):
+        start = time.perf_counter()
+        try:
+            invoke_llm(slow, [], "test", timeout=0.05)
+            results.append("ok")
+        except LLMUnavailable:
+            results.append("unavailable")
+        results.append(time.perf_counter() - start < 0.2)
+    print(f"Results: {results}")
+    print(f"Correct deadline: {results == ['unavailable', True] * 3}")
+    assert results == ['unavailable', True] * 3
+    print(f"Correct circuit: {slow.calls == 2 and llm_calls.llm_circuit.state == CircuitBreaker.OPEN}")
+    assert slow.calls == 2 and llm_calls.llm_circuit.state == CircuitBreaker.OPEN
+
+    # After the reset time one trial call closes the circuit again
+    time.sleep(0.25)
+    response = invoke_llm(SlowLLM(), [], "test")
+    print(f"Correct recovery: {response.content == 'ok' and llm_calls.llm_circuit.state == CircuitBreaker.CLOSED}")
+    assert response.content == 'ok' and llm_calls.llm_circuit.state == CircuitBreaker.CLOSED
+    print("---")
+
+def test_queued_call_cancelled():
+    """Test that a call waiting for a free thread is cancelled and does not count as provider failure"""
+    llm_calls.llm_circuit = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    previous = llm_calls._executor
+    llm_calls._executor = ThreadPoolExecutor(1)
+    try:
+        busy = SlowLLM(delay=0.3)
+        llm_calls._executor.submit(busy.invoke, [])  # occupies the only thread
+        queued = SlowLLM()
+        try:
+            invoke_llm(queued, [], "test", timeout=0.05)
+            result = "ok"
+        except LLMUnavailable:
+            result = "unavailable"
+        time.sleep(0.35)
+        print(f"Got: {result}, calls {queued.calls}, circuit {llm_calls.llm_circuit.state}")
+        print(f"Correct: {result == 'unavailable' and queued.calls == 0}")
+        assert result == "unavailable" and queued.calls == 0
+        assert llm_calls.llm_circuit.state == CircuitBreaker.CLOSED
+
+        # The deadline counts from the start of the call, not from the submission
+        llm_calls._executor.submit(SlowLLM(delay=0.1).invoke, [])
+        response = invoke_llm(SlowLLM(delay=0.1), [], "test", timeout=0.15)
+        print(f"Correct deadline from start: {response.content == 'ok'}")
+        assert response.content == "ok"
+    finally:
+        llm_calls._executor.shutdown()
+        llm_calls._executor = previous
+        llm_calls.llm_circuit = CircuitBreaker()
+    print("---")
+
+def test_rule_fallback():
+    """Test that messages are classified by rules while the circuit is open"""
+    llm_calls.llm_circuit = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    llm_calls.llm_circuit.record_failure()
+    llm = SlowLLM(answer='{"command": "help"}')
+
+    command, args = process_user_message("menü für morgen", llm)
+    print(f"Got: {command} {args}")
+    tomorrow = (date.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+    print(f"Correct: {command == 'menu' and args == [tomorrow] and llm.calls == 0}")
+    assert command == 'menu' and args == [tomorrow] and llm.calls == 0
+    llm_calls.llm_circuit = CircuitBreaker()
+    print("---")
+
+def test_hedging():
+    """Test that a slow primary is overtaken by the hedge and a failing one falls back to it"""
+    hedged = HedgedLLM(SlowLLM(delay=0.5, answer="primary"), SlowLLM(answer="secondary"), hedge_delay=0.05)
+    start = time.perf_counter()
+    answer = hedged.invoke([]).content
+    print(f"Got: {answer}")
+    print(f"Correct hedge: {answer == 'secondary' and time.perf_counter() - start < 0.3}")
+    assert answer == 'secondary' and time.perf_counter() - start < 0.3
+
+    fast = HedgedLLM(SlowLLM(answer="primary"), SlowLLM(answer="secondary"), hedge_delay=0.05)
+    answer = fast.invoke([]).content
+    print(f"Correct no hedge: {answer == 'primary' and fast.secondary.calls == 0}")
+    assert answer == 'primary' and fast.secondary.calls == 0
+
+    failing = HedgedLLM(SlowLLM(delay=0.1, error=RuntimeError("down")), SlowLLM(delay=0.2, answer="secondary"),
+                        hedge_delay=0.05)
+    answer = failing.invoke([]).content
+    print(f"Correct failover: {answer == 'secondary'}")
+    assert answer == 'secondary'
+    print("---")
+
+def test_lazy_llm_copy():
+    """Test that copying a LazyLLM neither recurses nor creates the model"""
+    created = []
+    lazy = LazyLLM(lambda: created.append(1) or SlowLLM(answer="lazy"))
+    copied = copy.copy(lazy)
+    created_on_copy = len(created)
+    answer = copied.invoke([]).content
+    print(f"Correct copy: {created_on_copy == 0 and answer == 'lazy' and len(created) == 1}")
+    assert created_on_copy == 0 and answer == 'lazy' and len(created) == 1
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing deadlines and circuit breaker...")
+    test_deadline_and_circuit()
+    print("Testing queued call cancellation...")
+    test_queued_call_cancelled()
+    print("Testing rule-based fallback...")
+    test_rule_fallback()
+    print("Testing hedged requests...")
+    test_hedging()
+    print("Testing lazy LLM copies...")
+    test_lazy_llm_copy()
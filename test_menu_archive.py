@@ -0,0 +1,87 @@
+import os
+import tempfile
+from menu_archive import archive_day_menus, close_archive, get_connection, last_served, price_trend
+
+class FakeDayMenu:
+    """The DayMenu attributes archive_day_menus reads"""
+
+    def __init__(self, mensa_name, date_str, meals, error=None):
+        self.mensa_name = mensa_name
+        self.date_str = date_str
+        self.meals = meals
+        self.error = error
+
+def meal(name, price, classification=None, category="Angebot 1"):
+    return {"category": category, "name": name, "prices": {"students": price}, "notes": [],
+            "classification": classification, "emojis": "🍽️" if classification else None}
+
+def archived_rows(mensa_name, date_str):
+    return get_connection().execute(
+        "SELECT name, price_students, classification FROM meals WHERE mensa_name = ? AND date = ? ORDER BY name",
+        (mensa_name, date_str),
+    ).fetchall()
+
+def run_with_temp_archive(test):
+    """Run test against a fresh archive database in a temporary file"""
+    with tempfile.TemporaryDirectory() as directory:
+        close_archive()
+        get_connection(os.path.join(directory, "archive.sqlite3"))
+        try:
+            test()
+        finally:
+            close_archive()
+
+def test_upsert_and_deletion():
+    """Test that refetches update rows, keep known classifications and drop meals missing from the day"""
+    def test():
+        archive_day_menus([FakeDayMenu("Griebnitzsee", "2025-03-10", [
+            meal("Käsespätzle", 2.90, "vegetarian"),
+            meal("Linsensuppe", 1.80, "vegetarian", "Angebot 2"),
+        ])])
+        # Prefetched again without classification, with a new price and without the soup
+        written = archive_day_menus([FakeDayMenu("Griebnitzsee", "2025-03-10", [meal("Käsespätzle", 3.10)])])
+        rows = archived_rows("Griebnitzsee", "2025-03-10")
+        print(f"Rows: {rows}")
+        print(f"Correct upsert: {rows == [('Käsespätzle', 3.10, 'vegetarian')]}")
+        assert rows == [("Käsespätzle", 3.10, "vegetarian")]
+        print(f"Correct written count: {written == 2}")
+        assert written == 2
+
+        # A failed fetch leaves the archive alone, a closed day removes its meals
+        archive_day_menus([FakeDayMenu("Griebnitzsee", "2025-03-10", [], error="timeout")])
+        print(f"Correct failed fetch ignored: {len(archived_rows('Griebnitzsee', '2025-03-10')) == 1}")
+        assert len(archived_rows("Griebnitzsee", "2025-03-10")) == 1
+        archive_day_menus([FakeDayMenu("Griebnitzsee", "2025-03-10", [])])
+        print(f"Correct closed day emptied: {archived_rows('Griebnitzsee', '2025-03-10') == []}")
+        assert archived_rows("Griebnitzsee", "2025-03-10") == []
+    run_with_temp_archive(test)
+    print("---")
+
+def test_history_queries():
+    """Test last_served and the monthly price trend"""
+    def test():
+        archive_day_menus([
+            FakeDayMenu("Griebnitzsee", "2025-01-13", [meal("Currywurst", 3.00)]),
+            FakeDayMenu("Griebnitzsee", "2025-01-27", [meal("Currywurst", 3.20)]),
+            FakeDayMenu("Kiepenheuerallee", "2025-02-03", [meal("Currywurst", 3.40)]),
+        ])
+        print(f"Last served: {last_served('currywurst')}, {last_served('Currywurst', 'Griebnitzsee')}")
+        print(f"Correct last served: {last_served('currywurst') == ('2025-02-03', 'Kiepenheuerallee')}")
+        assert last_served("currywurst") == ("2025-02-03", "Kiepenheuerallee")
+        assert last_served("Currywurst", "Griebnitzsee") == ("2025-01-27", "Griebnitzsee")
+        print(f"Correct never served: {last_served('Falafel') is None}")
+        assert last_served("Falafel") is None
+
+        trend = [(month, round(price, 2), count) for month, price, count in price_trend("Currywurst")]
+        print(f"Trend: {trend}")
+        print(f"Correct trend: {trend == [('2025-01', 3.10, 2), ('2025-02', 3.40, 1)]}")
+        assert trend == [("2025-01", 3.10, 2), ("2025-02", 3.40, 1)]
+        assert [row[2] for row in price_trend("Currywurst", "Griebnitzsee")] == [2]
+    run_with_temp_archive(test)
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing upsert and deletion...")
+    test_upsert_and_deletion()
+    print("Testing history queries...")
+    test_history_queries()
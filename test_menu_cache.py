@@ -0,0 +1,49 @@
+import os
+
+os.environ.setdefault("MENU_ARCHIVE_PATH", ":memory:")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from day_menu import DayMenu, store_day_menu, invalidate_day_menus
+from menu_cache import get_rendered_menu, get_cached_menu, invalidate_rendered_menus, FORMAT_MENU, FORMAT_DAILY_REPORT
+
+def make_day_menu(main_dish):
+    """Build a classified day menu without calling OpenMensa or the LLM"""
+    meals = [
+        {"category": "Angebot 1", "name": main_dish, "price": 2.90, "prices": {"students": 2.90},
+         "notes": [], "classification": "vegetarian", "emojis": "🍛"},
+        {"category": "Angebot 2", "name": "Currywurst mit Pommes", "price": 3.40, "prices": {"students": 3.40},
+         "notes": [], "classification": "non-vegetarian", "emojis": "🌭🍟"},
+    ]
+    return DayMenu("Griebnitzsee", "2025-03-10", meals)
+
+def test_rendered_menu_cache():
+    """Test that renderings are cached per format and rebuilt when the shared day menu changes"""
+    invalidate_rendered_menus()
+    invalidate_day_menus()
+    store_day_menu(make_day_menu("Käsespätzle"))
+
+    text = get_rendered_menu("Griebnitzsee", "2025-03-10")
+    cached = get_cached_menu("Griebnitzsee", "2025-03-10")
+    print(f"Correct rendered: {'Käsespätzle' in text}")
+    assert "Käsespätzle" in text
+    print(f"Correct cached: {cached == text}")
+    assert cached == text
+
+    report = get_rendered_menu("Griebnitzsee", "2025-03-10", fmt=FORMAT_DAILY_REPORT)
+    print(f"Correct per format: {report.startswith('☀️') and get_cached_menu('Griebnitzsee', '2025-03-10', FORMAT_MENU) == text}")
+    assert report.startswith("☀️") and get_cached_menu("Griebnitzsee", "2025-03-10", FORMAT_MENU) == text
+
+    # e.g. the menu watcher stored a refetched menu; the cached rendering must not be served any more
+    store_day_menu(make_day_menu("Gemüsecurry"))
+    text = get_rendered_menu("Griebnitzsee", "2025-03-10")
+    print(f"After the change: {text.splitlines()[:4]}")
+    print(f"Correct rebuilt: {'Gemüsecurry' in text and 'Käsespätzle' not in text}")
+    assert "Gemüsecurry" in text and "Käsespätzle" not in text
+    report = get_rendered_menu("Griebnitzsee", "2025-03-10", fmt=FORMAT_DAILY_REPORT)
+    print(f"Correct other formats dropped: {'Gemüsecurry' in report}")
+    assert "Gemüsecurry" in report
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing rendered menu cache...")
+    test_rendered_menu_cache()
@@ -0,0 +1,93 @@
+from datetime import date
+from menu_search import MenuSearchIndex, parse_menu_question, answer_lookup, menu_context
+
+TODAY = date(2026, 10, 14)  # a Wednesday
+
+def build_index():
+    index = MenuSearchIndex()
+    index.add("Griebnitzsee", "2026-10-15", "Angebot 2", "Kartoffelsuppe mit Brötchen", 2.1, ["vegan"])
+    index.add("Griebnitzsee", "2026-10-19", "Angebot 1", "Seelachsfilet mit Kartoffelpüree", 3.5, [], "non-vegetarian")
+    index.add("Griebnitzsee", "2026-10-20", "Angebot 2", "Gemüselasagne", 2.9, [], "vegetarian")
+    index.add("Griebnitzsee", "2026-10-21", "Angebot 1", "Hähnchenschnitzel mit Pommes", 3.9, [], "non-vegetarian")
+    index.add("Kiepenheuerallee", "2026-10-15", "Angebot 1", "Currywurst mit Pommes", 3.2, [], "non-vegetarian")
+    index.add("Kiepenheuerallee", "2026-10-16", "Angebot 3", "Lachs in Dillsoße", 4.1, [], "non-vegetarian")
+    return index
+
+def test_parse_question():
+    """Test that days, mensa, diet and dish words are taken from the message"""
+    question = parse_menu_question("Gibt es nächste Woche Fisch am Griebnitzsee?", "Kiepenheuerallee", TODAY)
+    print(f"Range: {question.start} - {question.end}, mensa: {question.mensa_name}, terms: {question.terms}")
+    print(f"Correct: {(question.start, question.end) == ('2026-10-19', '2026-10-25')}")
+    assert (question.start, question.end) == ('2026-10-19', '2026-10-25')
+    print(f"Correct mensa: {question.mensa_name == 'Griebnitzsee' and question.terms == ['fisch']}")
+    assert question.mensa_name == 'Griebnitzsee' and question.terms == ['fisch']
+    print(f"Correct lookup: {question.is_lookup and not question.vegetarian_only}")
+    assert question.is_lookup and not question.vegetarian_only
+
+    question = parse_menu_question("Welche vegetarischen Gerichte gibt es?", "Griebnitzsee", TODAY)
+    print(f"Correct vegetarian: {question.vegetarian_only and question.terms == [] and question.end == '2026-10-20'}")
+    assert question.vegetarian_only and question.terms == [] and question.end == '2026-10-20'
+    print("---")
+
+def test_search():
+    """Test ranking with synonyms, compound words and the vegetarian filter"""
+    index = build_index()
+    question = parse_menu_question("Gibt es Fisch?", "Griebnitzsee", TODAY)
+    names = [doc["name"] for doc in index.search(question)]
+    print(f"Fisch: {names}")
+    print(f"Correct synonym and compound: {names == ['Seelachsfilet mit Kartoffelpüree']}")
+    assert names == ['Seelachsfilet mit Kartoffelpüree']
+
+    question = parse_menu_question("Gibt es nächste Woche Pommes?", "Griebnitzsee", TODAY)
+    print(f"Correct range filter: {[doc['name'] for doc in index.search(question)] == ['Hähnchenschnitzel mit Pommes']}")
+    assert [doc['name'] for doc in index.search(question)] == ['Hähnchenschnitzel mit Pommes']
+
+    question = parse_menu_question("Was Vegetarisches gibt es nächste Woche?", "Griebnitzsee", TODAY)
+    print(f"Correct vegetarian: {[doc['name'] for doc in index.search(question)] == ['Gemüselasagne']}")
+    assert [doc['name'] for doc in index.search(question)] == ['Gemüselasagne']
+
+    # Unclassified upcoming meals count as vegetarian by their notes
+    question = parse_menu_question("Was Vegetarisches gibt es diese Woche?", "Griebnitzsee", TODAY)
+    print(f"Correct by notes: {[doc['name'] for doc in index.search(question)] == ['Kartoffelsuppe mit Brötchen']}")
+    assert [doc['name'] for doc in index.search(question)] == ['Kartoffelsuppe mit Brötchen']
+    print("---")
+
+def test_answer_lookup():
+    """Test direct answers for lookups and that other messages are left to the LLM"""
+    index = build_index()
+    answer = answer_lookup(index, parse_menu_question("Gibt es nächste Woche Fisch?", "Griebnitzsee", TODAY))
+    print(answer)
+    print(f"Correct yes: {answer.startswith('🔎 Ja') and 'Seelachsfilet' in answer}")
+    assert answer.startswith('🔎 Ja') and 'Seelachsfilet' in answer
+
+    answer = answer_lookup(index, parse_menu_question("Gibt es diese Woche Lachs?", "Griebnitzsee", TODAY))
+    print(answer)
+    print(f"Correct other mensa: {answer.startswith('🔎 Nein') and 'Kiepenheuerallee' in answer}")
+    assert answer.startswith('🔎 Nein') and 'Kiepenheuerallee' in answer
+
+    print(f"Correct no dish: {answer_lookup(index, parse_menu_question('Gibt es eine Hilfe?', 'Griebnitzsee', TODAY)) is None}")
+    assert answer_lookup(index, parse_menu_question('Gibt es eine Hilfe?', 'Griebnitzsee', TODAY)) is None
+    print(f"Correct no lookup: {answer_lookup(index, parse_menu_question('Mag ich Fisch?', 'Griebnitzsee', TODAY)) is None}")
+    assert answer_lookup(index, parse_menu_question('Mag ich Fisch?', 'Griebnitzsee', TODAY)) is None
+    print("---")
+
+def test_menu_context():
+    """Test the context sent to the chat LLM"""
+    index = build_index()
+    context = menu_context(index, parse_menu_question("Ist die Lasagne lecker?", "Griebnitzsee", TODAY))
+    print(context)
+    print(f"Correct: {'Gemüselasagne' in context and 'Seelachsfilet' not in context}")
+    assert 'Gemüselasagne' in context and 'Seelachsfilet' not in context
+    print(f"Correct no context: {menu_context(index, parse_menu_question('Wie geht es dir?', 'Griebnitzsee', TODAY)) is None}")
+    assert menu_context(index, parse_menu_question('Wie geht es dir?', 'Griebnitzsee', TODAY)) is None
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing question parsing...")
+    test_parse_question()
+    print("Testing search...")
+    test_search()
+    print("Testing lookup answers...")
+    test_answer_lookup()
+    print("Testing chat context...")
+    test_menu_context()
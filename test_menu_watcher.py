@@ -0,0 +1,78 @@
+import os
+
+os.environ.setdefault("MENU_ARCHIVE_PATH", ":memory:")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import mensa_utils
+from bot_fakes import FakeLLM
+from menu_watcher import MenuDelta, diff_meals, check_menu_for_changes
+
+def meal(name, price, category="Angebot 1"):
+    return {"category": category, "name": name, "price": price, "prices": {"students": price},
+            "notes": [], "classification": "vegetarian", "emojis": "🥦"}
+
+def test_diff_meals():
+    """Test added, removed and changed meals between two versions of a menu"""
+    old = [meal("Käsespätzle", 2.90), meal("Currywurst", 3.40, "Angebot 2"), meal("Linsensuppe", 1.80, "Suppe")]
+    new = [meal("Käsespätzle", 3.10), meal("Currywurst", 3.40, "Angebot 2"), meal("Falafel", 3.20, "Angebot 3")]
+    added, removed, price_changed = diff_meals(old, new)
+    print(f"Added: {[m['name'] for m in added]}, removed: {[m['name'] for m in removed]}")
+    print(f"Correct added: {[m['name'] for m in added] == ['Falafel']}")
+    assert [m['name'] for m in added] == ['Falafel']
+    print(f"Correct removed: {[m['name'] for m in removed] == ['Linsensuppe']}")
+    assert [m['name'] for m in removed] == ['Linsensuppe']
+    print(f"Correct price change: {[(o['price'], n['price']) for o, n in price_changed] == [(2.90, 3.10)]}")
+    assert [(o['price'], n['price']) for o, n in price_changed] == [(2.90, 3.10)]
+
+    # A meal moved to another category counts as removed and added
+    added, removed, _ = diff_meals([meal("Falafel", 3.20)], [meal("Falafel", 3.20, "Angebot 3")])
+    print(f"Correct category move: {len(added) == 1 and len(removed) == 1}")
+    assert len(added) == 1 and len(removed) == 1
+    print(f"Correct unchanged: {diff_meals(old, old) == ([], [], [])}")
+    assert diff_meals(old, old) == ([], [], [])
+    print("---")
+
+def test_menu_delta():
+    """Test that an empty delta is falsy"""
+    empty = MenuDelta("Griebnitzsee", "2025-03-10")
+    delta = MenuDelta("Griebnitzsee", "2025-03-10", added=[meal("Falafel", 3.20)])
+    print(f"Delta: {delta}")
+    print(f"Correct: {not empty and bool(delta)}")
+    assert not empty and bool(delta)
+    print("---")
+
+def test_check_menu_for_changes():
+    """Test that the baseline is built without the LLM, closed days are skipped and only new meals are classified"""
+    raw_meals = [{"category": "Angebot 1", "name": "Käsespätzle", "prices": {"students": 2.90}, "notes": []}]
+    closed = [False]
+    original = mensa_utils.is_canteen_closed, mensa_utils.get_raw_meals
+    mensa_utils.is_canteen_closed = lambda mensa_id, date_str: closed[0]
+    mensa_utils.get_raw_meals = lambda mensa_id, date_str: list(raw_meals)
+    llm = FakeLLM()
+    try:
+        first = check_menu_for_changes("Griebnitzsee", "2025-03-10", llm)
+        print(f"Correct baseline: {first is None and llm.calls == 0}")
+        assert first is None and llm.calls == 0
+
+        raw_meals.append({"category": "Angebot 3", "name": "Falafel", "prices": {"students": 3.20}, "notes": []})
+        closed[0] = True
+        skipped = check_menu_for_changes("Griebnitzsee", "2025-03-10", llm)
+        print(f"Correct closed skipped: {skipped is None and llm.calls == 0}")
+        assert skipped is None and llm.calls == 0
+
+        closed[0] = False
+        delta = check_menu_for_changes("Griebnitzsee", "2025-03-10", llm)
+        print(f"Delta: {delta}, LLM calls: {llm.calls}")
+        print(f"Correct change: {delta is not None and [m['name'] for m in delta.added] == ['Falafel']}")
+        assert delta is not None and [m['name'] for m in delta.added] == ['Falafel']
+    finally:
+        mensa_utils.is_canteen_closed, mensa_utils.get_raw_meals = original
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing meal diff...")
+    test_diff_meals()
+    print("Testing menu delta...")
+    test_menu_delta()
+    print("Testing change checks...")
+    test_check_menu_for_changes()
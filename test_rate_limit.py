@@ -0,0 +1,151 @@
+import asyncio
+import time
+import metrics
+from rate_limit import TokenBucket, LLMAdmission, RateLimited, PRIORITY_MENU, PRIORITY_CHAT
+
+def test_token_bucket():
+    """Test burst capacity and refill"""
+    bucket = TokenBucket(rate=1, capacity=3, now=0)
+    taken = [bucket.try_take(now=0) for _ in range(4)]
+    print(f"Taken: {taken}")
+    print(f"Correct burst: {taken == [True, True, True, False]}")
+    assert taken == [True, True, True, False]
+    print(f"Correct wait: {bucket.seconds_until_available(now=0) == 1}")
+    assert bucket.seconds_until_available(now=0) == 1
+    refilled = bucket.try_take(now=1.5) and not bucket.try_take(now=1.5)
+    print(f"Correct refill: {refilled}")
+    assert refilled
+    print(f"Correct cap: {bucket.is_full(now=100) and bucket.tokens == 3}")
+    assert bucket.is_full(now=100) and bucket.tokens == 3
+    print("---")
+
+def test_user_limit():
+    """Test that one user is rejected while others still get through"""
+    admission = LLMAdmission(user_rate=0.1, user_burst=2, global_rate=100, global_burst=100)
+
+    async def run():
+        results = []
+        for user_id in [1, 1, 1, 2]:
+            try:
+                async with admission.admit(user_id):
+                    results.append("ok")
+            except RateLimited as e:
+                results.append(f"{e.reason}:{e.retry_after}")
+        return results
+
+    results = asyncio.run(run())
+    print(f"Results: {results}")
+    print(f"Correct: {results == ['ok', 'ok', 'user:10', 'ok']}")
+    assert results == ['ok', 'ok', 'user:10', 'ok']
+    print("---")
+
+def test_priority_and_shedding():
+    """Test that menu requests overtake chat and a full queue sheds requests"""
+    admission = LLMAdmission(user_rate=100, user_burst=100, global_rate=100, global_burst=100,
+                             max_concurrent=1, max_queue=3)
+    order = []
+
+    async def request(user_id, priority, name):
+        try:
+            async with admission.admit(user_id, priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+        except RateLimited as e:
+            order.append(f"{name}:{e.reason}")
+
+    async def run():
+        first = asyncio.create_task(request(0, PRIORITY_CHAT, "first"))
+        await asyncio.sleep(0)  # holds the only slot
+        tasks = [asyncio.create_task(request(i, priority, name)) for i, (priority, name) in enumerate(
+            [(PRIORITY_CHAT, "chat1"), (PRIORITY_CHAT, "chat2"), (PRIORITY_MENU, "menu"), (PRIORITY_CHAT, "chat3")], 1)]
+        await asyncio.gather(first, *tasks)
+
+    asyncio.run(run())
+    print(f"Order: {order}")
+    admitted = [name for name in order if name != "chat3:overloaded"]
+    print(f"Correct shedding: {'chat3:overloaded' in order}")
+    assert 'chat3:overloaded' in order
+    print(f"Correct priority: {admitted == ['first', 'menu', 'chat1', 'chat2']}")
+    assert admitted == ['first', 'menu', 'chat1', 'chat2']
+    print(f"Correct slots released: {admission.running == 0}")
+    assert admission.running == 0
+
+    exported = metrics.render_prometheus()
+    shed = 'llm_requests_rejected_total{priority="chat",reason="queue_full"} 1' in exported
+    print(f"Rejections exported: {shed}")
+    print("---")
+
+def test_queue_timeout():
+    """Test that requests waiting longer than max_wait are shed"""
+    admission = LLMAdmission(user_rate=100, user_burst=100, global_rate=0, global_burst=1, max_wait=0.05)
+
+    async def run():
+        results = []
+        for user_id in [1, 2]:
+            try:
+                async with admission.admit(user_id):
+                    results.append("ok")
+            except RateLimited as e:
+                results.append(e.reason)
+        return results
+
+    results = asyncio.run(run())
+    print(f"Results: {results}")
+    print(f"Correct: {results == ['ok', 'overloaded'] and not admission._queue}")
+    assert results == ['ok', 'overloaded'] and not admission._queue
+    print("---")
+
+def test_no_queueing():
+    """Test that without concurrent updates a request is shed instead of waiting for a global token"""
+    admission = LLMAdmission(user_rate=100, user_burst=100, global_rate=0.001, global_burst=1,
+                             max_wait=5, queueing=False)
+
+    async def run():
+        results = []
+        start = time.monotonic()
+        for user_id in [1, 2]:
+            try:
+                async with admission.admit(user_id):
+                    results.append("ok")
+            except RateLimited as e:
+                results.append(e.reason)
+        return results, time.monotonic() - start
+
+    results, seconds = asyncio.run(run())
+    print(f"Results: {results} in {seconds:.3f}s")
+    print(f"Correct: {results == ['ok', 'overloaded'] and seconds < 0.5 and not admission._queue}")
+    assert results == ['ok', 'overloaded'] and seconds < 0.5 and not admission._queue
+    print("---")
+
+def test_shed_refunds_user_token():
+    """Test that a shed request does not use up its user's allowance"""
+    admission = LLMAdmission(user_rate=0.001, user_burst=1, global_rate=0.001, global_burst=0,
+                             queueing=False)
+
+    async def run():
+        try:
+            async with admission.admit(1):
+                return "ok"
+        except RateLimited as e:
+            return e.reason
+
+    result = asyncio.run(run())
+    tokens = admission._user_bucket(1).tokens
+    print(f"Got: {result}, user tokens left {tokens:.2f}")
+    print(f"Correct: {result == 'overloaded' and tokens >= 1}")
+    assert result == "overloaded" and tokens >= 1
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing token bucket...")
+    test_token_bucket()
+    print("Testing per-user limit...")
+    test_user_limit()
+    print("Testing priority and shedding...")
+    test_priority_and_shedding()
+    print("Testing queue timeout...")
+    test_queue_timeout()
+    print("Testing shedding without queueing...")
+    test_no_queueing()
+    print("Testing user token refund...")
+    test_shed_refunds_user_token()
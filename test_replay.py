@@ -0,0 +1,51 @@
+import os
+import tempfile
+from datetime import date, timedelta
+from bot_fakes import FakeOpenMensa, FakeLLM
+from replay import ReplayStore, RecordReplayOpenMensa, RecordReplayLLM, ReplayMissError
+
+def test_record_and_replay():
+    """Test that recorded responses are replayed without the real services, also on a later day"""
+    path = os.path.join(tempfile.mkdtemp(), "replay_store.json")
+    recording_day = date(2025, 3, 3)
+    day = (recording_day + timedelta(days=1)).strftime("%Y-%m-%d")
+    messages = [("system", "Today's date is 2025-03-03. Extract the date."), ("human", "nächsten Dienstag")]
+
+    store = ReplayStore(path, today=recording_day)
+    openmensa = RecordReplayOpenMensa(FakeOpenMensa(today=recording_day), store, "record")
+    llm = RecordReplayLLM(FakeLLM(), store, "record")
+    recorded_days = openmensa.get_canteen_days(57)
+    recorded_meals = openmensa.get_meals_by_day(57, day)
+    recorded_answer = llm.invoke(messages).content
+    store.save()
+
+    # One week later, without OpenMensa or LLM
+    later = recording_day + timedelta(days=7)
+    shift = lambda text: text.replace("2025-03-03", later.strftime("%Y-%m-%d"))
+    store = ReplayStore(path, today=later)
+    openmensa = RecordReplayOpenMensa(None, store, "replay")
+    llm = RecordReplayLLM(None, store, "replay")
+    replayed_days = openmensa.get_canteen_days(57)
+    replayed_meals = openmensa.get_meals_by_day(57, (later + timedelta(days=1)).strftime("%Y-%m-%d"))
+    replayed_answer = llm.invoke([(role, shift(text)) for role, text in messages]).content
+
+    print(f"Correct meals: {replayed_meals == recorded_meals}")
+    assert replayed_meals == recorded_meals
+    print(f"Days shifted: {replayed_days[0]['date'] == later.strftime('%Y-%m-%d') and len(replayed_days) == len(recorded_days)}")
+    assert replayed_days[0]['date'] == later.strftime('%Y-%m-%d') and len(replayed_days) == len(recorded_days)
+    expected_answer = (date.fromisoformat(recorded_answer) + timedelta(days=7)).strftime("%Y-%m-%d")
+    print(f"Answer shifted: {replayed_answer == expected_answer} ({recorded_answer} -> {replayed_answer})")
+    assert replayed_answer == expected_answer
+
+    try:
+        llm.invoke([("human", "nie aufgenommen")])
+        missed = False
+    except ReplayMissError:
+        missed = True
+    print(f"Correct miss: {missed}")
+    assert missed
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing record/replay...")
+    test_record_and_replay()
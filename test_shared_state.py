@@ -0,0 +1,71 @@
+import os
+import tempfile
+import shared_state
+from shared_state import SharedDict, SharedSet, SharedUpdateQueue, LeaderLease, claim_job_run
+
+shared_state.SHARED_STATE_PATH = os.path.join(tempfile.mkdtemp(), "shared_state.sqlite3")
+
+def message_update(update_id, chat_id):
+    return {"update_id": update_id, "message": {"message_id": update_id, "text": "hi", "chat": {"id": chat_id}}}
+
+def test_shared_dict():
+    """Test that shared dicts keep tuple keys and arbitrary values"""
+    cache = SharedDict("test_cache")
+    cache[("Griebnitzsee", "2024-05-13")] = (1.5, {"meals": ["Käsespätzle"]})
+    cache[("Griebnitzsee", "2024-05-14")] = (2.0, None)
+    del cache[("Griebnitzsee", "2024-05-14")]
+    print(f"Correct value: {cache.get(('Griebnitzsee', '2024-05-13')) == (1.5, {'meals': ['Käsespätzle']})}")
+    assert cache.get(('Griebnitzsee', '2024-05-13')) == (1.5, {'meals': ['Käsespätzle']})
+    print(f"Correct keys: {list(cache) == [('Griebnitzsee', '2024-05-13')]}")
+    assert list(cache) == [('Griebnitzsee', '2024-05-13')]
+
+    subscribers = SharedSet("test_subscribers")
+    subscribers.add(42)
+    subscribers.add(7)
+    subscribers.discard(7)
+    print(f"Correct set: {42 in subscribers and 7 not in subscribers and len(subscribers) == 1}")
+    assert 42 in subscribers and 7 not in subscribers and len(subscribers) == 1
+    print("---")
+
+def test_update_queue():
+    """Test per-chat ordering, redelivery after an expired lease and backpressure"""
+    queue = SharedUpdateQueue()
+    for update_id, chat_id in [(1, 100), (2, 100), (3, 200)]:
+        queue.put(message_update(update_id, chat_id))
+    queue.put(message_update(1, 100))  # Telegram delivered it twice
+
+    first = queue.claim("worker-a")
+    second = queue.claim("worker-b")
+    print(f"Chat order kept: {first[0] == 1 and second[0] == 3} (claimed {first[0]}, {second[0]})")
+    print(f"Blocked while chat busy: {queue.claim('worker-c') is None}")
+
+    queue.complete(1)
+    third = queue.claim("worker-c", lease_seconds=0)
+    print(f"Next of chat: {third[0] == 2}")
+    # worker-c "crashed", its lease is already expired
+    redelivered = queue.claim("worker-a")
+    print(f"Redelivered: {redelivered is not None and redelivered[0] == 2}")
+    queue.complete(2)
+    queue.complete(3)
+
+    print(f"Backpressure: {queue.put(message_update(4, 100), max_pending=1) and not queue.put(message_update(5, 100), max_pending=1)}")
+    queue.complete(4)
+    print("---")
+
+def test_leader_election():
+    """Test that only one worker leads and that daily runs are claimed once"""
+    lease_a = LeaderLease("test_jobs", holder="a", ttl=60)
+    lease_b = LeaderLease("test_jobs", holder="b", ttl=60)
+    print(f"Single leader: {lease_a.acquire() and not lease_b.acquire() and lease_a.acquire()}")
+    lease_a.release()
+    print(f"Failover: {lease_b.acquire()}")
+    print(f"Run once: {claim_job_run('daily:2024-05-13', 'a') and not claim_job_run('daily:2024-05-13', 'b')}")
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing shared dict...")
+    test_shared_dict()
+    print("Testing update queue...")
+    test_update_queue()
+    print("Testing leader election...")
+    test_leader_election()
@@ -0,0 +1,77 @@
+import metrics
+from llm_calls import BackendLLM, structured_output_kwargs
+from message_classifier import parse_message_intent, MESSAGE_INTENT_SCHEMA
+from structured_output import parse_json_object, parse_structured
+
+def test_parse_json_object():
+    """Test answers the old regex extraction got wrong"""
+    test_cases = [
+        ('{"type": "vegetarian", "emojis": ["🥗"]}', {"type": "vegetarian", "emojis": ["🥗"]}),
+        ('```json\n{"command": "menu", "date": null}\n```', {"command": "menu", "date": None}),
+        ('{"a": {"b": 1}, "c": 2}', {"a": {"b": 1}, "c": 2}),
+        ('{"note": "a } inside"} and {"second": 1}', {"note": "a } inside"}),
+    ]
+    for text, expected in test_cases:
+        result = parse_json_object(text)
+        print(f"Text: {text!r}")
+        print(f"Got: {result}")
+        print(f"Correct: {result == expected}")
+        assert result == expected
+        print("---")
+
+    for text in ["Das Gericht ist vegetarisch.", '{"type": "vegetarian"']:
+        try:
+            parse_json_object(text)
+            print(f"Rejected {text!r}: False")
+        except ValueError:
+            print(f"Rejected {text!r}: True")
+    print("---")
+
+def test_parse_message_intent():
+    """Test typed intents and the parse result metrics"""
+    intent = parse_structured('{"command": "menu", "date": "2025-05-23", "mensa_location": null}',
+                              "test_intent", parse_message_intent)
+    print(f"Got: {intent}")
+    print(f"Correct: {intent.command_type == 'menu' and intent.date_str == '2025-05-23'}")
+    assert intent.command_type == 'menu' and intent.date_str == '2025-05-23'
+
+    for text in ['{"command": "dance", "date": null, "mensa_location": null}',
+                 '{"command": "menu", "date": "morgen", "mensa_location": null}',
+                 'Ich denke, du willst das Menü sehen.']:
+        try:
+            parse_structured(text, "test_intent", parse_message_intent)
+            print(f"Rejected {text!r}: False")
+        except ValueError:
+            print(f"Rejected {text!r}: True")
+
+    exported = metrics.render_prometheus()
+    counts = {result: f'llm_structured_output_total{{call_site="test_intent",result="{result}"}} {count}' in exported
+              for result, count in [("ok", 1), ("invalid_schema", 2), ("invalid_json", 1)]}
+    print(f"Correct metrics: {all(counts.values())}")
+    assert all(counts.values())
+    print("---")
+
+def test_backend_kwargs():
+    """Test how the schema is passed to each backend"""
+    class Recorder:
+        def invoke(self, messages, **kwargs):
+            self.kwargs = kwargs
+
+    for backend, expected in [("openai", "response_format"), ("ollama", "format"), ("groq", "response_format")]:
+        model = Recorder()
+        BackendLLM(model, backend).invoke([], schema=MESSAGE_INTENT_SCHEMA, schema_name="intent", max_output_tokens=60)
+        print(f"{backend}: {sorted(model.kwargs)}")
+        print(f"Correct: {expected in model.kwargs and ('max_tokens' in model.kwargs) == (backend != 'ollama')}")
+        assert expected in model.kwargs and ('max_tokens' in model.kwargs) == (backend != 'ollama')
+    strict = structured_output_kwargs("openai", "intent", MESSAGE_INTENT_SCHEMA)["response_format"]["json_schema"]
+    print(f"Correct strict schema: {strict['strict'] and strict['schema'] is MESSAGE_INTENT_SCHEMA}")
+    assert strict['strict'] and strict['schema'] is MESSAGE_INTENT_SCHEMA
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing JSON extraction...")
+    test_parse_json_object()
+    print("Testing intent parsing...")
+    test_parse_message_intent()
+    print("Testing backend arguments...")
+    test_backend_kwargs()
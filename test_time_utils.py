@@ -1,4 +1,4 @@
-from time_utils import parse_date_query, format_date_for_display
+from time_utils import parse_date_query, parse_date_rules, parse_explicit_date, format_date_for_display
 from datetime import date, datetime, timedelta
 
 def test_weekday_parsing():
@@ -59,9 +59,57 @@ def test_relative_days():
         print(f"Correct: {result == expected}")
         print("---")
 
+def test_explicit_dates():
+    """Test written-out dates, which are parsed without the LLM"""
+    today = date(2025, 5, 20)
+    test_cases = [
+        ("menü am 23.05.", "2025-05-23"),
+        ("essen 23.5.2026", "2026-05-23"),
+        ("was gibt es am 3. Juni", "2025-06-03"),
+        ("speiseplan 2025-06-01", "2025-06-01"),
+        ("menü am 1. mai", "2026-05-01"),  # already passed this year
+        ("menü am 31.02.", None),
+        ("menü um 12 uhr", None),
+        ("was gibt es am 24.5", "2025-05-24"),
+        ("geht das mit Version 1.5?", None),
+    ]
+    
+    for query, expected in test_cases:
+        result = parse_explicit_date(query, today)
+        result = result.strftime("%Y-%m-%d") if result else None
+        print(f"Query: '{query}'")
+        print(f"Expected: {expected}")
+        print(f"Got: {result}")
+        print(f"Correct: {result == expected}")
+        assert result == expected
+        print("---")
+    
+    # 29 February that already passed this year is next possible in the following leap year
+    result = parse_explicit_date("menü am 29.02.", date(2024, 3, 10))
+    print(f"Leap day: {result}")
+    print(f"Correct: {result == date(2028, 2, 29)}")
+    assert result == date(2028, 2, 29)
+    print("---")
+
+def test_rules_without_match():
+    """Test that parse_date_rules reports free text it does not understand, so only that needs the LLM"""
+    tomorrow = (date.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+    unknown = parse_date_rules("am ersten Tag nach den Ferien")
+    print(f"Got: {parse_date_rules('menü für morgen')}, {unknown}")
+    print(f"Correct: {parse_date_rules('menü für morgen') == tomorrow and unknown is None}")
+    assert parse_date_rules("menü für morgen") == tomorrow
+    assert unknown is None
+    print("---")
+
 if __name__ == "__main__":
     print("Testing weekday parsing...")
     test_weekday_parsing()
     
     print("\nTesting relative days...")
-    test_relative_days() 
\ No newline at end of file
+    test_relative_days() 
+    
+    print("\nTesting explicit dates...")
+    test_explicit_dates()
+    
+    print("\nTesting rules without a match...")
+    test_rules_without_match()
@@ -0,0 +1,37 @@
+import asyncio
+import metrics
+from dish_index import score_dish_names
+from worker_pool import WorkerPools
+
+def test_worker_pools():
+    """Test CPU and I/O jobs, queue-depth metrics and shutdown"""
+    pools = WorkerPools(cpu_workers=2, io_workers=2)
+    names = ["käsespätzle mit röstzwiebeln", "currywurst mit pommes", "linsensuppe"] * 100
+
+    async def run():
+        matches = await pools.run_cpu(score_dish_names, "kässpätzle", names, 1)
+        results = await asyncio.gather(*(pools.run_io(sum, [i, i]) for i in range(10)))
+        return matches, results
+
+    matches, results = asyncio.run(run())
+    print(f"CPU result: {matches}")
+    print(f"Correct CPU: {matches[0][1] == 'käsespätzle mit röstzwiebeln'}")
+    assert matches[0][1] == 'käsespätzle mit röstzwiebeln'
+    print(f"Correct I/O: {results == [2 * i for i in range(10)]}")
+    assert results == [2 * i for i in range(10)]
+
+    exported = metrics.render_prometheus()
+    idle = all(f'worker_pool_queue_depth{{pool="{pool}"}} 0' in exported for pool in ["cpu", "io"])
+    print(f"Queue depth back to 0: {idle}")
+
+    pools.shutdown()
+    try:
+        pools.submit("io", sum, [1])
+        print("Rejected after shutdown: False")
+    except RuntimeError:
+        print("Rejected after shutdown: True")
+    print("---")
+
+if __name__ == "__main__":
+    print("Testing worker pools...")
+    test_worker_pools()
@@ -1,6 +1,55 @@
 from datetime import datetime, date, timedelta
-from langchain.schema import HumanMessage, SystemMessage
 import re
+from llm_calls import invoke_llm
+
+MONTH_NAMES = {
+    'januar': 1, 'jan': 1, 'februar': 2, 'feb': 2, 'märz': 3, 'maerz': 3, 'mär': 3, 'april': 4, 'apr': 4,
+    'mai': 5, 'juni': 6, 'jun': 6, 'juli': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9, 'sep': 9,
+    'oktober': 10, 'okt': 10, 'november': 11, 'nov': 11, 'dezember': 12, 'dez': 12,
+}
+
+def parse_explicit_date(query, today):
+    """
+    Find a written-out date like "23.05.", "am 23.5", "23.5.2025", "23. Mai" or "2025-05-23".
+    Dates without a year that already passed are moved to the next year they exist in.
+    Short forms without the trailing dot need "am", "den", ... in front, so "Version 1.5" is no date.
+    
+    Returns:
+        date: The date, or None if the query contains no valid date
+    """
+    query_lower = query.lower()
+    year = None
+    match = re.search(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b', query_lower)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+    else:
+        match = next((
+            candidate for candidate in re.finditer(
+                r'(?:\b(am|den|vom|bis|zum|ab)\s+)?\b(\d{1,2})\.\s?(\d{1,2})(\.(\d{2,4})?)?(?!\d)', query_lower)
+            if candidate.group(1) or candidate.group(4)
+        ), None)
+        if match:
+            day, month = int(match.group(2)), int(match.group(3))
+            if match.group(5):
+                year = int(match.group(5)) + (2000 if len(match.group(5)) == 2 else 0)
+        else:
+            match = re.search(r'\b(\d{1,2})\.?\s*(' + '|'.join(MONTH_NAMES) + r')\b', query_lower)
+            if not match:
+                return None
+            day, month = int(match.group(1)), MONTH_NAMES[match.group(2)]
+    
+    try:
+        parsed = date(year or today.year, month, day)
+    except ValueError:
+        return None
+    if year is None and parsed < today:
+        # 29.02. only exists in leap years
+        for next_year in range(today.year + 1, today.year + 9):
+            try:
+                return parsed.replace(year=next_year)
+            except ValueError:
+                continue
+    return parsed
 
 def parse_date_query(query, llm=None):
     """
@@ -13,6 +62,24 @@ def parse_date_query(query, llm=None):
     Returns:
         str: Date string in YYYY-MM-DD format
     """
+    parsed = parse_date_rules(query)
+    if parsed:
+        return parsed
+    
+    # For more complex queries, use the LLM
+    if llm:
+        return parse_date_with_llm(query, llm)
+    
+    # Default to today if no date is recognized
+    return date.today().strftime("%Y-%m-%d")
+
+def parse_date_rules(query):
+    """
+    Parse a date query with rules only (relative days, weekdays, explicit dates).
+    
+    Returns:
+        str: Date string in YYYY-MM-DD format, None if no rule matched
+    """
     today = date.today()
     
     # Simple pattern matching for common cases
@@ -53,12 +120,15 @@ def parse_date_query(query, llm=None):
             target_date = today + timedelta(days=days_ahead)
             return target_date.strftime("%Y-%m-%d")
     
-    # For more complex queries, use the LLM
-    if llm:
-        return parse_date_with_llm(query, llm)
-    
-    # Default to today if no date is recognized
-    return today.strftime("%Y-%m-%d")
+    explicit_date = parse_explicit_date(query, today)
+    if explicit_date:
+        return explicit_date.strftime("%Y-%m-%d")
+    return None
+
+# Constant, so every call shares the same cacheable prompt prefix
+DATE_PARSING_PROMPT = """Extract the date a German or English query refers to. The message starts with today's date.
+Rules: use the current year unless another is given; a weekday means its next occurrence; relative days (morgen, übermorgen, tomorrow) count from today; dates like "23. Mai" mean their next occurrence.
+Reply with the date only, as YYYY-MM-DD. If no date is mentioned, reply with today's date."""
 
 def parse_date_with_llm(query, llm):
     """
@@ -73,30 +143,14 @@ def parse_date_with_llm(query, llm):
     """
     today = date.today()
     
-    system_prompt = """
-    You are a helpful assistant that extracts date information from text.
-    Extract the date mentioned in the user's query relative to today.
-    Today's date is {today}.
-    
-    Important rules:
-    1. ALWAYS use the current year ({current_year}) unless explicitly specified otherwise
-    2. For weekdays, find the NEXT occurrence of that day
-    3. For relative days (e.g., "morgen", "übermorgen", "tomorrow"), calculate from today
-    4. For specific dates (e.g., "23. Mai"), use the current or next occurrence
-    
-    Respond ONLY with the date in YYYY-MM-DD format. If no date is mentioned, respond with today's date.
-    """.format(
-        today=today.strftime("%Y-%m-%d"),
-        current_year=today.year
-    )
-    
+    # Today's date goes into the human message, so the system prompt stays the same every day
     messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"Extract the date from: '{query}'")
+        ("system", DATE_PARSING_PROMPT),
+        ("human", f"Today: {today.strftime('%Y-%m-%d')} ({today.strftime('%A')}). Query: {query}")
     ]
     
     try:
-        response = llm.invoke(messages).content.strip()
+        response = invoke_llm(llm, messages, "parse_date_with_llm", max_output_tokens=12).content.strip()
         
         # Validate the response is in YYYY-MM-DD format
         parsed_date = datetime.strptime(response, "%Y-%m-%d").date()
@@ -0,0 +1,190 @@
+import atexit
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# none (default, no overhead), jsonl (one JSON line per update) or otel (OpenTelemetry SDK)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "traces.jsonl")
+# User ids are only recorded as salted hashes; without a fixed salt they match within one run only
+TRACING_USER_SALT = os.getenv("TRACING_USER_SALT") or secrets.token_hex(16)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation with attributes and child spans."""
+
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.children = []
+        self.start = time.perf_counter()
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self, root_start=None):
+        """Serialize the span tree; offsets are relative to the root span start."""
+        if root_start is None:
+            root_start = self.start
+        data = {
+            "name": self.name,
+            "offset_ms": round((self.start - root_start) * 1000, 3),
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+        }
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict(root_start) for child in self.children]
+        return data
+
+
+class NoopTracer:
+    """Default tracer, spans cost one generator frame and nothing is recorded."""
+
+    @contextmanager
+    def span(self, name, **attributes):
+        yield None
+
+
+class JsonLinesTracer:
+    """
+    Records span trees in memory and appends each finished root span as one JSON line.
+
+    Lines are written by a background thread, so finishing a span on the event
+    loop never waits for the disk.
+    """
+
+    def __init__(self, path=TRACING_JSONL_PATH):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _current_span.get()
+        current = Span(name, attributes, parent)
+        if parent is not None:
+            parent.children.append(current)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            current.duration = time.perf_counter() - current.start
+            _current_span.reset(token)
+            if parent is None:
+                self.export(current)
+
+    def export(self, root):
+        record = {"trace_id": root.trace_id, "start_time": root.start_time}
+        record.update(root.to_dict())
+        self._queue.put(json.dumps(record, ensure_ascii=False, default=str))
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_lines, name="trace-writer", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.close)
+
+    def _write_lines(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                f.write(line + "\n")
+                # Write everything queued so far in one go
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self):
+        """Write the queued lines and stop the writer thread."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+
+class OpenTelemetryTracer:
+    """Forwards spans to the OpenTelemetry API (configure the SDK/exporter via OTEL_* variables)."""
+
+    def __init__(self):
+        from opentelemetry import trace
+        self._tracer = trace.get_tracer("mensa_bot")
+
+    @contextmanager
+    def span(self, name, **attributes):
+        with self._tracer.start_as_current_span(name) as otel_span:
+            for key, value in attributes.items():
+                otel_span.set_attribute(key, str(value))
+            yield otel_span
+
+
+def create_tracer(exporter=TRACING_EXPORTER):
+    """Create the tracer selected by TRACING_EXPORTER."""
+    if exporter == "jsonl":
+        return JsonLinesTracer()
+    if exporter == "otel":
+        try:
+            return OpenTelemetryTracer()
+        except ImportError:
+            print("Tracing: opentelemetry is not installed, tracing disabled")
+    return NoopTracer()
+
+
+_tracer = create_tracer()
+
+
+def set_tracer(tracer):
+    """Replace the active tracer (e.g. in benchmarks or tests)."""
+    global _tracer
+    _tracer = tracer
+
+
+def span(name, **attributes):
+    """Open a span as child of the current one: with span("openmensa.meals", mensa_id=57): ..."""
+    return _tracer.span(name, **attributes)
+
+
+def in_current_context(function):
+    """Bind a function to the caller's context, so spans it opens in a pool thread nest under the current one."""
+    return functools.partial(contextvars.copy_context().run, function)
+
+
+def hash_user_id(user_id):
+    """Salted hash that correlates traces of one user without recording the Telegram id."""
+    if user_id is None:
+        return None
+    return hashlib.sha256(f"{TRACING_USER_SALT}:{user_id}".encode()).hexdigest()[:16]
+
+
+def traced_handler(command, handler):
+    """Wrap an async Telegram handler so every update opens a root span."""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        user = getattr(update, "effective_user", None)
+        with span("update", command=command, update_id=getattr(update, "update_id", None),
+                  user=hash_user_id(getattr(user, "id", None))):
+            return await handler(update, context)
+    return wrapper
@@ -0,0 +1,227 @@
+import asyncio
+import hmac
+import json
+import metrics
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024  # Telegram updates are a few KB at most
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+async def read_http_request(reader):
+    """
+    Read one HTTP/1.1 request from a stream.
+
+    Returns:
+        tuple: (method, path, headers with lowercase names, body bytes), or None if the client closed the connection
+
+    Raises:
+        ValueError: If the request is malformed or too large
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise ValueError("header too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise ValueError("malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def write_http_response(writer, status, body=b"", content_type="text/plain", extra_headers=None):
+    headers = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+    ]
+    for name, value in (extra_headers or {}).items():
+        headers.append(f"{name}: {value}")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+
+
+class WebhookServer:
+    """
+    Receives Telegram updates via HTTP POST and hands them to a fixed number of workers.
+
+    Updates are routed to a worker by chat, so the messages of one user are still
+    handled in order. When a worker's queue is full the request is answered with 503
+    and Telegram delivers the update again later.
+
+    Args:
+        application: python-telegram-bot Application (initialized and started by the caller)
+        path (str): URL path Telegram posts to, e.g. /telegram
+        secret_token (str): Expected X-Telegram-Bot-Api-Secret-Token header
+        workers (int): Number of concurrent update workers
+        queue_size (int): Pending updates per worker before requests are rejected
+        enqueue: Optional callable(update dict) -> bool that takes over the updates instead of
+            the local workers (e.g. the shared multi-worker queue); False rejects the update
+    """
+
+    def __init__(self, application, path, secret_token, workers=4, queue_size=100, host="127.0.0.1", port=8443,
+                 enqueue=None):
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.enqueue = enqueue
+        self.queues = [] if enqueue else [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._workers = []
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES)
+        # Port 0 picks a free port (benchmarks, tests)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._workers = [asyncio.create_task(self._work(queue)) for queue in self.queues]
+
+    async def stop(self):
+        """Stop accepting updates and finish the ones that were already accepted."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for queue in self.queues:
+            await queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def queue_depth(self):
+        return sum(queue.qsize() for queue in self.queues)
+
+    def _queue_for(self, data):
+        # Route by chat (or sender) so one user's updates never overtake each other
+        for key in ("message", "edited_message", "callback_query", "my_chat_member"):
+            if key in data:
+                item = data[key]
+                chat = item.get("chat") or item.get("message", {}).get("chat") or item.get("from") or {}
+                return self.queues[hash(chat.get("id")) % len(self.queues)]
+        return self.queues[data.get("update_id", 0) % len(self.queues)]
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_http_request(reader)
+                except ValueError:
+                    write_http_response(writer, 400)
+                    break
+                if request is None:
+                    break
+                status = self._accept(*request)
+                write_http_response(writer, status, extra_headers={"Retry-After": "1"} if status == 503 else None)
+                await writer.drain()
+                if request[2].get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _accept(self, method, path, headers, body):
+        """Validate one request and enqueue its update. Returns the HTTP status."""
+        if path.split("?")[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret_token):
+            metrics.inc("webhook_requests_total", result="forbidden")
+            return 403
+        try:
+            data = json.loads(body)
+        except ValueError:
+            metrics.inc("webhook_requests_total", result="bad_request")
+            return 400
+
+        if self.enqueue is not None:
+            accepted = self.enqueue(data)
+        else:
+            try:
+                self._queue_for(data).put_nowait(data)
+                accepted = True
+            except asyncio.QueueFull:
+                accepted = False
+        if not accepted:
+            metrics.inc("webhook_requests_total", result="rejected")
+            return 503
+        metrics.inc("webhook_requests_total", result="accepted")
+        metrics.set_gauge("webhook_queue_depth", self.queue_depth())
+        return 200
+
+    async def _work(self, queue):
+        from telegram import Update
+        while True:
+            data = await queue.get()
+            try:
+                await self.application.process_update(Update.de_json(data, self.application.bot))
+            except Exception as e:
+                print(f"Fehler beim Verarbeiten des Updates {data.get('update_id')}: {e}")
+            finally:
+                queue.task_done()
+                metrics.set_gauge("webhook_queue_depth", self.queue_depth())
+
+
+def stop_on_signals():
+    """Return an asyncio.Event that is set on SIGINT/SIGTERM."""
+    import signal
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    return stop_event
+
+
+async def run_webhook(application, url, secret_token, workers=4, queue_size=100, host="127.0.0.1", port=8443,
+                      allowed_updates=None, drop_pending_updates=True, enqueue=None, stop_event=None):
+    """
+    Register the webhook with Telegram and serve updates until SIGINT/SIGTERM (or stop_event).
+
+    Args:
+        url (str): Public HTTPS URL Telegram posts to (a reverse proxy forwards it to host:port)
+        enqueue: See WebhookServer
+    """
+    from urllib.parse import urlsplit
+
+    if stop_event is None:
+        stop_event = stop_on_signals()
+    server = WebhookServer(application, urlsplit(url).path or "/", secret_token, workers, queue_size, host, port,
+                           enqueue)
+    async with application:
+        await application.start()
+        await server.start()
+        await application.bot.set_webhook(
+            url, secret_token=secret_token, allowed_updates=allowed_updates,
+            drop_pending_updates=drop_pending_updates, max_connections=max(workers, 1) * 10,
+        )
+        print(f"Webhook: {url} -> http://{host}:{server.port}{server.path} ({workers} Worker)")
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+
+
+metrics.describe("webhook_requests_total", "counter", "Webhook requests per result (accepted/rejected/forbidden/bad_request)")
+metrics.describe("webhook_queue_depth", "gauge", "Updates waiting for a webhook worker")
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import metrics
+from tracing import in_current_context
+
+# Processes for CPU-bound work (image resizing, fuzzy matching), threads for blocking I/O (HTTP, LLM, SQLite)
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(max(1, (os.cpu_count() or 2) - 1))))
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))
+
+
+class WorkerPools:
+    """
+    A process pool for CPU-bound jobs and a thread pool for blocking I/O.
+
+    Both pools are created on first use. Every submission updates the
+    worker_pool_queue_depth gauge (submitted but unfinished jobs per pool)
+    and the worker_pool_task_seconds histogram.
+
+    Functions sent to the process pool and their arguments must be picklable,
+    i.e. module-level functions and plain data.
+    """
+
+    def __init__(self, cpu_workers=CPU_POOL_SIZE, io_workers=IO_POOL_SIZE):
+        self.cpu_workers = cpu_workers
+        self.io_workers = io_workers
+        self._cpu_pool = None
+        self._io_pool = None
+        self._lock = threading.Lock()
+        self._depth = {"cpu": 0, "io": 0}
+        self._closed = False
+
+    def _get_pool(self, kind):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("worker pools are shut down")
+            if kind == "cpu":
+                if self._cpu_pool is None:
+                    # spawn: forking a process with running threads and an event loop is unsafe
+                    self._cpu_pool = ProcessPoolExecutor(self.cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+                return self._cpu_pool
+            if self._io_pool is None:
+                self._io_pool = ThreadPoolExecutor(self.io_workers, thread_name_prefix="bot-io")
+            return self._io_pool
+
+    def _track(self, kind, change):
+        with self._lock:
+            self._depth[kind] += change
+            depth = self._depth[kind]
+        metrics.set_gauge("worker_pool_queue_depth", depth, pool=kind)
+
+    def submit(self, kind, function, *args, **kwargs):
+        """Submit a job to the "cpu" or "io" pool. Returns a concurrent.futures.Future."""
+        pool = self._get_pool(kind)
+        if kind == "io":
+            # Threads keep the caller's context, so tracing spans nest correctly
+            function = in_current_context(function)
+        submitted_at = time.perf_counter()
+        self._track(kind, 1)
+        future = pool.submit(function, *args, **kwargs)
+
+        def done(_):
+            self._track(kind, -1)
+            metrics.observe("worker_pool_task_seconds", time.perf_counter() - submitted_at, pool=kind)
+        future.add_done_callback(done)
+        return future
+
+    async def run_cpu(self, function, *args, **kwargs):
+        """Run a CPU-bound function in the process pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit("cpu", function, *args, **kwargs))
+
+    async def run_io(self, function, *args, **kwargs):
+        """Run a blocking function in the thread pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit("io", function, *args, **kwargs))
+
+    def call_cpu(self, function, *args, **kwargs):
+        """Run a function in the process pool and wait for it (for code already running in a thread)."""
+        return self.submit("cpu", function, *args, **kwargs).result()
+
+    def shutdown(self, wait=True):
+        """Finish running jobs, drop queued ones and stop the workers."""
+        with self._lock:
+            self._closed = True
+            pools = [pool for pool in (self._io_pool, self._cpu_pool) if pool is not None]
+        for pool in pools:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_worker_pools = None
+
+
+def get_worker_pools():
+    global _worker_pools
+    if _worker_pools is None:
+        _worker_pools = WorkerPools()
+    return _worker_pools
+
+
+async def run_cpu(function, *args, **kwargs):
+    return await get_worker_pools().run_cpu(function, *args, **kwargs)
+
+
+async def run_io(function, *args, **kwargs):
+    return await get_worker_pools().run_io(function, *args, **kwargs)
+
+
+def shutdown_worker_pools(wait=True):
+    if _worker_pools is not None:
+        _worker_pools.shutdown(wait)
+
+
+metrics.describe("worker_pool_queue_depth", "gauge", "Submitted but unfinished jobs per worker pool (cpu/io)")
+metrics.describe("worker_pool_task_seconds", "histogram", "Time from submission to completion per worker pool")